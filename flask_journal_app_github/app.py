@@ -1,16 +1,17 @@
 import os
 import sys
 import json
+import queue
+import time
 import secrets
-import hashlib
 import random
+import difflib
 import subprocess
 from datetime import datetime
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 
 from flask import (
     Flask,
-    render_template,
     request,
     redirect,
     url_for,
@@ -19,22 +20,49 @@ from flask import (
     jsonify,
     send_file,
     session,
-    g
+    g,
+    Response,
+    make_response,
+    before_render_template,
+    template_rendered,
 )
 
 from storage import (
     DATA_DIR,
+    CATEGORIES_PATH,
+    POSTS_VERSION_PATH,
+    LLM_CONFIG_PATH,
+    COMMENTS_VERSION_PATH,
+    POST_META_PATH,
+    data_version,
+    data_mtime,
     load_categories,
     save_categories,
     load_posts,
     save_posts,
+    find_post,
+    load_posts_page,
+    load_post_body,
+    with_body,
+    content_hash,
+    drop_blob_if_unused,
+    migrate_post_bodies,
+    migrate_storage_layout,
+    reindex_shard,
+    SHARDS_DIR,
+    TXN_DIR,
     load_llm_config,
     save_llm_config,
     load_comments,
     save_comments,
+    count_unread_comments,
+    load_unread_comments,
+    load_comments_for_post,
     load_post_meta,
     save_post_meta,
     file_lock,
+    transaction,
+    recover_transactions,
     LOCK_CATEGORIES,
     LOCK_POSTS,
     LOCK_LLM_CONFIG,
@@ -42,183 +70,88 @@ from storage import (
     LOCK_POST_META,
 )
 
-from ollama_client import list_models, generate_comment
+from llm_log import call_log
+from comment_writer import comment_writer, COMMENT_WRITE_TIMEOUT
+from snapshots import SNAPSHOTS_DIR, snapshot_scheduler
+from file_index import dir_listing, read_page, FILE_EDIT_MAX_BYTES, PAGE_BYTES
+from journal_io import export_jsonl, export_markdown_zip, import_records, read_import_file
+from revisions import REVISIONS_DIR, record_revision, list_revisions, get_revision, delete_history
+from backends import list_models, pool as backend_pool
+from dispatcher import dispatcher, DISPATCH_DEFAULTS, parse_keep_alive
+import metrics
+import profiler
+from events import bus, comment_event, format_sse, publish_new_comment, publish_unread
+from http_cache import make_etag, not_modified, apply_validators, static_fingerprint, STATIC_MAX_AGE
+from fragment_cache import fragments
+from jsonapi import (
+    POST_FIELDS,
+    POST_LIST_DEFAULT_FIELDS,
+    COMMENT_FIELDS,
+    parse_fields,
+    parse_limit,
+    project,
+    decode_cursor,
+    paginate,
+    compress_response,
+)
+from i18n import render_template, get_template, supported_langs, translate, init_app as init_i18n
 from llm_scheduler import (
     LLMScheduler,
+    ADAPTIVE_DEFAULTS,
+    adaptive_setting,
     now_local_iso,
     get_post_edit_seq,
     get_category_name,
-    _get_prompt,
+    _pick_preset,
+    _prompt_from_preset,
+    generation_options,
+    generation_fields,
+    throughput_by_model,
 )
 
 # Global scheduler instance (started lazily on first request)
 scheduler = LLMScheduler()
 
+# 没拿到调度租约的进程（多 worker 部署）隔这么久再试一次，接替退出的那个进程
+SCHEDULER_RETRY_SEC = 30.0
+
+# /events：每条 SSE 连接一直占着服务器的一个工作线程，同时打开的流有上限（serve.py 按线程数设置），
+# 超出的标签页收到 204，改为轮询 /events/poll。每条流最长 SSE_STREAM_SEC 秒，到时浏览器自动重连。
+SSE_MAX_STREAMS = int(os.environ.get("JOURNAL_SSE_MAX_STREAMS") or 4)
+SSE_STREAM_SEC = float(os.environ.get("JOURNAL_SSE_STREAM_SEC") or 300)
+SSE_PING_SEC = 5.0
+
+
+def start_background_tasks() -> bool:
+    """Start the LLM scheduler and snapshots in this process if it wins the scheduler lease."""
+    if not scheduler.start():
+        return False
+    snapshot_scheduler.start()
+    return True
+
 
 def create_app() -> Flask:
     app = Flask(__name__)
     app.secret_key = os.environ.get("FLASK_SECRET_KEY", secrets.token_hex(16))
+    app.config["SSE_MAX_STREAMS"] = SSE_MAX_STREAMS
     # ===== UI language (simple i18n) =====
-    SUPPORTED_LANGS = {"zh": "中文", "en": "EN"}
-    TRANSLATIONS = {
-    "en": {
-        "📒 心得": "📒 Journal",
-        "文章列表": "Posts",
-        "写文章": "New Post",
-        "分类管理": "Categories",
-        "LLM 评论设置": "LLM Comments",
-        "文件管理": "Files",
-        "查看文件目录": "Open data folder",
-        "远程管理文件": "Manage files",
-        "切换主题": "Theme",
-        "深色主题": "Dark theme",
-        "浅色主题": "Light theme",
-        "筛选": "Filter",
-        "分类": "Category",
-        "关键词": "Keyword",
-        "搜索": "Search",
-        "清空": "Clear",
-        "全部": "All",
-        "文章": "Posts",
-        "这里还没有文章。": "No posts yet.",
-        "点右上角“写文章”开始记录吧。": "Click “New Post” to start writing.",
-        "上一页": "Prev",
-        "下一页": "Next",
-        "第": "Page",
-        "共": "of",
-        "本地 JSON 存储 · 适合个人记录": "Local JSON storage · Personal journaling",
-        "我的心得": "Journal",
-        "新评论": "New comments",
-        "条未读": "unread",
-        "评论时间：": "Comment time: ",
-        "打开": "Open",
-        "一键清除": "Clear all",
-        "没有未读评论。": "No unread comments.",
-        "目录：": "Directory: ",
-        "搜索（文件名/路径）": "Search (name/path)",
-        "路径": "Path",
-        "大小": "Size",
-        "修改时间": "Modified",
-        "没有匹配的文件": "No matching files.",
-        "编辑文件": "Edit file",
-        "提示：保存会直接覆盖原文件。": "Tip: saving will overwrite the original file.",
-        "回到首页": "Back to home",
-        "页面不存在": "Page not found",
-        "编辑文章": "Edit Post",
-        "返回列表": "Back",
-        "标题": "Title",
-        "例如：今天我意识到……": "e.g., Today I realized…",
-        "请选择分类": "Select a category",
-        "没有合适分类？去「分类管理」新建。": "No suitable category? Create one in “Categories”.",
-        "正文": "Content",
-        "支持缩进：按 Tab 插入 4 个空格，也支持 Shift+Tab 反向缩进。": "Indent supported: Tab inserts 4 spaces; Shift+Tab outdents.",
-        "缩进": "Indent",
-        "反缩进": "Outdent",
-        "插入时间": "Insert time",
-        "保存": "Save",
-        "未分类": "Uncategorized",
-        "发表：": "Published: ",
-        "编辑": "Edit",
-        "删除": "Delete",
-        "确定删除这篇文章吗？": "Are you sure you want to delete this post?",
-        "评论": "Comments",
-        "条": "items",
-        "还没有评论。": "No comments yet.",
-        "你可以点上面的“立即评论”，或者在「LLM 评论设置」里定时自动生成。": "You can click “Comment now” above, or enable scheduled auto-comments in “LLM Comments”.",
-        "选择模型立即评论": "Choose a model to comment now",
-        "🎲 随机模型": "🎲 Random model",
-        "立即评论": "Comment now",
-        "LLM 设置": "LLM settings",
-        "回文章列表": "Back to posts",
-        "新建分类": "New category",
-        "分类名称": "Category name",
-        "例如：读书笔记": "e.g., Reading notes",
-        "分类ID/英文代号（可选）": "Category ID / slug (optional)",
-        "例如：reading-notes（不填会自动生成）": "e.g., reading-notes (leave blank to auto-generate)",
-        "用于URL与内部存储；建议只用字母数字、_、-。": "Used for URL & storage; use letters/numbers/_/- only.",
-        "颜色": "Color",
-        "#RRGGBB 或 #RGB": "#RRGGBB or #RGB",
-        "添加": "Add",
-        "现有分类": "Existing categories",
-        "还没有分类。": "No categories yet.",
-        "颜色：": "Color: ",
-        "确定删除分类吗？（必须该分类下没有文章）": "Delete this category? (It must have no posts.)",
-        "标题 / 正文 中搜索": "Search in title / content",
-        "应用": "Apply",
-        "重置": "Reset",
-        "篇": "posts",
-        "当前分类：": "Current category: ",
-        "仅支持编辑": "Only editable:",
-        "文件。": "files.",
-        "Ollama / LLM 配置": "Ollama / LLM Config",
-        "自动评论": "Auto comments",
-        "开启": "On",
-        "关闭": "Off",
-        "当前自动评论状态：": "Auto-comment status: ",
-        "切换失败：请检查服务是否正常运行。": "Switch failed: please check the service is running.",
-        "服务器": "Server",
-        "端口": "Port",
-        "模型限制（可多选；不选=允许全部）": "Allowed models (multi-select; none = allow all)",
-        "如果这里空白，说明当前未能拉取模型列表（可先点“测试连接”）。": "If blank, the model list couldn’t be fetched (try “Test connection”).",
-        "默认频率（分钟）": "Default interval (minutes)",
-        "默认每 120 分钟（=2小时）": "Default: every 120 minutes (=2 hours)",
-        "每篇默认最多评论次数": "Default max comments per post",
-        "挑选文章策略": "Post selection strategy",
-        "优先没被评论过的文章，其次随机": "Prefer un-commented posts; otherwise random",
-        "优先最新文章": "Prefer newest posts",
-        "模型细化设置（可选）": "Per-model overrides (optional)",
-        "你可以针对每个模型设置：间隔分钟数 / 每篇最多评论次数。": "For each model, you can set: interval minutes / max comments per post.",
-        "间隔(分钟)": "Interval (min)",
-        "每篇上限": "Max per post",
-        "例如 120": "e.g. 120",
-        "例如 2": "e.g. 2",
-        "测试连接": "Test connection",
-        "保存配置": "Save settings",
-        "立即评论（生成一条）": "Comment now (generate one)",
-        "立刻挑一篇可评论的笔记，生成 1 条评论（不会超过“每篇上限”）。": "Pick an eligible note and generate 1 comment (won’t exceed “Max per post”).",
-        "评论内容：": "Comments: ",
-        "提示词管理": "Prompt presets",
-        "为了简单好维护，这里用“JSON 数组”编辑提示词预设（每个预设包含 id/name/system/user_prefix）。": "For simplicity, edit prompt presets as a JSON array (each has id/name/system/user_prefix).",
-        "当前启用的预设 ID（可多个，用英文逗号分隔；将随机选择）": "Active preset IDs (comma-separated; randomly chosen)",
-        "提示词预设（JSON 数组）": "Prompt presets (JSON array)",
-        "关闭时，后台不会定时生成；但“立即评论”仍然可用。": "When off, scheduled generation stops, but “Comment now” still works.",
-        "请选择": "Please select",
-        "选择模型": "Model",
-        "保存位置": "Storage locations",
-        "LLM 设置：": "LLM settings: ",
-        "下载": "Download",
-        "共计": "Total",
-        "已保存。": "Saved.",
-        "已删除。": "Deleted.",
-        "分类已添加。": "Category added.",
-        "分类已删除。": "Category deleted.",
-        "LLM 配置已保存。": "LLM settings saved.",
-        "已清除所有新评论提醒。": "All new comment notices cleared.",
-        "评论不存在或已处理。": "Comment not found or already handled.",
-        "请选择模型。": "Please select a model.",
-        "文章不存在。": "Post not found.",
-        "没有文章可以评论。": "No posts to comment on.",
-        "模型没有返回内容。": "The model returned no content.",
-        "标题不能为空。": "Title cannot be empty.",
-        "请选择分类。": "Please select a category.",
-        "正文不能为空。": "Content cannot be empty.",
-        "分类名称不能为空。": "Category name cannot be empty.",
-    },
-    "zh": {
-        "📒 Journal": "📒 心得"
-    }
-}
+    # 翻译目录在 i18n/*.json，启动时加载一次；模板里的 t("字面量") 在编译期替换
+    SUPPORTED_LANGS = supported_langs()
+    init_i18n(app)
+
+    # 上次写到一半崩溃：补完已提交的事务，清掉没提交的暂存文件
+    recover_transactions()
+    # JOURNAL_STORAGE_LAYOUT 变了：单文件 <-> 按月分片
+    migrate_storage_layout()
+    # 旧版 posts.json 里带正文：启动时迁移到 blobs/
+    migrate_post_bodies()
 
     def get_lang() -> str:
         lang = (session.get("lang") or "").strip().lower()
         return lang if lang in SUPPORTED_LANGS else "zh"
 
     def t(key: str) -> str:
-        if key is None:
-            return ""
-        lang = get_lang()
-        # If key is already in the target language, return as-is
-        return TRANSLATIONS.get(lang, {}).get(key, key)
+        return translate(get_lang(), key)
 
     @app.before_request
     def _set_lang():
@@ -237,20 +170,83 @@ def create_app() -> Flask:
         return redirect(next_url)
 
 
+    # ===== HTTP caching (ETag / fingerprinted static) =====
+    # 每个页面的导航栏都有未读数，所以都依赖评论数据（分片模式下是 manifest）
+    LISTING_FILES = (POSTS_VERSION_PATH, CATEGORIES_PATH, COMMENTS_VERSION_PATH)
+    POST_PAGE_FILES = (POSTS_VERSION_PATH, POST_META_PATH, CATEGORIES_PATH, COMMENTS_VERSION_PATH, LLM_CONFIG_PATH)
+
+    def page_validators(name: str, files: Tuple[str, ...], *parts: Any) -> Tuple[str, float]:
+        """ETag + Last-Modified for a page, from data file versions only (no JSON load)."""
+        etag = make_etag(name, get_lang(), data_version(*files), *parts)
+        return etag, data_mtime(*files)
+
+    @app.url_defaults
+    def _static_fingerprint(endpoint: str, values: Dict[str, Any]) -> None:
+        if endpoint == "static" and "filename" in values and "v" not in values:
+            fp = static_fingerprint(app.static_folder, values["filename"])
+            if fp:
+                values["v"] = fp
+
+    @app.after_request
+    def _static_cache_headers(resp):
+        if request.endpoint == "static" and resp.status_code in (200, 304):
+            filename = (request.view_args or {}).get("filename") or ""
+            v = request.args.get("v")
+            if v and v == static_fingerprint(app.static_folder, filename):
+                resp.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE}, immutable"
+        return resp
+
+    # ===== Metrics (JOURNAL_METRICS=1) =====
+    if metrics.ENABLED:
+        @app.before_request
+        def _metrics_start():
+            g._metrics_t0 = time.perf_counter()
+
+        @app.after_request
+        def _metrics_observe(resp):
+            t0 = getattr(g, "_metrics_t0", None)
+            if t0 is not None:
+                route = request.url_rule.rule if request.url_rule else "<unmatched>"
+                metrics.REQUEST_SECONDS.observe(time.perf_counter() - t0, route, request.method, str(resp.status_code))
+            return resp
+
+        def _collect_runtime():
+            st = fragments.stats()
+            yield ("journal_fragment_cache_hits_total", "Fragment cache hits.", "counter", [({}, st["hits"])])
+            yield ("journal_fragment_cache_misses_total", "Fragment cache misses.", "counter", [({}, st["misses"])])
+            yield ("journal_fragment_cache_bytes", "Bytes held by the fragment cache.", "gauge", [({}, st["bytes"])])
+            yield ("journal_sse_subscribers", "Connected /events clients.", "gauge", [({}, bus.subscriber_count())])
+
+        metrics.REGISTRY.add_collector(_collect_runtime)
+
+    @app.get("/metrics")
+    def metrics_endpoint():
+        if not metrics.ENABLED:
+            abort(404)
+        require_admin()
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
     # ===== Background scheduler (safe for `flask run` debug reloader) =====
-    def _maybe_start_scheduler() -> None:
+    def _maybe_start_scheduler() -> bool:
+        """False only when another process holds the scheduler lease (retry later)."""
         # Avoid double-start when debug reloader is on
         if os.environ.get("WERKZEUG_RUN_MAIN") == "true" or not app.debug:
             try:
-                scheduler.start()
+                return start_background_tasks()
             except Exception:
                 pass
+        return True
 
     @app.before_request
     def _start_scheduler_once():
-        if not getattr(app, "_scheduler_started", False):
-            _maybe_start_scheduler()
-            app._scheduler_started = True
+        if getattr(app, "_scheduler_started", False):
+            return
+        now = time.monotonic()
+        if now >= getattr(app, "_scheduler_retry_at", 0.0):
+            if _maybe_start_scheduler():
+                app._scheduler_started = True
+            else:
+                app._scheduler_retry_at = now + SCHEDULER_RETRY_SEC
 
     # ===== Helpers =====
     def slugify(s: str) -> str:
@@ -271,14 +267,14 @@ def create_app() -> Flask:
         return None
 
     def unread_count() -> int:
-        return sum(1 for c in load_comments() if not c.get("read", False))
+        return count_unread_comments()
 
     @app.context_processor
     def inject_globals():
         return {"unread_count": unread_count()}
 
     def allowed_models_from_cfg(cfg: Dict[str, Any]) -> List[str]:
-        models = list_models(cfg.get("server", "127.0.0.1"), int(cfg.get("port", 11434)))
+        models = list_models(cfg)
         allowed = cfg.get("allowed_models") or []
         if allowed:
             aset = set(allowed)
@@ -286,26 +282,45 @@ def create_app() -> Flask:
         return models
 
     def init_post_meta(post_id: str, content: str) -> None:
+        now = now_local_iso()
         meta = load_post_meta()
         meta.setdefault("meta", {})[post_id] = {
             "edit_seq": 0,
-            "updated_at": now_local_iso(),
-            "content_hash": hashlib.sha256((content or "").encode("utf-8")).hexdigest(),
+            "updated_at": now,
+            "content_hash": content_hash(content),
         }
         save_post_meta(meta)
+        record_revision(post_id, 0, content, now)
 
-    def bump_post_edit_seq(post_id: str, content: str) -> int:
+    def bump_post_edit_seq(post_id: str, content: str, previous: Optional[str] = None) -> int:
+        """previous: the body before this edit (seeds history for posts saved before revisions existed)."""
+        now = now_local_iso()
         meta = load_post_meta()
         m = (meta.get("meta") or {}).get(post_id) or {}
         seq = int(m.get("edit_seq", 0)) + 1
+        previous_at = m.get("updated_at", "")
         m["edit_seq"] = seq
-        m["updated_at"] = now_local_iso()
-        m["content_hash"] = hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+        m["updated_at"] = now
+        m["content_hash"] = content_hash(content)
         meta.setdefault("meta", {})[post_id] = m
         save_post_meta(meta)
+        record_revision(post_id, seq, content, now, previous=previous, previous_at=previous_at)
         return seq
 
-    def build_prompt_for_post(cfg: Dict[str, Any], post: Dict[str, Any]) -> Dict[str, str]:
+    # ===== Rendered fragments (LRU cached) =====
+    def render_fragment(name: str, key: Tuple, **ctx: Any):
+        def _render() -> str:
+            # 直接用 jinja_env 渲染片段：不触发 context processor（避免重复读 comments.json）
+            t0 = time.perf_counter()
+            html = get_template(name).render(t=t, lang=g.lang, **ctx)
+            profiler.note("render", time.perf_counter() - t0)
+            return html
+        return fragments.get_or_render(key, _render)
+
+    def comment_set_version(comments: List[Dict[str, Any]]) -> str:
+        return make_etag(*(c.get("id") for c in comments))
+
+    def build_prompt_for_post(cfg: Dict[str, Any], post: Dict[str, Any], model: str = "") -> Dict[str, Any]:
         cat_id = post.get("category", "")
         payload = {
             "title": post.get("title", ""),
@@ -313,32 +328,31 @@ def create_app() -> Flask:
             "category_name": get_category_name(cat_id),
             "published_at": post.get("published_at", ""),
             "edit_seq": get_post_edit_seq(post.get("id")),
-            "content": post.get("content", ""),
+            "content": load_post_body(post),
         }
-        system, prefix = _get_prompt(cfg)
+        preset = _pick_preset(cfg)
+        system, prefix = _prompt_from_preset(preset)
         user_prompt = (
             f"{prefix}\n\n"
             "请基于下面这条笔记的 JSON 信息进行评论与反馈（不要忽略字段）：\n"
             f"{json.dumps(payload, ensure_ascii=False, indent=2)}\n"
         )
-        return {"system": system, "user_prompt": user_prompt}
+        return {"system": system, "user_prompt": user_prompt, "options": generation_options(cfg, model, preset)}
 
-    def add_comment_record(post_id: str, model: str, content: str) -> str:
+    def add_comment_record(post_id: str, model: str, content: str, stats: Optional[Dict[str, Any]] = None) -> str:
         cid = secrets.token_urlsafe(8)
-        with file_lock(LOCK_COMMENTS):
-            comments = load_comments()
-            comments.append(
-                {
-                    "id": cid,
-                    "post_id": post_id,
-                    "post_edit_seq": get_post_edit_seq(post_id),
-                    "model": model,
-                    "content": (content or "").strip(),
-                    "created_at": now_local_iso(),
-                    "read": False,
-                }
-            )
-            save_comments(comments)
+        record = {
+            "id": cid,
+            "post_id": post_id,
+            "post_edit_seq": get_post_edit_seq(post_id),
+            "model": model,
+            "content": (content or "").strip(),
+            "created_at": now_local_iso(),
+            "read": False,
+            **generation_fields(stats),
+        }
+        unread = comment_writer.append(record).result(COMMENT_WRITE_TIMEOUT)
+        publish_new_comment(record, unread)
         return cid
 
     def pick_random_model(cfg: Dict[str, Any]) -> str:
@@ -348,15 +362,47 @@ def create_app() -> Flask:
         return random.choice(models)
 
     # ===== Optional admin token for file management =====
-    def require_admin() -> bool:
+    def is_admin() -> bool:
         token = (os.environ.get("JOURNAL_ADMIN_TOKEN") or "").strip()
         if not token:
             return True
         got = (request.args.get("token") or request.headers.get("X-Admin-Token") or "").strip()
-        if got == token:
+        return got == token
+
+    def require_admin() -> bool:
+        if is_admin():
             return True
         abort(403)
 
+    # ===== Request profiler (JOURNAL_PROFILE=1 or ?profile=1) =====
+    @app.before_request
+    def _profile_start():
+        if request.endpoint in ("static", "events"):
+            return
+        if profiler.ENABLED or (request.args.get("profile") == "1" and is_admin()):
+            profiler.start(request.method, request.full_path.rstrip("?"))
+
+    @app.after_request
+    def _profile_stop(resp):
+        if profiler.active():
+            profiler.stop(resp.status_code)
+        return resp
+
+    @app.teardown_request
+    def _profile_teardown(_exc):
+        # 异常时 after_request 不会执行
+        if profiler.active():
+            profiler.stop(500)
+
+    def _on_render_start(sender, **extra):
+        profiler.render_started()
+
+    def _on_render_done(sender, **extra):
+        profiler.render_finished()
+
+    before_render_template.connect(_on_render_start, app)
+    template_rendered.connect(_on_render_done, app)
+
     def _safe_data_path(rel_path: str) -> str:
         rel_path = (rel_path or "").lstrip("/\\")
         norm = os.path.normpath(rel_path)
@@ -368,9 +414,11 @@ def create_app() -> Flask:
             raise ValueError("非法路径")
         return full
 
+    EDITABLE_EXTS = (".json", ".log", ".txt")
+
     def _allowed_ext(path: str) -> bool:
         ext = os.path.splitext(path)[1].lower()
-        return ext in (".json", ".log", ".txt")
+        return ext in EDITABLE_EXTS
 
     def _human_size(n: int) -> str:
         try:
@@ -390,26 +438,17 @@ def create_app() -> Flask:
     # ===== Home/List =====
     @app.get("/")
     def index():
+        etag, mtime = page_validators("index", LISTING_FILES)
+        cached = not_modified(etag, mtime)
+        if cached is not None:
+            return cached
+
         cats = load_categories()
         cm = {c["id"]: c for c in cats}
 
         cat = request.args.get("cat", "").strip()
         q = request.args.get("q", "").strip()
 
-        posts = load_posts()
-        posts.sort(key=lambda p: p.get("published_at", ""), reverse=True)
-
-        if cat:
-            posts = [p for p in posts if p.get("category") == cat]
-        if q:
-            ql = q.lower()
-            posts = [
-                p
-                for p in posts
-                if ql in (p.get("title", "").lower() + " " + p.get("content", "").lower())
-            ]
-
-
         # Pagination
         try:
             page = int(request.args.get("page", "1"))
@@ -418,16 +457,51 @@ def create_app() -> Flask:
         if page < 1:
             page = 1
         per_page = 8
-        total = len(posts)
+
+        if q:
+            posts = load_posts()
+            posts.sort(key=lambda p: p.get("published_at", ""), reverse=True)
+            if cat:
+                posts = [p for p in posts if p.get("category") == cat]
+            # 只有搜索时才读正文
+            ql = q.lower()
+            posts = [
+                p
+                for p in posts
+                if ql in p.get("title", "").lower() or ql in load_post_body(p).lower()
+            ]
+            total = len(posts)
+        else:
+            # 不搜索时只读当前页所在的分片
+            posts = None
+            page_posts, total = load_posts_page((page - 1) * per_page, per_page, cat)
+
         pages = max(1, (total + per_page - 1) // per_page)
         if page > pages:
             page = pages
+            if posts is None:
+                page_posts, total = load_posts_page((page - 1) * per_page, per_page, cat)
         start = (page - 1) * per_page
         end = start + per_page
-        page_posts = posts[start:end]
-        return render_template(
+        if posts is not None:
+            page_posts = posts[start:end]
+
+        cat_ver = data_version(CATEGORIES_PATH)
+        # 片段按文章头的内容做键：别的进程（导入 CLI）改了文章也不会用到旧片段
+        post_cards = {
+            p.get("id"): render_fragment(
+                "_post_card.html",
+                ("card", p.get("id"), make_etag(p.get("title"), p.get("category"), p.get("published_at"),
+                                                p.get("content_hash")), g.lang, cat_ver),
+                p=p,
+                cat_map=cm,
+            )
+            for p in page_posts
+        }
+        resp = make_response(render_template(
             "index.html",
             posts=page_posts,
+            post_cards=post_cards,
             categories=cats,
             cat_map=cm,
             selected_cat=cat,
@@ -435,7 +509,8 @@ def create_app() -> Flask:
             page=page,
             pages=pages,
             total=total,
-        )
+        ))
+        return apply_validators(resp, etag, mtime)
 
     # ===== Posts =====
     @app.get("/post/new")
@@ -461,7 +536,8 @@ def create_app() -> Flask:
             flash("分类不存在（可能被删除）。请重新选择。", "danger")
             return redirect(url_for("new_post"))
 
-        with file_lock(LOCK_POSTS):
+        # 文章和 post_meta 一次提交，不会出现没有 meta 的文章
+        with transaction(LOCK_POSTS, LOCK_POST_META):
             posts = load_posts()
             post_id = secrets.token_urlsafe(8)
             posts.append(
@@ -474,23 +550,29 @@ def create_app() -> Flask:
                 }
             )
             save_posts(posts)
-
-        with file_lock(LOCK_POST_META):
             init_post_meta(post_id, content)
 
         flash("已保存。", "success")
         return redirect(url_for("view_post", post_id=post_id))
 
+    # 模型下拉框来自 Ollama：ETag 里放缓存的 /api/tags 结果（不发网络请求），
+    # llm_config.json 只在文件变化时重新解析
+    _models_cfg: Dict[str, Any] = {}
+
+    def models_fingerprint() -> Optional[str]:
+        ver = data_version(LLM_CONFIG_PATH)
+        if _models_cfg.get("ver") != ver:
+            _models_cfg.update(ver=ver, cfg=load_llm_config())
+        return backend_pool.tags_fingerprint(_models_cfg["cfg"])
+
     @app.get("/post/<post_id>")
     def view_post(post_id: str):
-        post = next((p for p in load_posts() if p.get("id") == post_id), None)
-        if not post:
-            abort(404)
-        category = find_category(post.get("category", ""))
-
-        comments = load_comments()
-        post_comments = [c for c in comments if c.get("post_id") == post_id]
-        post_comments.sort(key=lambda c: c.get("created_at", ""))
+        fp = models_fingerprint()
+        if fp is not None:
+            etag, mtime = page_validators("view", POST_PAGE_FILES, post_id, fp)
+            cached = not_modified(etag, mtime)
+            if cached is not None:
+                return cached
 
         cfg = load_llm_config()
         try:
@@ -498,20 +580,81 @@ def create_app() -> Flask:
         except Exception:
             models = []
 
-        return render_template(
+        post = find_post(post_id)
+        if not post:
+            abort(404)
+        category = find_category(post.get("category", ""))
+
+        post_comments = load_comments_for_post(post_id)
+        post_comments.sort(key=lambda c: c.get("created_at", ""))
+
+        edit_seq = get_post_edit_seq(post_id)
+        post_body_html = render_fragment(
+            "_post_body.html", ("body", post_id, post.get("content_hash", ""), g.lang), post=post,
+            load_body=load_post_body,
+        )
+        # 评论写于旧版本时链接到那一版；只有存在这种评论时才读历史文件
+        rev_seqs: set = set()
+        if any(int(c.get("post_edit_seq", 0) or 0) != edit_seq for c in post_comments):
+            rev_seqs = {r["seq"] for r in list_revisions(post_id)}
+        comments_html = render_fragment(
+            "_comments.html",
+            ("comments", post_id, comment_set_version(post_comments), edit_seq, g.lang),
+            comments=post_comments,
+            post_id=post_id,
+            edit_seq=edit_seq,
+            rev_seqs=rev_seqs,
+        )
+
+        resp = make_response(render_template(
             "view.html",
             post=post,
             category=category,
             comments=post_comments,
             models=models,
+            post_body_html=post_body_html,
+            comments_html=comments_html,
+        ))
+        # allowed_models_from_cfg 可能刚刷新了 tags 缓存
+        etag, mtime = page_validators("view", POST_PAGE_FILES, post_id, models_fingerprint() or "")
+        return apply_validators(resp, etag, mtime)
+
+    @app.get("/post/<post_id>/rev/<int:seq>")
+    def view_revision(post_id: str, seq: int):
+        post = find_post(post_id)
+        if not post:
+            abort(404)
+        try:
+            rev = get_revision(post_id, seq)
+        except ValueError:
+            rev = None
+        if rev is None:
+            flash(f"没有保存第 {seq} 版（可能是在版本历史功能之前编辑的）。", "warning")
+            return redirect(url_for("view_post", post_id=post_id))
+
+        edit_seq = get_post_edit_seq(post_id)
+        diff = ""
+        if seq != edit_seq:
+            diff = "".join(difflib.unified_diff(
+                rev["content"].splitlines(keepends=True),
+                load_post_body(post).splitlines(keepends=True),
+                fromfile=f"#{seq}", tofile=f"#{edit_seq}",
+            ))
+        return render_template(
+            "revision.html",
+            post=post,
+            rev=rev,
+            edit_seq=edit_seq,
+            revisions=list_revisions(post_id),
+            diff=diff,
         )
 
     @app.get("/post/<post_id>/edit")
     def edit_post(post_id: str):
-        post = next((p for p in load_posts() if p.get("id") == post_id), None)
+        post = find_post(post_id)
         if not post:
             abort(404)
-        return render_template("editor.html", mode="edit", post=post, categories=load_categories())
+        return render_template("editor.html", mode="edit", post=with_body(post), categories=load_categories())
 
     @app.post("/post/<post_id>/edit")
     def update_post(post_id: str):
@@ -526,41 +669,49 @@ def create_app() -> Flask:
             flash("分类不存在（可能被删除）。请重新选择。", "danger")
             return redirect(url_for("edit_post", post_id=post_id))
 
-        with file_lock(LOCK_POSTS):
+        with transaction(LOCK_POSTS, LOCK_POST_META):
             posts = load_posts()
-            post = next((p for p in posts if p.get("id") == post_id), None)
-            if not post:
+            i = next((i for i, p in enumerate(posts) if p.get("id") == post_id), None)
+            if i is None:
                 abort(404)
+            old_hash = posts[i].get("content_hash", "")
+            old_content = load_post_body(posts[i])
+            # 缓存里的记录是共享只读的，改副本
+            posts[i] = post = posts[i].copy()
             post["title"] = title
             post["category"] = category
             post["content"] = content
             save_posts(posts)
-
-        with file_lock(LOCK_POST_META):
-            bump_post_edit_seq(post_id, content)
+            drop_blob_if_unused(old_hash, load_posts())
+            bump_post_edit_seq(post_id, content, previous=old_content)
+        fragments.invalidate_post(post_id)
 
         flash("已更新（编辑后会允许各模型再次追加评论）。", "success")
         return redirect(url_for("view_post", post_id=post_id))
 
     @app.post("/post/<post_id>/delete")
     def delete_post(post_id: str):
-        with file_lock(LOCK_POSTS):
+        # 文章 / 评论 / post_meta 一次提交：中途崩溃不会留下孤儿评论
+        with transaction(LOCK_POSTS, LOCK_COMMENTS, LOCK_POST_META):
             posts = load_posts()
+            gone = next((p for p in posts if p.get("id") == post_id), None)
             posts = [p for p in posts if p.get("id") != post_id]
             save_posts(posts)
+            if gone:
+                drop_blob_if_unused(gone.get("content_hash", ""), posts)
 
-        with file_lock(LOCK_COMMENTS):
             comments = load_comments()
             comments = [c for c in comments if c.get("post_id") != post_id]
             save_comments(comments)
 
-        with file_lock(LOCK_POST_META):
             meta = load_post_meta()
             mm = meta.get("meta") or {}
             if post_id in mm:
                 del mm[post_id]
             meta["meta"] = mm
             save_post_meta(meta)
+            delete_history(post_id)
+        fragments.invalidate_post(post_id)
 
         flash("已删除。", "warning")
         return redirect(url_for("index"))
@@ -611,8 +762,12 @@ def create_app() -> Flask:
     # ===== Notifications =====
     @app.get("/notifications")
     def notifications():
-        comments = load_comments()
-        unread = [c for c in comments if not c.get("read", False)]
+        etag, mtime = page_validators("notifications", (COMMENTS_VERSION_PATH, POSTS_VERSION_PATH))
+        cached = not_modified(etag, mtime)
+        if cached is not None:
+            return cached
+
+        unread = load_unread_comments()
         posts = {p["id"]: p for p in load_posts()}
         unread.sort(key=lambda c: c.get("created_at", ""), reverse=True)
         items = []
@@ -629,31 +784,96 @@ def create_app() -> Flask:
                     "created_at": c.get("created_at", ""),
                 }
             )
-        return render_template("notifications.html", items=items)
+        resp = make_response(render_template("notifications.html", items=items))
+        return apply_validators(resp, etag, mtime)
 
     @app.post("/notifications/clear")
     def notifications_clear():
-        with file_lock(LOCK_COMMENTS):
-            comments = load_comments()
-            for c in comments:
-                c["read"] = True
-            save_comments(comments)
+        comment_writer.mark_all_read().result(COMMENT_WRITE_TIMEOUT)
+        publish_unread(0)
         flash("已清除所有新评论提醒。", "success")
         return redirect(url_for("notifications"))
 
     @app.get("/comment/<comment_id>/open")
     def open_comment(comment_id: str):
-        with file_lock(LOCK_COMMENTS):
-            comments = load_comments()
-            target = next((c for c in comments if c.get("id") == comment_id), None)
-            if target:
-                target["read"] = True
-                save_comments(comments)
-                post_id = target.get("post_id")
-                return redirect(url_for("view_post", post_id=post_id) + f"#c-{comment_id}")
+        target = comment_writer.mark_read(comment_id).result(COMMENT_WRITE_TIMEOUT)
+        if target:
+            publish_unread(count_unread_comments())
+            post_id = target.get("post_id")
+            return redirect(url_for("view_post", post_id=post_id) + f"#c-{comment_id}")
         flash("评论不存在或已处理。", "secondary")
         return redirect(url_for("notifications"))
 
+    # ===== Live events (SSE) =====
+    def unread_since(since: str) -> Tuple[int, List[Dict[str, Any]]]:
+        """Unread count, and the unread comments created at or after `since` (oldest first)."""
+        unread = load_unread_comments()
+        fresh = [c for c in unread if since and c.get("created_at", "") >= since]
+        fresh.sort(key=lambda c: c.get("created_at", ""))
+        return len(unread), fresh
+
+    @app.get("/events")
+    def events():
+        """Server-Sent Events stream: pushes new comments / unread count to open tabs."""
+        q = bus.subscribe(app.config["SSE_MAX_STREAMS"])
+        if q is None:
+            # 204 让 EventSource 停止重连，前端改用 /events/poll
+            return Response(status=204)
+        # 重连时从上次收到的最后一条评论（事件 id = created_at）接着补
+        since = request.headers.get("Last-Event-ID") or now_local_iso()
+
+        def stream():
+            deadline = time.monotonic() + SSE_STREAM_SEC
+            version = data_version(COMMENTS_VERSION_PATH)
+            sent: set = set()
+            try:
+                # 断线后浏览器 5 秒自动重连
+                yield "retry: 5000\n\n"
+                while time.monotonic() < deadline:
+                    try:
+                        event, data = q.get(timeout=SSE_PING_SEC)
+                    except queue.Empty:
+                        event = None
+                    if event is not None:
+                        if event == "comment":
+                            sent.add(data.get("comment_id"))
+                            yield format_sse(event, data, data.get("created_at"))
+                        else:
+                            yield format_sse(event, data)
+                        continue
+                    # 多 worker 时别的进程写的评论不经过本进程的 bus：评论文件变了就自己找新评论
+                    v = data_version(COMMENTS_VERSION_PATH)
+                    if v == version:
+                        # 心跳：让代理不断开连接，也让服务端尽快发现已关闭的标签页、释放线程
+                        yield ": ping\n\n"
+                        continue
+                    version = v
+                    unread, fresh = unread_since(since)
+                    for c in fresh:
+                        if c.get("id") not in sent:
+                            sent.add(c.get("id"))
+                            yield format_sse("comment", comment_event(c, unread), c.get("created_at"))
+                    yield format_sse("unread", {"unread": unread})
+            finally:
+                bus.unsubscribe(q)
+
+        return Response(
+            stream(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.get("/events/poll")
+    def events_poll():
+        """Polling fallback: unread count + unread comments created at or after `since`."""
+        now = now_local_iso()
+        unread, fresh = unread_since(request.args.get("since", ""))
+        return jsonify({
+            "since": now,
+            "unread": unread,
+            "comments": [comment_event(c, unread) for c in fresh[-20:]],
+        })
+
     # ===== Open data directory (local machine helper) =====
     @app.get("/open_data_dir")
     def open_data_dir():
@@ -682,39 +902,37 @@ def create_app() -> Flask:
         base = os.path.abspath(DATA_DIR)
         files_list = []
 
-        for root, _dirs, filenames in os.walk(base):
-            for fn in filenames:
-                full = os.path.join(root, fn)
-                if not _allowed_ext(full):
-                    continue
+        # 快照、历史版本、月份分片和事务日志都由程序维护（里面也有 .json），不列出来
+        skip = tuple(os.path.abspath(d) for d in (SNAPSHOTS_DIR, REVISIONS_DIR, SHARDS_DIR, TXN_DIR))
+        for f in dir_listing.list_files(base, EDITABLE_EXTS, skip=skip):
+            rel = f["rel"]
 
-                rel = os.path.relpath(full, base).replace("\\", "/")
-
-                # 支持按文件名/路径搜索
-                if q and ql not in rel.lower():
-                    continue
+            # 支持按文件名/路径搜索
+            if q and ql not in rel.lower():
+                continue
 
-                try:
-                    st = os.stat(full)
-                    files_list.append(
-                        {
-                            "path": rel,
-                            # 兼容模板：既给人类可读，也给原始字节
-                            "size": int(st.st_size),
-                            "size_h": _human_size(st.st_size),
-                            # 兼容模板：给格式化字符串，同时也给时间戳
-                            "mtime_ts": int(st.st_mtime),
-                            "mtime": datetime.fromtimestamp(st.st_mtime).strftime("%Y-%m-%d %H:%M:%S"),
-                        }
-                    )
-                except Exception:
-                    continue
+            files_list.append(
+                {
+                    "path": rel,
+                    # 兼容模板：既给人类可读，也给原始字节
+                    "size": f["size"],
+                    "size_h": _human_size(f["size"]),
+                    # 兼容模板：给格式化字符串，同时也给时间戳
+                    "mtime_ts": int(f["mtime"]),
+                    "mtime": datetime.fromtimestamp(f["mtime"]).strftime("%Y-%m-%d %H:%M:%S"),
+                    # 太大的文件只能分页查看，不能整篇编辑
+                    "editable": f["size"] <= FILE_EDIT_MAX_BYTES,
+                }
+            )
 
         # 最近修改的排前
         files_list.sort(key=lambda x: x.get("mtime_ts", 0), reverse=True)
 
         # ✅关键：模板大概率用 files 变量名，这里同时传 files 和 items（不破坏旧模板）
-        return render_template("files.html", files=files_list, items=files_list, base_dir=base, q=q)
+        return render_template(
+            "files.html", files=files_list, items=files_list, base_dir=base, q=q,
+            llm_summary=call_log.summary(), llm_log_path=os.path.relpath(call_log.path, base).replace("\\", "/"),
+        )
 
     @app.get("/files/edit")
     def file_edit():
@@ -726,6 +944,9 @@ def create_app() -> Flask:
             abort(400)
         if not _allowed_ext(full) or not os.path.isfile(full):
             abort(404)
+        if os.path.getsize(full) > FILE_EDIT_MAX_BYTES:
+            flash(f"文件超过 {_human_size(FILE_EDIT_MAX_BYTES)}，只能分页查看或下载。", "info")
+            return redirect(url_for("file_view", path=rel))
         try:
             with open(full, "r", encoding="utf-8", errors="replace") as f:
                 content = f.read()
@@ -747,9 +968,15 @@ def create_app() -> Flask:
             abort(403)
         if not os.path.isfile(full):
             abort(404)
+        if os.path.getsize(full) > FILE_EDIT_MAX_BYTES:
+            flash(f"文件超过 {_human_size(FILE_EDIT_MAX_BYTES)}，不能在页面里整篇保存。", "danger")
+            return redirect(url_for("file_view", path=rel))
         try:
             with open(full, "w", encoding="utf-8") as f:
                 f.write(body)
+            # 手动改了数据文件，缓存的片段可能已过期
+            fragments.clear()
+            reindex_shard(full)
             flash("已保存。", "success")
         except Exception as e:
             flash(f"保存失败：{e.__class__.__name__}: {e}", "danger")
@@ -765,7 +992,114 @@ def create_app() -> Flask:
             abort(400)
         if not _allowed_ext(full) or not os.path.isfile(full):
             abort(404)
-        return send_file(full, as_attachment=True, download_name=os.path.basename(full))
+        # conditional：支持 Range（断点续传、curl -r 取日志尾部）和 If-None-Match
+        return send_file(full, as_attachment=True, download_name=os.path.basename(full), conditional=True)
+
+    # ===== Bulk export / import =====
+    @app.get("/files/export/journal.jsonl")
+    def export_journal_jsonl():
+        require_admin()
+        name = f"journal-{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl"
+        return Response(
+            export_jsonl(),
+            mimetype="application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="{name}"'},
+        )
+
+    @app.get("/files/export/journal.zip")
+    def export_journal_zip():
+        require_admin()
+        name = f"journal-{datetime.now().strftime('%Y%m%d-%H%M%S')}.zip"
+        return Response(
+            export_markdown_zip(),
+            mimetype="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{name}"'},
+        )
+
+    @app.post("/files/import")
+    def import_journal():
+        require_admin()
+        upload = request.files.get("file")
+        if not upload or not upload.filename:
+            flash("请选择要导入的文件（.jsonl 或 .zip）。", "danger")
+            return redirect(url_for("files"))
+        try:
+            stats = import_records(
+                read_import_file(upload.stream, upload.filename),
+                replace=request.form.get("replace") == "1",
+            )
+        except Exception as e:
+            flash(f"导入失败：{e.__class__.__name__}: {e}", "danger")
+            return redirect(url_for("files"))
+        fragments.clear()
+        publish_unread(count_unread_comments())
+        flash(
+            f"导入完成：文章 {stats['posts']} 篇，评论 {stats['comments']} 条，"
+            f"已存在跳过 {stats['skipped']}，无效 {stats['invalid']}（{stats['seconds']} 秒）。",
+            "success" if not stats["invalid"] else "warning",
+        )
+        for err in stats["errors"][:5]:
+            flash(err, "warning")
+        return redirect(url_for("files"))
+
+    @app.get("/files/view")
+    def file_view():
+        require_admin()
+        rel = request.args.get("path", "")
+        try:
+            full = _safe_data_path(rel)
+        except Exception:
+            abort(400)
+        if not _allowed_ext(full) or not os.path.isfile(full):
+            abort(404)
+        # 没给 offset 时：日志看末尾（最新），其它从头看
+        raw = request.args.get("offset")
+        if raw in (None, ""):
+            offset = None if full.lower().endswith(".log") else 0
+        elif raw == "tail":
+            offset = None
+        else:
+            try:
+                offset = max(0, int(raw))
+            except ValueError:
+                abort(400)
+        try:
+            page = read_page(full, offset)
+        except OSError as e:
+            flash(f"读取失败：{e.__class__.__name__}: {e}", "danger")
+            return redirect(url_for("files"))
+        return render_template(
+            "file_view.html",
+            path=rel,
+            page=page,
+            prev_offset=max(0, page["start"] - PAGE_BYTES) if page["start"] > 0 else None,
+            next_offset=page["end"] if page["end"] < page["size"] else None,
+            size_h=_human_size(page["size"]),
+            editable=page["size"] <= FILE_EDIT_MAX_BYTES,
+        )
+
+    @app.get("/files/profiler")
+    def profiler_page():
+        require_admin()
+        return render_template(
+            "profiler.html",
+            entries=profiler.slowest(),
+            enabled=profiler.ENABLED,
+            slow_ms=profiler.SLOW_MS,
+            slow_log=os.path.relpath(profiler.slow_log_path(), DATA_DIR).replace("\\", "/"),
+        )
+
+    @app.post("/files/profiler/clear")
+    def profiler_clear():
+        require_admin()
+        profiler.clear()
+        flash("已清空。", "success")
+        return redirect(url_for("profiler_page"))
+
+    @app.get("/api/cache/stats")
+    def api_cache_stats():
+        require_admin()
+        return jsonify({"ok": True, "fragments": fragments.stats()})
 
     # ===== LLM Settings =====
     @app.get("/llm")
@@ -774,23 +1108,30 @@ def create_app() -> Flask:
         models: List[str] = []
         error = None
         try:
-            models = list_models(cfg.get("server", "127.0.0.1"), int(cfg.get("port", 11434)))
+            models = backend_pool.list_models(cfg, max_age=0)
         except Exception as e:
             error = f"无法连接 Ollama：{e.__class__.__name__}: {e}"
         prompt_presets_text = json.dumps(cfg.get("prompt_presets") or [], ensure_ascii=False, indent=2)
+        backends_text = json.dumps(cfg.get("backends") or [], ensure_ascii=False, indent=2)
         return render_template(
             "llm.html",
             cfg=cfg,
             models=models,
             error=error,
             prompt_presets_text=prompt_presets_text,
+            backends_text=backends_text,
+            backends_status=backend_pool.snapshot(cfg),
+            adaptive={k: adaptive_setting(cfg, k) for k in ADAPTIVE_DEFAULTS},
+            dispatch={k: DISPATCH_DEFAULTS[k] if cfg.get(k) is None else cfg[k] for k in DISPATCH_DEFAULTS},
+            schedule=scheduler.snapshot(cfg),
+            throughput=throughput_by_model(load_comments()),
         )
 
     @app.post("/llm/test")
     def llm_test_connection():
         cfg = load_llm_config()
         try:
-            models = list_models(cfg.get("server", "127.0.0.1"), int(cfg.get("port", 11434)))
+            models = backend_pool.list_models(cfg, max_age=0)
             flash(f"连接成功，检测到 {len(models)} 个模型。", "success")
         except Exception as e:
             flash(f"连接失败：{e.__class__.__name__}: {e}", "danger")
@@ -841,7 +1182,16 @@ def create_app() -> Flask:
 
             intervals: Dict[str, int] = {}
             maxes: Dict[str, int] = {}
+            keep_alives: Dict[str, str] = {}
+            num_predicts: Dict[str, int] = {}
+            num_ctxs: Dict[str, int] = {}
             for k, v in request.form.items():
+                if k.startswith("num_predict__") and v.strip():
+                    num_predicts[k[len("num_predict__") :]] = int(v)
+                if k.startswith("num_ctx__") and v.strip():
+                    num_ctxs[k[len("num_ctx__") :]] = int(v)
+                if k.startswith("keep_alive__") and v.strip():
+                    keep_alives[k[len("keep_alive__") :]] = v.strip()
                 if k.startswith("interval__") and v.strip():
                     m = k[len("interval__") :]
                     intervals[m] = int(v)
@@ -851,6 +1201,36 @@ def create_app() -> Flask:
             cfg["interval_minutes_by_model"] = intervals
             cfg["max_comments_per_post_by_model"] = maxes
 
+            cfg["adaptive_backoff"] = bool(request.form.get("adaptive_backoff"))
+            cfg["throughput_aware"] = bool(request.form.get("throughput_aware"))
+            cfg["backoff_max_minutes"] = int(request.form.get("backoff_max_minutes") or ADAPTIVE_DEFAULTS["backoff_max_minutes"])
+            cfg["circuit_breaker_failures"] = int(
+                request.form.get("circuit_breaker_failures") or ADAPTIVE_DEFAULTS["circuit_breaker_failures"]
+            )
+            cfg["circuit_breaker_pause_minutes"] = int(
+                request.form.get("circuit_breaker_pause_minutes") or ADAPTIVE_DEFAULTS["circuit_breaker_pause_minutes"]
+            )
+            cfg["target_host_utilization"] = float(
+                request.form.get("target_host_utilization") or ADAPTIVE_DEFAULTS["target_host_utilization"]
+            )
+            cfg["num_predict_by_model"] = num_predicts
+            cfg["num_ctx_by_model"] = num_ctxs
+            cfg["num_predict_default"] = int(request.form.get("num_predict_default") or 0)
+            cfg["num_ctx_default"] = int(request.form.get("num_ctx_default") or 0)
+            keep_alive_default = (request.form.get("keep_alive_default") or "").strip()
+            try:
+                for v in [keep_alive_default, *keep_alives.values()]:
+                    parse_keep_alive(v)
+            except ValueError as e:
+                flash(str(e), "danger")
+                return redirect(url_for("llm_settings"))
+            cfg["keep_alive_by_model"] = keep_alives
+            cfg["keep_alive_default"] = keep_alive_default
+            cfg["warmup_lead_seconds"] = max(0, int(request.form.get("warmup_lead_seconds") or 0))
+            cfg["runs_per_wake"] = max(1, int(request.form.get("runs_per_wake") or 1))
+            cfg["max_concurrency_per_host"] = max(1, int(request.form.get("max_concurrency_per_host") or 1))
+            cfg["preempt_scheduled"] = bool(request.form.get("preempt_scheduled"))
+
             presets_json = (request.form.get("prompt_presets_json") or "").strip()
             if presets_json:
                 try:
@@ -861,6 +1241,16 @@ def create_app() -> Flask:
                     flash("提示词 JSON 解析失败：请检查格式（必须是 JSON 数组）。", "danger")
                     return redirect(url_for("llm_settings"))
 
+            backends_json = (request.form.get("backends_json") or "").strip()
+            try:
+                backends = json.loads(backends_json) if backends_json else []
+                if not isinstance(backends, list):
+                    raise ValueError("not a list")
+            except Exception:
+                flash("多主机 JSON 解析失败：请检查格式（必须是 JSON 数组）。", "danger")
+                return redirect(url_for("llm_settings"))
+            cfg["backends"] = backends
+
             ids_raw = (request.form.get("active_prompt_preset_id") or "").strip()
             cfg["active_prompt_preset_id"] = ids_raw
             cfg["active_prompt_preset_ids"] = [x.strip() for x in ids_raw.split(",") if x.strip()]
@@ -882,27 +1272,29 @@ def create_app() -> Flask:
         if model == "random":
             model = pick_random_model(cfg)
 
-        posts = load_posts()
+        posts, _total = load_posts_page(0, 1)
         if not posts:
             flash("没有文章可以评论。", "warning")
             return redirect(url_for("llm_settings"))
-        posts.sort(key=lambda p: p.get("published_at", ""), reverse=True)
         post = posts[0]
 
         try:
-            prompt = build_prompt_for_post(cfg, post)
-            resp = generate_comment(
-                cfg.get("server", "127.0.0.1"),
-                int(cfg.get("port", 11434)),
+            prompt = build_prompt_for_post(cfg, post, model)
+            stats: Dict[str, Any] = {}
+            resp = dispatcher.generate(
+                cfg,
                 model,
                 system=prompt["system"],
                 user_prompt=prompt["user_prompt"],
+                options=prompt["options"],
+                stats_out=stats,
                 timeout_sec=1800.0,
+                post_id=post.get("id", ""),
             )
             if not resp:
                 flash("模型没有返回内容。", "danger")
                 return redirect(url_for("llm_settings"))
-            add_comment_record(post.get("id"), model, resp)
+            add_comment_record(post.get("id"), model, resp, stats)
             flash(f"{model} 评论完成：{post.get('title', '')}", "success")
             return redirect(url_for("view_post", post_id=post.get("id")))
         except Exception as e:
@@ -920,25 +1312,28 @@ def create_app() -> Flask:
         if model == "random":
             model = pick_random_model(cfg)
 
-        post = next((p for p in load_posts() if p.get("id") == post_id), None)
+        post = find_post(post_id)
         if not post:
             flash("文章不存在。", "danger")
             return redirect(url_for("index"))
 
         try:
-            prompt = build_prompt_for_post(cfg, post)
-            resp = generate_comment(
-                cfg.get("server", "127.0.0.1"),
-                int(cfg.get("port", 11434)),
+            prompt = build_prompt_for_post(cfg, post, model)
+            stats: Dict[str, Any] = {}
+            resp = dispatcher.generate(
+                cfg,
                 model,
                 system=prompt["system"],
                 user_prompt=prompt["user_prompt"],
+                options=prompt["options"],
+                stats_out=stats,
                 timeout_sec=1800,
+                post_id=post.get("id", ""),
             )
             if not resp:
                 flash("模型没有返回内容。", "danger")
                 return redirect(url_for("view_post", post_id=post_id))
-            cid = add_comment_record(post_id, model, resp)
+            cid = add_comment_record(post_id, model, resp, stats)
             flash(f"{model} 评论完成。", "success")
             return redirect(url_for("view_post", post_id=post_id) + f"#c-{cid}")
         except Exception as e:
@@ -953,25 +1348,27 @@ def create_app() -> Flask:
         if model == "random":
             model = pick_random_model(cfg)
 
-        posts = load_posts()
+        posts, _total = load_posts_page(0, 1)
         if not posts:
             return jsonify({"ok": False, "message": "没有文章可以评论", "model": model}), 400
-        posts.sort(key=lambda p: p.get("published_at", ""), reverse=True)
         post = posts[0]
 
         try:
-            prompt = build_prompt_for_post(cfg, post)
-            resp = generate_comment(
-                cfg.get("server", "127.0.0.1"),
-                int(cfg.get("port", 11434)),
+            prompt = build_prompt_for_post(cfg, post, model)
+            stats: Dict[str, Any] = {}
+            resp = dispatcher.generate(
+                cfg,
                 model,
                 system=prompt["system"],
                 user_prompt=prompt["user_prompt"],
+                options=prompt["options"],
+                stats_out=stats,
                 timeout_sec=1800,
+                post_id=post.get("id", ""),
             )
             if not resp:
                 return jsonify({"ok": False, "message": "模型没有返回内容", "model": model}), 400
-            add_comment_record(post.get("id"), model, resp)
+            add_comment_record(post.get("id"), model, resp, stats)
             return jsonify({"ok": True, "message": f"{model} 评论完成", "model": model, "post_id": post.get("id")})
         except Exception as e:
             return jsonify({"ok": False, "message": f"失败：{e.__class__.__name__}: {e}", "model": model}), 500
@@ -980,7 +1377,7 @@ def create_app() -> Flask:
     def api_llm_run_now_for_post(post_id: str):
         model = (request.json or {}).get("model", "")
         cfg = load_llm_config()
-        post = next((p for p in load_posts() if p.get("id") == post_id), None)
+        post = find_post(post_id)
         if not post:
             return jsonify({"ok": False, "message": "文章不存在", "model": model}), 404
 
@@ -988,18 +1385,21 @@ def create_app() -> Flask:
             model = pick_random_model(cfg)
 
         try:
-            prompt = build_prompt_for_post(cfg, post)
-            resp = generate_comment(
-                cfg.get("server", "127.0.0.1"),
-                int(cfg.get("port", 11434)),
+            prompt = build_prompt_for_post(cfg, post, model)
+            stats: Dict[str, Any] = {}
+            resp = dispatcher.generate(
+                cfg,
                 model,
                 system=prompt["system"],
                 user_prompt=prompt["user_prompt"],
+                options=prompt["options"],
+                stats_out=stats,
                 timeout_sec=1800,
+                post_id=post.get("id", ""),
             )
             if not resp:
                 return jsonify({"ok": False, "message": "模型没有返回内容", "model": model}), 400
-            cid = add_comment_record(post_id, model, resp)
+            cid = add_comment_record(post_id, model, resp, stats)
             return jsonify(
                 {
                     "ok": True,
@@ -1012,6 +1412,102 @@ def create_app() -> Flask:
         except Exception as e:
             return jsonify({"ok": False, "message": f"失败：{e.__class__.__name__}: {e}", "model": model}), 500
 
+    # ===== JSON API (read-only, for sync clients / scripts) =====
+    def api_error(message: str, status: int = 400):
+        return jsonify({"ok": False, "message": message}), status
+
+    def post_records(posts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        mm = load_post_meta().get("meta") or {}
+        out = []
+        for p in posts:
+            m = mm.get(p.get("id")) or {}
+            rec = dict(p)
+            rec["edit_seq"] = int(m.get("edit_seq", 0) or 0)
+            rec["updated_at"] = m.get("updated_at") or p.get("published_at", "")
+            rec["content_hash"] = p.get("content_hash") or m.get("content_hash", "")
+            rec.pop("excerpt", None)
+            out.append(rec)
+        return out
+
+    @app.after_request
+    def _compress_api(resp):
+        if request.path.startswith("/api/"):
+            return compress_response(resp)
+        return resp
+
+    @app.get("/api/posts")
+    def api_posts():
+        """
+        Query: fields=a,b  limit=N  cursor=...  cat=<id>  updated_since=<iso>
+
+        按 published_at 倒序，游标分页；默认不返回 content。
+        """
+        try:
+            fields = parse_fields(request.args.get("fields"), POST_FIELDS, POST_LIST_DEFAULT_FIELDS)
+            limit = parse_limit(request.args.get("limit"))
+            cursor = decode_cursor(request.args.get("cursor"))
+        except ValueError as e:
+            return api_error(str(e))
+
+        records = post_records(load_posts())
+        cat = (request.args.get("cat") or "").strip()
+        if cat:
+            records = [r for r in records if r.get("category") == cat]
+        since = (request.args.get("updated_since") or "").strip()
+        if since:
+            records = [r for r in records if (r.get("updated_at") or "") > since]
+
+        page, next_cursor = paginate(records, "published_at", cursor, limit, descending=True)
+        if "content" in fields:
+            page = [with_body(r) for r in page]
+        return jsonify({
+            "ok": True,
+            "items": [project(r, fields) for r in page],
+            "next_cursor": next_cursor,
+        })
+
+    @app.get("/api/posts/<post_id>")
+    def api_post(post_id: str):
+        try:
+            fields = parse_fields(request.args.get("fields"), POST_FIELDS, POST_FIELDS)
+        except ValueError as e:
+            return api_error(str(e))
+        post = find_post(post_id)
+        if not post:
+            return api_error("文章不存在", 404)
+        rec = post_records([post])[0]
+        if "content" in fields:
+            rec = with_body(rec)
+        return jsonify({"ok": True, "item": project(rec, fields)})
+
+    @app.get("/api/posts/<post_id>/comments")
+    def api_post_comments(post_id: str):
+        """
+        Query: fields=a,b  limit=N  cursor=...  since=<iso>
+
+        按 created_at 正序，游标分页。
+        """
+        try:
+            fields = parse_fields(request.args.get("fields"), COMMENT_FIELDS, COMMENT_FIELDS)
+            limit = parse_limit(request.args.get("limit"))
+            cursor = decode_cursor(request.args.get("cursor"))
+        except ValueError as e:
+            return api_error(str(e))
+        if not find_post(post_id):
+            return api_error("文章不存在", 404)
+
+        records = load_comments_for_post(post_id)
+        since = (request.args.get("since") or "").strip()
+        if since:
+            records = [c for c in records if (c.get("created_at") or "") > since]
+
+        page, next_cursor = paginate(records, "created_at", cursor, limit, descending=False)
+        return jsonify({
+            "ok": True,
+            "items": [project(c, fields) for c in page],
+            "next_cursor": next_cursor,
+        })
+
     @app.errorhandler(404)
     def not_found(_):
         return render_template("404.html"), 404
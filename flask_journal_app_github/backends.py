@@ -0,0 +1,245 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+from ollama_client import list_models as _list_models
+
+
+# =========================
+# 多台 Ollama 主机：模型合并 / 路由 / 健康检查
+# =========================
+#
+# llm_config.json:
+#   "backends": [
+#     {"server": "10.0.0.2", "port": 11434, "weight": 2, "models": ["qwen2.5:14b"]},
+#     {"server": "10.0.0.3", "port": 11434, "weight": 1, "models": []}      # 空 = 以 /api/tags 为准
+#   ]
+# 没有 backends 时退回单台 server / port。
+#
+# 路由：只在提供该模型的健康主机里选；最近 AFFINITY_TTL_SEC 内跑过该模型的主机优先
+# （模型还在显存里，省去加载），其次按 未完成请求数 / weight 最小。
+# 连接失败的主机下线 HEALTH_RETRY_SEC 秒，之后由下一次 /api/tags 或生成请求探活。
+
+AFFINITY_TTL_SEC = 300.0  # Ollama 默认 keep_alive 5 分钟
+HEALTH_RETRY_SEC = 30.0
+TAGS_TTL_SEC = 10.0
+
+
+def configured_backends(cfg: Dict) -> List[Dict]:
+    out: List[Dict] = []
+    for b in cfg.get("backends") or []:
+        if not isinstance(b, dict):
+            continue
+        server = (str(b.get("server") or "")).strip()
+        if not server:
+            continue
+        try:
+            weight = float(b.get("weight", 1) or 1)
+        except (TypeError, ValueError):
+            weight = 1.0
+        out.append({
+            "server": server,
+            "port": int(b.get("port") or 11434),
+            "weight": max(0.01, weight),
+            "models": [m for m in (b.get("models") or []) if m],
+        })
+    if not out:
+        out.append({
+            "server": cfg.get("server", "127.0.0.1"),
+            "port": int(cfg.get("port", 11434)),
+            "weight": 1.0,
+            "models": [],
+        })
+    return out
+
+
+def backend_key(b: Dict) -> str:
+    return f"{b['server']}:{b['port']}"
+
+
+class _HostState:
+    def __init__(self):
+        self.down_until = 0.0
+        self.failures = 0
+        self.last_error = ""
+        self.tags: Optional[List[str]] = None
+        self.tags_at = 0.0
+        self.outstanding = 0
+        self.loaded: Dict[str, float] = {}  # model -> 最近一次成功生成的时间
+
+    def healthy(self, now: float) -> bool:
+        return self.down_until <= now
+
+
+class BackendPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, _HostState] = {}
+        self._refreshing = False
+
+    def _state(self, key: str) -> _HostState:
+        st = self._hosts.get(key)
+        if st is None:
+            st = self._hosts[key] = _HostState()
+        return st
+
+    # ---------- 健康 ----------
+    def mark_up(self, key: str) -> None:
+        with self._lock:
+            st = self._state(key)
+            st.down_until = 0.0
+            st.failures = 0
+            st.last_error = ""
+
+    def mark_down(self, key: str, error: BaseException) -> None:
+        with self._lock:
+            st = self._state(key)
+            st.failures += 1
+            st.last_error = f"{error.__class__.__name__}: {error}"
+            st.down_until = time.time() + HEALTH_RETRY_SEC
+
+    # ---------- 模型列表 ----------
+    def list_models(self, cfg: Dict, timeout_sec: float = 5.0, max_age: float = TAGS_TTL_SEC) -> List[str]:
+        """Union of /api/tags across backends (cached for `max_age` seconds). Raises if every host fails.
+
+        max_age=0 forces a fresh probe of every host, including ones currently marked down.
+        """
+        merged: List[str] = []
+        seen = set()
+        last_exc: Optional[BaseException] = None
+        any_ok = False
+        now = time.time()
+        for b in configured_backends(cfg):
+            key = backend_key(b)
+            with self._lock:
+                st = self._state(key)
+                cached = st.tags if (st.tags is not None and now - st.tags_at < max_age) else None
+                skip = max_age > 0 and not st.healthy(now)
+                if cached is None and skip:
+                    last_exc = ConnectionError(f"{key} 暂时下线：{st.last_error}")
+            if cached is None and not skip:
+                try:
+                    cached = _list_models(b["server"], b["port"], timeout_sec=timeout_sec)
+                    with self._lock:
+                        st.tags, st.tags_at = cached, time.time()
+                    self.mark_up(key)
+                except Exception as e:
+                    self.mark_down(key, e)
+                    last_exc = e
+                    continue
+            if cached is None:
+                continue
+            any_ok = True
+            names = cached
+            if b["models"]:
+                allowed = set(b["models"])
+                names = [m for m in cached if m in allowed]
+            for m in names:
+                if m not in seen:
+                    seen.add(m)
+                    merged.append(m)
+        if not any_ok and last_exc is not None:
+            raise last_exc
+        return merged
+
+    def tags_fingerprint(self, cfg: Dict) -> Optional[str]:
+        """Cheap stand-in for list_models(cfg) in ETags, without any network call.
+
+        Uses the cached tag lists even when older than TAGS_TTL_SEC (and refreshes them in the
+        background). None when a healthy host has never been probed: only list_models() can tell.
+        """
+        now = time.time()
+        parts: List[str] = []
+        stale = False
+        with self._lock:
+            for b in configured_backends(cfg):
+                st = self._state(backend_key(b))
+                if st.tags is None:
+                    if st.healthy(now):
+                        return None
+                    parts.append(backend_key(b) + ":down")
+                    continue
+                stale = stale or now - st.tags_at >= TAGS_TTL_SEC
+                parts.append(f"{backend_key(b)}:{','.join(st.tags)}")
+            refresh = stale and not self._refreshing
+            if refresh:
+                self._refreshing = True
+        if refresh:
+            threading.Thread(target=self._refresh_tags, args=(cfg,), name="tags-refresh", daemon=True).start()
+        return ";".join(parts)
+
+    def _refresh_tags(self, cfg: Dict) -> None:
+        try:
+            self.list_models(cfg)
+        except Exception:
+            pass
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    # ---------- 路由 ----------
+    def candidates(self, cfg: Dict, model: str) -> List[Dict]:
+        """Backends that can serve `model`, best first. Hosts that are down come last (as a retry)."""
+        now = time.time()
+        ranked = []
+        with self._lock:
+            for i, b in enumerate(configured_backends(cfg)):
+                st = self._state(backend_key(b))
+                if b["models"]:
+                    if model not in b["models"]:
+                        continue
+                elif st.tags is not None and model not in st.tags:
+                    continue
+                warm = now - st.loaded.get(model, 0.0) < AFFINITY_TTL_SEC
+                ranked.append(((not st.healthy(now), not warm, st.outstanding / b["weight"], i), b))
+        ranked.sort(key=lambda x: x[0])
+        return [b for _k, b in ranked]
+
+    def begin(self, key: str) -> None:
+        with self._lock:
+            self._state(key).outstanding += 1
+
+    def end(self, key: str, model: str, ok: bool) -> None:
+        with self._lock:
+            st = self._state(key)
+            st.outstanding -= 1
+            if ok:
+                st.loaded[model] = time.time()
+                st.down_until = 0.0
+                st.failures = 0
+                st.last_error = ""
+
+    def is_warm(self, cfg: Dict, model: str) -> bool:
+        """True if some backend generated with `model` recently (likely still loaded)."""
+        now = time.time()
+        with self._lock:
+            for b in configured_backends(cfg):
+                st = self._hosts.get(backend_key(b))
+                if st and now - st.loaded.get(model, 0.0) < AFFINITY_TTL_SEC:
+                    return True
+        return False
+
+    def snapshot(self, cfg: Dict) -> List[Dict]:
+        now = time.time()
+        out = []
+        with self._lock:
+            for b in configured_backends(cfg):
+                key = backend_key(b)
+                st = self._state(key)
+                out.append({
+                    "host": key,
+                    "weight": b["weight"],
+                    "healthy": st.healthy(now),
+                    "outstanding": st.outstanding,
+                    "models": b["models"] or (st.tags or []),
+                    "warm": sorted(m for m, t in st.loaded.items() if now - t < AFFINITY_TTL_SEC),
+                    "last_error": st.last_error,
+                })
+        return out
+
+
+pool = BackendPool()
+
+
+def list_models(cfg: Dict, timeout_sec: float = 5.0) -> List[str]:
+    return pool.list_models(cfg, timeout_sec=timeout_sec)
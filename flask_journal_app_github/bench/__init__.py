@@ -0,0 +1,12 @@
+"""
+Benchmark suite for the journal app.
+
+用法（在 flask_journal_app_github/ 目录下运行）：
+
+    python -m bench run --preset small --out bench_results.json
+    python -m bench run --posts 10000 --comments 200000 --cjk 0.8
+    python -m bench compare old.json new.json
+    python -m bench.fake_ollama --port 11434 --latency 0.5 --tokens-per-sec 40
+
+每个场景都在独立子进程里跑（单独的 DATA_DIR 副本），这样峰值 RSS 可以按场景统计。
+"""
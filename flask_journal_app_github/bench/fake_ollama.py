@@ -0,0 +1,191 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+# =========================
+# 本地假 Ollama（/api/tags + /api/generate）
+# =========================
+
+class FakeOllama:
+    """
+    In-process stand-in for an Ollama server.
+
+    - latency：收到请求到第一个 token 的延迟（秒），模拟模型加载 / prompt 处理
+    - tokens_per_sec：生成速率；response_tokens 个 token 全部吐完才结束
+    - stream=true 时按 NDJSON 逐块返回，和真实 Ollama 一致
+    """
+
+    def __init__(
+        self,
+        models: Optional[List[str]] = None,
+        latency: float = 0.0,
+        tokens_per_sec: float = 0.0,
+        response_tokens: int = 32,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.models = list(models or ["fake-model:7b"])
+        self.latency = float(latency)
+        self.tokens_per_sec = float(tokens_per_sec)
+        self.response_tokens = int(response_tokens)
+        self.stats: Dict[str, int] = {"tags": 0, "generate": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def host(self) -> str:
+        return self._server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> "FakeOllama":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOllama":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, fmt, *args):  # 静默
+                pass
+
+            def _send_json(self, obj: Dict, status: int = 200) -> None:
+                body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/api/tags":
+                    fake._count("tags")
+                    self._send_json({"models": [{"name": m} for m in fake.models]})
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                if self.path.rstrip("/") != "/api/generate":
+                    self._send_json({"error": "not found"}, 404)
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except Exception:
+                    self._send_json({"error": "bad json"}, 400)
+                    return
+                model = payload.get("model") or ""
+                if model not in fake.models:
+                    self._send_json({"error": f"model '{model}' not found"}, 404)
+                    return
+                fake._count("generate")
+                self._generate(payload)
+
+            def _generate(self, payload: Dict) -> None:
+                start = time.time()
+                options = payload.get("options") or {}
+                n_tokens = fake.response_tokens
+                if int(options.get("num_predict") or 0) > 0:
+                    n_tokens = min(n_tokens, int(options["num_predict"]))
+                prompt_tokens = max(1, len((payload.get("prompt") or "")) // 4)
+                if fake.latency:
+                    time.sleep(fake.latency)
+                per_token = (1.0 / fake.tokens_per_sec) if fake.tokens_per_sec > 0 else 0.0
+                # 空 prompt 是 Ollama 的“只加载模型”请求
+                if not payload.get("prompt"):
+                    n_tokens = 0
+                limit = int(options.get("num_predict") or 0)
+                done_reason = "length" if limit and n_tokens >= limit else "stop"
+
+                def final(extra: Dict) -> Dict:
+                    total_ns = int((time.time() - start) * 1e9)
+                    return dict(
+                        model=payload.get("model"),
+                        done=True,
+                        done_reason=done_reason,
+                        total_duration=total_ns,
+                        load_duration=int(fake.latency * 1e9),
+                        prompt_eval_count=prompt_tokens,
+                        eval_count=n_tokens,
+                        eval_duration=max(1, int(n_tokens * per_token * 1e9)),
+                        **extra,
+                    )
+
+                if payload.get("stream", True):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+
+                    def chunk(obj: Dict) -> None:
+                        data = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+                        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                        self.wfile.flush()
+
+                    for i in range(n_tokens):
+                        if per_token:
+                            time.sleep(per_token)
+                        chunk({"model": payload.get("model"), "response": f"词{i} ", "done": False})
+                    chunk(final({"response": ""}))
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+                else:
+                    if per_token:
+                        time.sleep(per_token * n_tokens)
+                    text = "".join(f"词{i} " for i in range(n_tokens)).strip()
+                    self._send_json(final({"response": text}))
+
+        return Handler
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Run a fake Ollama server for local testing.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11434)
+    ap.add_argument("--models", default="fake-model:7b", help="comma-separated model names")
+    ap.add_argument("--latency", type=float, default=0.0)
+    ap.add_argument("--tokens-per-sec", type=float, default=0.0)
+    ap.add_argument("--response-tokens", type=int, default=32)
+    args = ap.parse_args(argv)
+    fake = FakeOllama(
+        models=[m.strip() for m in args.models.split(",") if m.strip()],
+        latency=args.latency,
+        tokens_per_sec=args.tokens_per_sec,
+        response_tokens=args.response_tokens,
+        host=args.host,
+        port=args.port,
+    )
+    print(f"fake ollama listening on http://{fake.host}:{fake.port}")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
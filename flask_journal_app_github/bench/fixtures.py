@@ -0,0 +1,131 @@
+import hashlib
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+
+# =========================
+# 合成日记数据
+# =========================
+#
+# 注意：本模块通过 storage.save_* 写盘，所以必须在 JOURNAL_DATA_DIR
+# 已经指向目标目录的进程里调用（runner 会在子进程里做这件事）。
+
+_CJK = (
+    "今天我意识到很多事情其实没有想象中那么复杂只要一步一步来总会有办法"
+    "工作学习生活读书运动睡眠情绪家人朋友计划复盘反思目标习惯时间精力"
+)
+_LATIN = (
+    "the quick brown fox jumps over lazy dog today I realized that small steps "
+    "matter more than big plans reading notes gym sleep mood family plan review"
+).split()
+
+
+def _text(rng: random.Random, n_chars: int, cjk_ratio: float) -> str:
+    parts: List[str] = []
+    size = 0
+    while size < n_chars:
+        if rng.random() < cjk_ratio:
+            seg = "".join(rng.choice(_CJK) for _ in range(rng.randint(8, 40))) + "。"
+        else:
+            seg = " ".join(rng.choice(_LATIN) for _ in range(rng.randint(4, 16))) + ". "
+        if rng.random() < 0.08:
+            seg += "\n\n"
+        parts.append(seg)
+        size += len(seg)
+    return "".join(parts)[:n_chars]
+
+
+_ID_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+
+
+def _token(rng: random.Random) -> str:
+    # 和 secrets.token_urlsafe(8) 形状一致，但可复现
+    return "".join(rng.choice(_ID_CHARS) for _ in range(11))
+
+
+def generate(
+    posts: int = 500,
+    comments: int = 5000,
+    categories: int = 8,
+    cjk_ratio: float = 0.7,
+    avg_post_chars: int = 1200,
+    avg_comment_chars: int = 400,
+    unread_ratio: float = 0.05,
+    models: Optional[List[str]] = None,
+    ollama_server: str = "127.0.0.1",
+    ollama_port: int = 11434,
+    seed: int = 42,
+) -> Dict[str, Any]:
+    """Write a synthetic journal into the current DATA_DIR and return a summary."""
+    from storage import (
+        save_categories, save_posts, save_post_meta, save_comments, save_llm_config, load_llm_config,
+    )
+
+    rng = random.Random(seed)
+    models = list(models or ["fake-model:7b"])
+    tz = timezone(timedelta(hours=8))
+    start = datetime(2020, 1, 1, tzinfo=tz)
+    span_sec = int((datetime(2026, 1, 1, tzinfo=tz) - start).total_seconds())
+
+    cats = [{"id": f"cat{i}", "name": f"分类{i}", "color": "#%06x" % rng.randint(0, 0xFFFFFF)} for i in range(categories)]
+
+    post_list: List[Dict[str, Any]] = []
+    meta: Dict[str, Any] = {}
+    for _ in range(posts):
+        pid = _token(rng)
+        published = start + timedelta(seconds=rng.randint(0, span_sec))
+        content = _text(rng, max(20, int(rng.gauss(avg_post_chars, avg_post_chars / 3))), cjk_ratio)
+        post_list.append({
+            "id": pid,
+            "title": _text(rng, rng.randint(6, 24), cjk_ratio).strip() or "无题",
+            "category": rng.choice(cats)["id"] if cats else "",
+            "content": content,
+            "published_at": published.isoformat(timespec="seconds"),
+        })
+        meta[pid] = {
+            "edit_seq": rng.choice([0, 0, 0, 1, 2]),
+            "updated_at": published.isoformat(timespec="seconds"),
+            "content_hash": hashlib.sha256(content.encode("utf-8")).hexdigest(),
+        }
+
+    comment_list: List[Dict[str, Any]] = []
+    for _ in range(comments if post_list else 0):
+        p = rng.choice(post_list)
+        created = datetime.fromisoformat(p["published_at"]) + timedelta(seconds=rng.randint(60, 86400 * 30))
+        comment_list.append({
+            "id": _token(rng),
+            "post_id": p["id"],
+            "post_edit_seq": meta[p["id"]]["edit_seq"],
+            "model": rng.choice(models),
+            "content": _text(rng, max(20, int(rng.gauss(avg_comment_chars, avg_comment_chars / 3))), cjk_ratio),
+            "created_at": created.isoformat(timespec="seconds"),
+            "read": rng.random() >= unread_ratio,
+        })
+
+    cfg = load_llm_config()
+    cfg.update({
+        "auto_enabled": True,
+        "server": ollama_server,
+        "port": int(ollama_port),
+        "allowed_models": [],
+        # 上限放宽，保证调度场景总能挑到文章
+        "max_comments_per_post_default": 1000000,
+        "timeout_sec": 60,
+        "prompt_presets": [{"id": "bench", "name": "bench", "system": "你是一个朋友。", "user_prefix": "请评论。"}],
+        "active_prompt_preset_id": "bench",
+        "active_prompt_preset_ids": ["bench"],
+    })
+
+    save_categories(cats)
+    save_posts(post_list)
+    save_post_meta({"version": 1, "meta": meta})
+    save_comments(comment_list)
+    save_llm_config(cfg)
+    return {
+        "posts": len(post_list),
+        "comments": len(comment_list),
+        "categories": len(cats),
+        "cjk_ratio": cjk_ratio,
+        "seed": seed,
+    }
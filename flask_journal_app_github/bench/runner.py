@@ -0,0 +1,270 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PRESETS = {
+    "small": {"posts": 500, "comments": 5000},
+    "medium": {"posts": 2000, "comments": 40000},
+    "large": {"posts": 10000, "comments": 200000},
+}
+
+
+# =========================
+# 统计
+# =========================
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(samples: List[float], wall_sec: float) -> Dict[str, Any]:
+    s = sorted(samples)
+    ms = lambda x: round(x * 1000.0, 3)  # noqa: E731
+    return {
+        "count": len(s),
+        "mean_ms": ms(sum(s) / len(s)) if s else 0.0,
+        "p50_ms": ms(percentile(s, 0.50)),
+        "p90_ms": ms(percentile(s, 0.90)),
+        "p95_ms": ms(percentile(s, 0.95)),
+        "p99_ms": ms(percentile(s, 0.99)),
+        "max_ms": ms(s[-1]) if s else 0.0,
+        "wall_s": round(wall_sec, 3),
+        "throughput_ops": round(len(s) / wall_sec, 2) if wall_sec > 0 else 0.0,
+    }
+
+
+def _peak_rss_kb() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 返回字节，Linux 返回 KB
+    return int(rss / 1024) if sys.platform == "darwin" else int(rss)
+
+
+# =========================
+# 子进程入口（spawn：每个场景一个全新进程）
+# =========================
+
+def _child_prepare(data_dir: str) -> None:
+    os.environ["JOURNAL_DATA_DIR"] = data_dir
+    os.chdir(os.path.dirname(data_dir))
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+
+
+def _child_generate(data_dir: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    _child_prepare(data_dir)
+    from bench import fixtures
+    return fixtures.generate(**params)
+
+
+def _child_scenario(name: str, data_dir: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    _child_prepare(data_dir)
+    from bench.fake_ollama import FakeOllama
+    from bench import scenarios
+
+    fake = FakeOllama(
+        models=[params["model"]],
+        latency=params["ollama_latency"],
+        tokens_per_sec=params["ollama_tokens_per_sec"],
+        response_tokens=params["ollama_response_tokens"],
+    ).start()
+    try:
+        from storage import load_llm_config, save_llm_config, load_posts
+
+        cfg = load_llm_config()
+        cfg["server"], cfg["port"] = fake.host, fake.port
+        save_llm_config(cfg)
+
+        import app as appmod
+
+        # 基准里不启动后台调度线程，避免干扰测量
+        appmod.app._scheduler_started = True
+        client = appmod.app.test_client()
+
+        ctx = {
+            "client": client,
+            "rng": scenarios.make_rng(params["seed"], name),
+            "iterations": params["iterations"],
+            "post_ids": [p.get("id") for p in load_posts()],
+            "model": params["model"],
+            "threads": params["threads"],
+            "report": {},
+        }
+        fn = scenarios.SCENARIOS[name]
+        # 预热一次（模板编译、首次 import 等），不计入结果
+        warm = dict(ctx, iterations=1)
+        fn(warm)
+
+        t0 = time.perf_counter()
+        samples = fn(ctx)
+        wall = time.perf_counter() - t0
+        out = summarize(samples, wall)
+        out["peak_rss_kb"] = _peak_rss_kb()
+        out.update(ctx["report"])
+        return out
+    finally:
+        fake.stop()
+
+
+def _run_child(fn, *args) -> Dict[str, Any]:
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        return pool.apply(fn, args)
+
+
+# =========================
+# CLI
+# =========================
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return ""
+
+
+def cmd_run(args: argparse.Namespace) -> int:
+    preset = PRESETS[args.preset]
+    gen_params = {
+        "posts": args.posts if args.posts is not None else preset["posts"],
+        "comments": args.comments if args.comments is not None else preset["comments"],
+        "categories": args.categories,
+        "cjk_ratio": args.cjk,
+        "models": [args.model],
+        "seed": args.seed,
+    }
+    names = [n.strip() for n in (args.scenarios or "").split(",") if n.strip()]
+    from bench.scenarios import SCENARIOS
+    names = names or list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        print(f"unknown scenarios: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    work = tempfile.mkdtemp(prefix="journal-bench-")
+    try:
+        base = os.path.join(work, "base", "data")
+        os.makedirs(base)
+        t0 = time.perf_counter()
+        fixture = _run_child(_child_generate, base, gen_params)
+        print(f"fixtures: {fixture} ({time.perf_counter() - t0:.1f}s)", file=sys.stderr)
+
+        scenario_params = {
+            "seed": args.seed,
+            "iterations": args.iterations,
+            "threads": args.threads,
+            "model": args.model,
+            "ollama_latency": args.ollama_latency,
+            "ollama_tokens_per_sec": args.ollama_tokens_per_sec,
+            "ollama_response_tokens": args.ollama_response_tokens,
+        }
+        results: Dict[str, Any] = {}
+        for name in names:
+            # 每个场景一份全新的数据副本，写操作不会影响后续场景
+            data_dir = os.path.join(work, name, "data")
+            shutil.copytree(base, data_dir)
+            res = _run_child(_child_scenario, name, data_dir, scenario_params)
+            results[name] = res
+            extra = f"  retained={res['retained_kb']}KB" if "retained_kb" in res else ""
+            print(f"{name:<22} p50={res['p50_ms']:>9.2f}ms  p95={res['p95_ms']:>9.2f}ms  "
+                  f"ops/s={res['throughput_ops']:>8.1f}  rss={res['peak_rss_kb']}KB{extra}", file=sys.stderr)
+            shutil.rmtree(os.path.join(work, name), ignore_errors=True)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    report = {
+        "version": 1,
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "fixture": fixture,
+            "params": scenario_params,
+        },
+        "scenarios": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"results written to {args.out}", file=sys.stderr)
+    return 0
+
+
+def cmd_compare(args: argparse.Namespace) -> int:
+    with open(args.old, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"old: {old['meta'].get('commit') or args.old}   new: {new['meta'].get('commit') or args.new}")
+    print(f"{'scenario':<22}{'p50 old':>10}{'p50 new':>10}{'Δ':>8}{'p95 old':>10}{'p95 new':>10}{'Δ':>8}{'rss Δ':>9}")
+    worse = False
+    for name in sorted(set(old["scenarios"]) | set(new["scenarios"])):
+        a, b = old["scenarios"].get(name), new["scenarios"].get(name)
+        if not a or not b:
+            print(f"{name:<22}  (only in {'new' if b else 'old'})")
+            continue
+
+        def delta(x: float, y: float) -> str:
+            return f"{(y - x) / x * 100:+.0f}%" if x else "-"
+
+        rss = delta(a.get("peak_rss_kb") or 0, b.get("peak_rss_kb") or 0)
+        retained = ""
+        if "retained_kb" in a and "retained_kb" in b:
+            retained = f"  retained {a['retained_kb']}KB -> {b['retained_kb']}KB ({delta(a['retained_kb'], b['retained_kb'])})"
+        print(f"{name:<22}{a['p50_ms']:>10.2f}{b['p50_ms']:>10.2f}{delta(a['p50_ms'], b['p50_ms']):>8}"
+              f"{a['p95_ms']:>10.2f}{b['p95_ms']:>10.2f}{delta(a['p95_ms'], b['p95_ms']):>8}{rss:>9}{retained}")
+        if a["p95_ms"] and b["p95_ms"] > a["p95_ms"] * (1 + args.threshold):
+            worse = True
+    return 1 if (worse and args.fail_on_regression) else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m bench", description="Journal app benchmarks")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    run = sub.add_parser("run", help="generate fixtures and run scenarios")
+    run.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    run.add_argument("--posts", type=int)
+    run.add_argument("--comments", type=int)
+    run.add_argument("--categories", type=int, default=8)
+    run.add_argument("--cjk", type=float, default=0.7, help="fraction of CJK text segments (0..1)")
+    run.add_argument("--scenarios", default="", help="comma-separated; default: all")
+    run.add_argument("--iterations", type=int, default=50)
+    run.add_argument("--threads", type=int, default=8, help="threads for the file_lock scenario")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--model", default="fake-model:7b")
+    run.add_argument("--ollama-latency", type=float, default=0.0)
+    run.add_argument("--ollama-tokens-per-sec", type=float, default=0.0)
+    run.add_argument("--ollama-response-tokens", type=int, default=64)
+    run.add_argument("--out", default="bench_results.json")
+    run.set_defaults(func=cmd_run)
+
+    cmp_ = sub.add_parser("compare", help="compare two result files")
+    cmp_.add_argument("old")
+    cmp_.add_argument("new")
+    cmp_.add_argument("--threshold", type=float, default=0.10, help="p95 regression threshold (0.10 = 10%%)")
+    cmp_.add_argument("--fail-on-regression", action="store_true")
+    cmp_.set_defaults(func=cmd_compare)
+
+    args = ap.parse_args(argv)
+    return args.func(args)
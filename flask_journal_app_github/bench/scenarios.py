@@ -0,0 +1,243 @@
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+
+# =========================
+# 基准场景
+# =========================
+#
+# 每个场景签名：scenario(ctx) -> List[float]（每次操作的耗时，秒）
+# ctx 由 runner 在子进程里准备：
+#   ctx["client"]     Flask test client
+#   ctx["rng"]        random.Random（固定 seed，保证可复现）
+#   ctx["iterations"] 操作次数
+#   ctx["post_ids"]   全部文章 id
+#   ctx["model"]      假 Ollama 上的模型名
+#   ctx["report"]     场景可以往里放额外指标（会并入结果 JSON）
+
+def _timed(fn: Callable[[], Any]) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def _get(client, path: str) -> None:
+    r = client.get(path)
+    if r.status_code != 200:
+        raise RuntimeError(f"GET {path} -> {r.status_code}")
+    r.close()
+
+
+def index(ctx: Dict[str, Any]) -> List[float]:
+    client, rng = ctx["client"], ctx["rng"]
+    pages = max(1, len(ctx["post_ids"]) // 8)
+    return [_timed(lambda: _get(client, f"/?page={rng.randint(1, pages)}")) for _ in range(ctx["iterations"])]
+
+
+def index_search(ctx: Dict[str, Any]) -> List[float]:
+    client, rng = ctx["client"], ctx["rng"]
+    words = ["今天", "计划", "reading", "反思", "gym"]
+    return [_timed(lambda: _get(client, f"/?q={rng.choice(words)}")) for _ in range(ctx["iterations"])]
+
+
+def view_post(ctx: Dict[str, Any]) -> List[float]:
+    client, rng, ids = ctx["client"], ctx["rng"], ctx["post_ids"]
+    return [_timed(lambda: _get(client, f"/post/{rng.choice(ids)}")) for _ in range(ctx["iterations"])]
+
+
+def notifications(ctx: Dict[str, Any]) -> List[float]:
+    client = ctx["client"]
+    return [_timed(lambda: _get(client, "/notifications")) for _ in range(ctx["iterations"])]
+
+
+def api_posts(ctx: Dict[str, Any]) -> List[float]:
+    client = ctx["client"]
+    out: List[float] = []
+    cursor = ""
+    for _ in range(ctx["iterations"]):
+        t0 = time.perf_counter()
+        r = client.get("/api/posts?limit=50&fields=id,title,published_at" + (f"&cursor={cursor}" if cursor else ""))
+        out.append(time.perf_counter() - t0)
+        cursor = (r.get_json() or {}).get("next_cursor") or ""
+    return out
+
+
+def pick_post_for_model(ctx: Dict[str, Any]) -> List[float]:
+    from storage import load_llm_config
+    from llm_scheduler import pick_post_for_model as pick
+
+    cfg = load_llm_config()
+    model = ctx["model"]
+    return [_timed(lambda: pick(cfg, model)) for _ in range(ctx["iterations"])]
+
+
+def file_lock(ctx: Dict[str, Any]) -> List[float]:
+    """N threads contending for one lockfile; measures wait + hold time."""
+    from storage import file_lock as lock, LOCK_COMMENTS
+
+    threads = int(ctx.get("threads", 8))
+    per_thread = max(1, ctx["iterations"] // threads)
+    out: List[float] = []
+    out_lock = threading.Lock()
+
+    def worker() -> None:
+        local: List[float] = []
+        for _ in range(per_thread):
+            t0 = time.perf_counter()
+            with lock(LOCK_COMMENTS):
+                time.sleep(0.001)
+            local.append(time.perf_counter() - t0)
+        with out_lock:
+            out.extend(local)
+
+    ts = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return out
+
+
+def comment_writes(ctx: Dict[str, Any]) -> List[float]:
+    """N threads adding comments at once (scheduler + manual runs); measures add_comment latency."""
+    from llm_scheduler import add_comment
+
+    threads = int(ctx.get("threads", 8))
+    per_thread = max(1, ctx["iterations"] // threads)
+    ids, model = ctx["post_ids"], ctx["model"]
+    out: List[float] = []
+    out_lock = threading.Lock()
+
+    def worker(k: int) -> None:
+        rng = make_rng(k, "comment_writes")
+        local = [_timed(lambda: add_comment(rng.choice(ids), model, "bench comment")) for _ in range(per_thread)]
+        with out_lock:
+            out.extend(local)
+
+    ts = [threading.Thread(target=worker, args=(k,)) for k in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return out
+
+
+def comments_memory(ctx: Dict[str, Any]) -> List[float]:
+    """Parse comments from disk; reports the memory one loaded comment set keeps alive (tracemalloc)."""
+    import gc
+    import tracemalloc
+    from storage import clear_record_cache, load_comments
+
+    def cold_load() -> None:
+        clear_record_cache()
+        load_comments()
+
+    out = [_timed(cold_load) for _ in range(ctx["iterations"])]
+    clear_record_cache()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        comments = load_comments()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    report = ctx.setdefault("report", {})
+    report["comments_loaded"] = len(comments)
+    report["retained_kb"] = retained // 1024
+    report["load_peak_kb"] = peak // 1024
+    return out
+
+
+def scheduler_run(ctx: Dict[str, Any]) -> List[float]:
+    """One scheduler pass per iteration: pick post -> fake Ollama -> write comment."""
+    from llm_scheduler import run_once_for_model
+
+    model = ctx["model"]
+    out: List[float] = []
+    for _ in range(max(3, ctx["iterations"] // 5)):
+        t0 = time.perf_counter()
+        res = run_once_for_model(model)
+        out.append(time.perf_counter() - t0)
+        if not res.get("ok"):
+            raise RuntimeError(f"run_once_for_model failed: {res}")
+    return out
+
+
+def _free_port() -> int:
+    import socket
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def startup(ctx: Dict[str, Any]) -> List[float]:
+    """Launch the production server in a new process; time until `/` first answers 200."""
+    import os
+    import shutil
+    import subprocess
+    import sys
+    import tempfile
+    import urllib.error
+    import urllib.request
+
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        import waitress  # noqa: F401
+        cmd = [sys.executable, os.path.join(app_dir, "serve.py"), "--threads", "4"]
+    except ImportError:
+        cmd = [sys.executable, "-c", "import os, app; app.app.run(port=int(os.environ['PORT']))"]
+    # 第一次启动时字节码缓存是空的（冷启动），之后复用
+    cache_dir = tempfile.mkdtemp(prefix="journal-bench-jinja-")
+    env = dict(os.environ, JOURNAL_TEMPLATE_CACHE_DIR=cache_dir, JOURNAL_SNAPSHOT_MINUTES="0")
+    out: List[float] = []
+    try:
+        for _ in range(max(3, ctx["iterations"] // 10)):
+            port = _free_port()
+            env["PORT"] = str(port)
+            t0 = time.perf_counter()
+            proc = subprocess.Popen(cmd, cwd=app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                while True:
+                    if proc.poll() is not None:
+                        raise RuntimeError(f"server exited with {proc.returncode}")
+                    try:
+                        with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5) as r:
+                            if r.status == 200:
+                                break
+                    except (urllib.error.URLError, ConnectionError):
+                        time.sleep(0.005)
+                out.append(time.perf_counter() - t0)
+            finally:
+                proc.terminate()
+                try:
+                    proc.wait(30)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    report = ctx.setdefault("report", {})
+    report["first_response_cold_ms"] = round(out[0] * 1000, 1)
+    report["server"] = "waitress" if "serve.py" in cmd[1] else "werkzeug"
+    return out
+
+
+SCENARIOS: Dict[str, Callable[[Dict[str, Any]], List[float]]] = {
+    "index": index,
+    "index_search": index_search,
+    "view_post": view_post,
+    "notifications": notifications,
+    "api_posts": api_posts,
+    "pick_post_for_model": pick_post_for_model,
+    "file_lock": file_lock,
+    "comment_writes": comment_writes,
+    "comments_memory": comments_memory,
+    "scheduler_run": scheduler_run,
+    "startup": startup,
+}
+
+
+def make_rng(seed: int, name: str) -> random.Random:
+    return random.Random(f"{seed}:{name}")
@@ -6,7 +6,15 @@ source .venv/bin/activate
 pip install -r requirements.txt
 pip install pyinstaller
 
-pyinstaller -F -n JournalApp app.py \
+# 用法：./build_exe_linux_macos.sh [onefile|onedir]
+# onefile（默认）：单个可执行文件，但每次启动都要先解压到临时目录
+# onedir：输出 dist/JournalApp/ 目录，启动不用解压，明显更快
+MODE="${1:-onefile}"
+if [ "$MODE" = "onedir" ]; then BUNDLE="-D"; else BUNDLE="-F"; fi
+
+# serve.py：waitress 多线程服务器（app.py 只是开发服务器）
+pyinstaller "$BUNDLE" -n JournalApp serve.py \
   --add-data "templates:templates" \
   --add-data "static:static" \
+  --add-data "i18n:i18n" \
   --add-data "data:data"
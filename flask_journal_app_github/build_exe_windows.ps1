@@ -1,11 +1,17 @@
-\
 # PowerShell: Windows 打包（需在 Windows 上运行）
+# 用法：.\build_exe_windows.ps1 [-OneDir]
+# 默认单文件（每次启动先解压）；-OneDir 输出 dist\JournalApp\ 目录，启动更快
+param([switch]$OneDir)
+$bundle = if ($OneDir) { "-D" } else { "-F" }
+
 python -m venv .venv
 .\.venv\Scripts\activate
 pip install -r requirements.txt
 pip install pyinstaller
 
-pyinstaller -F -n JournalApp app.py `
+# serve.py：waitress 多线程服务器（app.py 只是开发服务器）
+pyinstaller $bundle -n JournalApp serve.py `
   --add-data "templates;templates" `
   --add-data "static;static" `
+  --add-data "i18n;i18n" `
   --add-data "data;data"
@@ -0,0 +1,168 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+import metrics
+from storage import LOCK_COMMENTS, clear_record_cache, file_lock, load_comments, save_comments
+
+
+# =========================
+# 评论写入合并（group commit）
+# =========================
+#
+# 调度线程、手动评论、点开通知都会改 comments.json，以前每次都是 加锁 / 读 / 改 / 整个文件重写。
+# 现在统一交给一个写线程：第一个请求到达后再等 window 秒，把这段时间里收到的修改
+# 放进同一次 加锁 / 读 / 改 / 保存。调用方拿到 Future，.result() 返回时数据已经落盘。
+#
+# 修改函数签名：mutate(comments) -> 任意返回值。可以直接改传入的 list；其中的记录是共享只读的，
+# 要改某条评论先 copy() 再替换 list 里那一项（见 mark_read）。
+# 同一批里某个修改抛异常只影响它自己的 Future，其余照常保存。
+
+COMMENT_BATCH_WINDOW_SEC = float(os.environ.get("JOURNAL_COMMENT_BATCH_MS") or 10) / 1000.0
+COMMENT_BATCH_MAX = 500
+COMMENT_WRITE_TIMEOUT = 30.0
+
+
+def count_unread(comments: List[Dict[str, Any]]) -> int:
+    return sum(1 for c in comments if not c.get("read", False))
+
+
+class _Write:
+    __slots__ = ("mutate", "then", "future")
+
+    def __init__(self, mutate: Callable[[List], Any], then: Optional[Callable[[List], Any]]):
+        self.mutate = mutate
+        self.then = then
+        self.future: Future = Future()
+
+
+class CommentWriter:
+    def __init__(self, window_sec: float = COMMENT_BATCH_WINDOW_SEC, max_batch: int = COMMENT_BATCH_MAX):
+        self.window_sec = window_sec
+        self.max_batch = max_batch
+        self._q: "queue.Queue[Optional[_Write]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.writes = 0
+        self.largest_batch = 0
+
+    # ---------- 提交 ----------
+    def submit(self, mutate: Callable[[List], Any], then: Optional[Callable[[List], Any]] = None) -> Future:
+        """Queue `mutate(comments)`. The future resolves to its return value (or `then(comments)`,
+        evaluated once per batch after saving) when the batch is on disk."""
+        w = _Write(mutate, then)
+        self._ensure_started()
+        self._q.put(w)
+        return w.future
+
+    def append(self, record: Dict[str, Any]) -> Future:
+        """Add a comment; resolves to the unread count after the batch that saved it."""
+        return self.submit(lambda comments: comments.append(record), then=count_unread)
+
+    def mark_read(self, comment_id: str) -> Future:
+        """Resolves to the comment (now read) or None if it does not exist."""
+        def mutate(comments: List) -> Any:
+            i = next((i for i, c in enumerate(comments) if c.get("id") == comment_id), None)
+            if i is None:
+                return None
+            comments[i] = target = comments[i].copy()
+            target["read"] = True
+            return target
+        return self.submit(mutate)
+
+    def mark_all_read(self) -> Future:
+        def mutate(comments: List) -> None:
+            for i, c in enumerate(comments):
+                if not c.get("read", False):
+                    comments[i] = c = c.copy()
+                    c["read"] = True
+        return self.submit(mutate)
+
+    # ---------- 写线程 ----------
+    def _ensure_started(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="comment-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._q.get()
+            batch = [item]
+            deadline = time.monotonic() + self.window_sec
+            while item is not None and len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    nxt = self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(nxt)
+                if nxt is None:
+                    break
+            writes = [w for w in batch if w is not None]
+            if writes:
+                self._apply(writes)
+            if len(writes) != len(batch):
+                return
+
+    def _apply(self, writes: List[_Write]) -> None:
+        try:
+            with file_lock(LOCK_COMMENTS):
+                comments = load_comments()
+                done = []
+                for w in writes:
+                    try:
+                        done.append((w, w.mutate(comments)))
+                    except Exception as e:
+                        w.future.set_exception(e)
+                if done:
+                    save_comments(comments)
+        except Exception as e:
+            # 保存失败时下次从文件重读
+            clear_record_cache()
+            for w in writes:
+                if not w.future.done():
+                    w.future.set_exception(e)
+            return
+
+        then_cache: Dict[Callable, Any] = {}
+        for w, value in done:
+            if w.then is not None:
+                if w.then not in then_cache:
+                    then_cache[w.then] = w.then(comments)
+                value = then_cache[w.then]
+            w.future.set_result(value)
+
+        with self._stats_lock:
+            self.batches += 1
+            self.writes += len(writes)
+            self.largest_batch = max(self.largest_batch, len(writes))
+        if metrics.ENABLED:
+            metrics.COMMENT_WRITE_BATCH.observe(len(writes))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "writes": self.writes,
+                "largest_batch": self.largest_batch,
+                "queued": self._q.qsize(),
+            }
+
+    def close(self) -> None:
+        if self._thread and self._thread.is_alive():
+            self._q.put(None)
+            self._thread.join(5.0)
+
+
+comment_writer = CommentWriter()
+atexit.register(comment_writer.close)
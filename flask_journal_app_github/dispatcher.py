@@ -0,0 +1,241 @@
+import heapq
+import itertools
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Union
+
+import metrics
+from backends import pool, backend_key
+from ollama_client import connection_error, generate_comment, warm_up as _warm_up
+
+
+# =========================
+# 统一的生成调度：优先级 + 每台 Ollama 主机并发上限
+# =========================
+#
+# - INTERACTIVE（页面上的“立即评论”）永远排在 SCHEDULED（后台自动评论）前面
+# - 每台主机同时进行的生成不超过 max_concurrency_per_host（llm_config.json，默认 1）
+# - 交互请求到达时，排队中的后台请求会被取消（GenerationDeferred），
+#   调度线程稍后重试；已经在 Ollama 上运行的生成不会被打断
+#   （preempt_scheduled=false 时只让交互请求插队，不取消）
+# - 主机选择见 backends.py；连接失败时自动换下一台
+
+INTERACTIVE = 0
+SCHEDULED = 1
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", SCHEDULED: "scheduled"}
+
+DISPATCH_DEFAULTS: Dict = {
+    "max_concurrency_per_host": 1,
+    "preempt_scheduled": True,
+}
+
+
+# Ollama 把字符串 keep_alive 当 Go duration 解析（"30m"、"1h30m"），"300" / "-1" 这种会返回 400；
+# 数字则按秒处理（负数 = 一直常驻）。所以纯整数按数字发送，其余必须是 duration。
+_KEEP_ALIVE_INT = re.compile(r"^-?\d+$")
+_KEEP_ALIVE_DURATION = re.compile(r"^-?(\d+(\.\d+)?(ns|us|µs|ms|s|m|h))+$")
+
+
+def parse_keep_alive(value: Any) -> Union[int, str, None]:
+    """Form / config value -> what Ollama accepts (None = empty). Raises ValueError if invalid."""
+    v = str(value if value is not None else "").strip()
+    if not v:
+        return None
+    if _KEEP_ALIVE_INT.match(v):
+        return int(v)
+    if _KEEP_ALIVE_DURATION.match(v):
+        return v
+    raise ValueError(f"keep_alive 格式不正确：{v!r}（例如 30m、1h、300、-1）")
+
+
+def keep_alive_for(cfg: Dict, model: str) -> Union[int, str, None]:
+    """keep_alive_by_model[model] > keep_alive_default > None (Ollama default, 5m)."""
+    v = (cfg.get("keep_alive_by_model") or {}).get(model) or cfg.get("keep_alive_default") or ""
+    try:
+        return parse_keep_alive(v)
+    except ValueError:
+        # 手工改坏的配置：用 Ollama 默认值，不让每次生成都 400
+        return None
+
+
+class GenerationDeferred(Exception):
+    """A queued scheduled job was cancelled in favour of interactive work."""
+
+
+class _Ticket:
+    __slots__ = ("priority", "seq", "model", "cancelled")
+
+    def __init__(self, priority: int, seq: int, model: str):
+        self.priority = priority
+        self.seq = seq
+        self.model = model
+        self.cancelled = False
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _Lane:
+    def __init__(self):
+        self.active = 0
+        self.waiting: List[_Ticket] = []  # 最小堆
+        self.deferred = 0
+
+
+class GenerationDispatcher:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._lanes: Dict[str, _Lane] = {}
+        self._seq = itertools.count()
+
+    # ---------- 路由 ----------
+    def hosts_for(self, cfg: Dict, model: str) -> List[Dict]:
+        """Backends to try for a model, in order (see backends.BackendPool.candidates)."""
+        return pool.candidates(cfg, model)
+
+    # ---------- 排队 ----------
+    def _acquire(self, host: str, priority: int, model: str, limit: int, preempt: bool,
+                 timeout: Optional[float]) -> None:
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._cond:
+            lane = self._lanes.setdefault(host, _Lane())
+            ticket = _Ticket(priority, next(self._seq), model)
+            heapq.heappush(lane.waiting, ticket)
+
+            if priority == INTERACTIVE and preempt:
+                keep = [t for t in lane.waiting if t.priority == INTERACTIVE]
+                for t in lane.waiting:
+                    if t.priority != INTERACTIVE:
+                        t.cancelled = True
+                        lane.deferred += 1
+                if len(keep) != len(lane.waiting):
+                    heapq.heapify(keep)
+                    lane.waiting = keep
+                    self._cond.notify_all()
+
+            while True:
+                if ticket.cancelled:
+                    raise GenerationDeferred(f"排队中的自动评论已让位给手动评论：{model}")
+                if lane.active < limit and lane.waiting and lane.waiting[0] is ticket:
+                    heapq.heappop(lane.waiting)
+                    lane.active += 1
+                    # 可能还有空闲名额，唤醒下一个
+                    self._cond.notify_all()
+                    return
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    lane.waiting.remove(ticket)
+                    heapq.heapify(lane.waiting)
+                    self._cond.notify_all()
+                    raise TimeoutError(f"等待 Ollama 空闲超时：{host}")
+                self._cond.wait(remaining)
+
+    def _release(self, host: str) -> None:
+        with self._cond:
+            lane = self._lanes[host]
+            lane.active -= 1
+            self._cond.notify_all()
+
+    # ---------- 入口 ----------
+    def generate(
+        self,
+        cfg: Dict,
+        model: str,
+        system: str,
+        user_prompt: str,
+        priority: int = INTERACTIVE,
+        timeout_sec: float = 1800.0,
+        post_id: str = "",
+        options: Optional[Dict] = None,
+        stats_out: Optional[Dict] = None,
+    ) -> str:
+        limit = max(1, int(cfg.get("max_concurrency_per_host") or DISPATCH_DEFAULTS["max_concurrency_per_host"]))
+        preempt = cfg.get("preempt_scheduled")
+        preempt = DISPATCH_DEFAULTS["preempt_scheduled"] if preempt is None else bool(preempt)
+
+        backends = self.hosts_for(cfg, model)
+        if not backends:
+            raise RuntimeError(f"没有提供该模型的 Ollama 主机：{model}")
+
+        last_exc: Optional[BaseException] = None
+        for b in backends:
+            host = backend_key(b)
+            pool.begin(host)
+            ok = False
+            try:
+                t0 = time.perf_counter()
+                self._acquire(host, priority, model, limit, preempt, timeout_sec)
+                if metrics.ENABLED:
+                    metrics.DISPATCH_WAIT_SECONDS.observe(time.perf_counter() - t0, host, PRIORITY_NAMES[priority])
+                try:
+                    text = generate_comment(
+                        b["server"], b["port"], model,
+                        system=system, user_prompt=user_prompt,
+                        timeout_sec=timeout_sec, post_id=post_id,
+                        keep_alive=keep_alive_for(cfg, model),
+                        options=options, stats_out=stats_out,
+                    )
+                finally:
+                    self._release(host)
+                ok = True
+                return text
+            except connection_error() as e:
+                # 连不上：下线这台，换下一台（超时 / 模型报错不重试，避免重复占用 GPU）
+                pool.mark_down(host, e)
+                last_exc = e
+            finally:
+                pool.end(host, model, ok)
+        raise last_exc  # type: ignore[misc]
+
+    def warm_up(self, cfg: Dict, model: str, keep_alive: Union[int, str, None] = None, timeout_sec: float = 600.0) -> float:
+        """Load `model` on the host a generation would be routed to. Scheduled priority (yields to manual runs)."""
+        backends = self.hosts_for(cfg, model)
+        if not backends:
+            raise RuntimeError(f"没有提供该模型的 Ollama 主机：{model}")
+        b = backends[0]
+        host = backend_key(b)
+        limit = max(1, int(cfg.get("max_concurrency_per_host") or DISPATCH_DEFAULTS["max_concurrency_per_host"]))
+        pool.begin(host)
+        ok = False
+        try:
+            self._acquire(host, SCHEDULED, model, limit, False, timeout_sec)
+            try:
+                sec = _warm_up(b["server"], b["port"], model,
+                               keep_alive=keep_alive or keep_alive_for(cfg, model), timeout_sec=timeout_sec)
+            finally:
+                self._release(host)
+            ok = True
+            return sec
+        except connection_error() as e:
+            pool.mark_down(host, e)
+            raise
+        finally:
+            pool.end(host, model, ok)
+
+    def wait_idle(self, timeout: float) -> bool:
+        """Block until no generation is running or queued on any host (graceful shutdown)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while any(lane.active or lane.waiting for lane in self._lanes.values()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._cond:
+            return {
+                host: {
+                    "active": lane.active,
+                    "queued_interactive": sum(1 for t in lane.waiting if t.priority == INTERACTIVE),
+                    "queued_scheduled": sum(1 for t in lane.waiting if t.priority != INTERACTIVE),
+                    "deferred_total": lane.deferred,
+                }
+                for host, lane in self._lanes.items()
+            }
+
+
+dispatcher = GenerationDispatcher()
@@ -0,0 +1,86 @@
+import json
+import queue
+import threading
+from typing import Any, Dict, List, Optional
+
+
+# =========================
+# 进程内事件总线（用于 SSE 推送）
+# =========================
+
+class EventBus:
+    """
+    Tiny in-process pub/sub used by the `/events` SSE stream.
+
+    每个连接的浏览器拥有一个有界队列；发布方（调度器 / 请求线程）只做
+    put_nowait，队列满时丢弃该订阅者的事件，不会阻塞写评论的线程。
+    每个订阅者在服务器上占一个工作线程，subscribe(limit) 到上限时返回 None。
+    """
+
+    def __init__(self, max_queue: int = 100):
+        self._lock = threading.Lock()
+        self._subscribers: List[queue.Queue] = []
+        self._max_queue = max_queue
+
+    def subscribe(self, limit: Optional[int] = None) -> Optional[queue.Queue]:
+        """New subscriber queue, or None when `limit` subscribers are already connected."""
+        q: queue.Queue = queue.Queue(maxsize=self._max_queue)
+        with self._lock:
+            if limit is not None and len(self._subscribers) >= limit:
+                return None
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue) -> None:
+        with self._lock:
+            try:
+                self._subscribers.remove(q)
+            except ValueError:
+                pass
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event: str, data: Dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+        msg = (event, data)
+        for q in subscribers:
+            try:
+                q.put_nowait(msg)
+            except queue.Full:
+                pass
+
+
+def format_sse(event: str, data: Dict[str, Any], event_id: Optional[str] = None) -> str:
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False))
+    return "\n".join(lines) + "\n\n"
+
+
+# Global bus shared by app.py and llm_scheduler.py
+bus = EventBus()
+
+
+def comment_event(comment: Dict[str, Any], unread: int) -> Dict[str, Any]:
+    return {
+        "comment_id": comment.get("id"),
+        "post_id": comment.get("post_id"),
+        "model": comment.get("model", ""),
+        "created_at": comment.get("created_at", ""),
+        "unread": int(unread),
+    }
+
+
+def publish_new_comment(comment: Dict[str, Any], unread: int) -> None:
+    bus.publish("comment", comment_event(comment, unread))
+
+
+def publish_unread(unread: int) -> None:
+    bus.publish("unread", {"unread": int(unread)})
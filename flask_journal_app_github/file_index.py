@@ -0,0 +1,124 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# =========================
+# 文件管理器：目录列表缓存 + 分页读取
+# =========================
+#
+# 列表：以前每次打开 /files 都 os.walk 整个 DATA_DIR（blobs/、快照块等几千个文件），
+# 现在每个目录缓存一次 scandir 的结果（可编辑的文件名 + 子目录），目录 mtime 不变就不再列目录。
+# 目录 mtime 只在增删 / 改名时变化，文件被追加写（日志）时不会变，所以文件的大小 / 修改时间
+# 每次仍然单独 stat——只 stat 能编辑的那几十个文件，不碰其它文件。
+#
+# 读取：大文件按字节偏移分页（对齐到行），尾部视图直接 seek 到末尾，不会把几百 MB 读进内存。
+
+PAGE_BYTES = 64 * 1024
+LINE_SLACK = 16 * 1024  # 为了停在行尾最多多读这么多
+FILE_EDIT_MAX_BYTES = int(float(os.environ.get("JOURNAL_FILE_EDIT_MAX_KB") or 2048) * 1024)
+
+
+class DirListingCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 目录 -> (mtime_ns, 符合条件的文件名, 子目录名)
+        self._dirs: Dict[str, Tuple[int, List[str], List[str]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _scan(self, path: str, exts: Tuple[str, ...]) -> Tuple[List[str], List[str]]:
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            with self._lock:
+                self._dirs.pop(path, None)
+            return [], []
+        with self._lock:
+            cached = self._dirs.get(path)
+            if cached is not None and cached[0] == mtime_ns:
+                self.hits += 1
+                return cached[1], cached[2]
+        names: List[str] = []
+        subdirs: List[str] = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                        elif os.path.splitext(entry.name)[1].lower() in exts:
+                            names.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            return [], []
+        with self._lock:
+            self.misses += 1
+            self._dirs[path] = (mtime_ns, names, subdirs)
+        return names, subdirs
+
+    def list_files(self, base: str, exts: Tuple[str, ...], skip: Tuple[str, ...] = ()) -> List[Dict[str, Any]]:
+        """[{rel, size, mtime}] for files under `base` with one of `exts`; `skip` are absolute dirs."""
+        base = os.path.abspath(base)
+        out: List[Dict[str, Any]] = []
+        stack = [base]
+        while stack:
+            d = stack.pop()
+            names, subdirs = self._scan(d, exts)
+            for name in names:
+                full = os.path.join(d, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                out.append({
+                    "rel": os.path.relpath(full, base).replace("\\", "/"),
+                    "size": int(st.st_size),
+                    "mtime": st.st_mtime,
+                })
+            for sub in subdirs:
+                full = os.path.join(d, sub)
+                if full not in skip:
+                    stack.append(full)
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._dirs.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"dirs": len(self._dirs), "hits": self.hits, "misses": self.misses}
+
+
+dir_listing = DirListingCache()
+
+
+def read_page(path: str, offset: Optional[int] = None, page_bytes: int = PAGE_BYTES) -> Dict[str, Any]:
+    """Read about `page_bytes` starting at `offset` (None = the last page), aligned to whole lines.
+
+    Returns {"text", "start", "end", "size"}: bytes [start, end) of the file.
+    """
+    size = os.path.getsize(path)
+    if offset is None:
+        offset = max(0, size - page_bytes)
+    offset = max(0, min(int(offset), size))
+    with open(path, "rb") as f:
+        start = offset
+        if start > 0:
+            # 从上一行的中间开始时，跳到下一行行首
+            f.seek(start - 1)
+            if f.read(1) != b"\n":
+                partial = f.readline(LINE_SLACK)
+                start += len(partial)
+        f.seek(start)
+        data = f.read(page_bytes)
+        if data and not data.endswith(b"\n") and start + len(data) < size:
+            data += f.readline(LINE_SLACK)
+    return {
+        "text": data.decode("utf-8", errors="replace"),
+        "start": start,
+        "end": start + len(data),
+        "size": size,
+    }
@@ -0,0 +1,85 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from markupsafe import Markup
+
+
+# =========================
+# 渲染片段缓存（LRU）
+# =========================
+
+class FragmentCache:
+    """
+    Bounded LRU cache for rendered HTML fragments.
+
+    key 约定为元组，第二个元素是 post_id，例如：
+      ("body", post_id, content_hash, lang)
+      ("comments", post_id, comment_version, lang)
+    这样编辑 / 删除文章时可以按 post_id 精确失效。
+    """
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 8 * 1024 * 1024):
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Tuple, Markup]" = OrderedDict()
+        self._bytes = 0
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_render(self, key: Tuple[Hashable, ...], render: Callable[[], str]) -> Markup:
+        with self._lock:
+            html = self._data.get(key)
+            if html is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+
+        # 渲染放在锁外，避免慢渲染阻塞其它请求
+        html = Markup(render())
+        size = len(html)
+        if size > self.max_bytes:
+            return html
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._data[key] = html
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                _k, v = self._data.popitem(last=False)
+                self._bytes -= len(v)
+                self.evictions += 1
+        return html
+
+    def invalidate_post(self, post_id: str) -> int:
+        with self._lock:
+            keys = [k for k in self._data if len(k) > 1 and k[1] == post_id]
+            for k in keys:
+                self._bytes -= len(self._data.pop(k))
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+fragments = FragmentCache()
@@ -0,0 +1,34 @@
+# gunicorn 配置（python serve.py --server gunicorn，或 gunicorn -c gunicorn.conf.py app:app）
+# 参数都可以用环境变量覆盖，含义见 serve.py
+import os
+
+bind = f"{os.environ.get('JOURNAL_HOST', '0.0.0.0')}:{os.environ.get('PORT', '5006')}"
+workers = int(os.environ.get("JOURNAL_WORKERS") or 1)
+# gthread：每个 worker 一个线程池。每条 SSE 长连接会一直占着其中一个线程，
+# 所以 app 只允许 threads/4 条 SSE（serve.sse_stream_limit），其余标签页改为轮询 /events/poll
+worker_class = "gthread"
+threads = int(os.environ.get("JOURNAL_THREADS") or 16)
+keepalive = int(os.environ.get("JOURNAL_KEEPALIVE_SEC") or 75)
+# worker 心跳超时（gthread 下与单个请求耗时无关）
+timeout = 120
+graceful_timeout = int(float(os.environ.get("JOURNAL_DRAIN_SEC") or 60))
+# 每个 worker 自己 import app：启动迁移 / 事务恢复都靠文件锁串行，调度靠 scheduler.lock 选一个进程
+preload_app = False
+
+
+def post_worker_init(worker):
+    from app import app, start_background_tasks
+    from serve import sse_stream_limit
+
+    app.config["SSE_MAX_STREAMS"] = sse_stream_limit(worker.cfg.threads)
+    # 不等第一个请求：抢到租约的 worker 立刻开始调度
+    if start_background_tasks():
+        app._scheduler_started = True
+        worker.log.info("worker %s runs the LLM scheduler", worker.pid)
+
+
+def worker_exit(server, worker):
+    from serve import drain
+
+    if not drain(graceful_timeout):
+        worker.log.warning("worker %s: generations still running after %ss", worker.pid, graceful_timeout)
@@ -0,0 +1,90 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from flask import Response, g, request, session
+
+
+# =========================
+# 条件请求（ETag / Last-Modified）
+# =========================
+
+def make_etag(*parts: Any) -> str:
+    raw = "|".join("" if p is None else str(p) for p in parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _http_time(ts: float) -> Optional[datetime]:
+    if not ts:
+        return None
+    # HTTP 日期只精确到秒
+    return datetime.fromtimestamp(int(ts), tz=timezone.utc)
+
+
+def cacheable() -> bool:
+    """Pages with pending flash messages must always be rendered, and must not be stored."""
+    if session.get("_flashes"):
+        # 渲染时会被取走，apply_validators 在那之后才调用，所以先记下来
+        g._http_cache_flashed = True
+        return False
+    return not g.get("_http_cache_flashed", False)
+
+
+def not_modified(etag: str, mtime: float = 0.0) -> Optional[Response]:
+    """
+    Return a 304 response if the client already has this version, else None.
+
+    只构造一个空响应做条件判断，调用方命中时无需读取 JSON 或渲染模板。
+    """
+    if not cacheable():
+        return None
+    probe = Response()
+    apply_validators(probe, etag, mtime)
+    probe.make_conditional(request)
+    if probe.status_code == 304:
+        return probe
+    return None
+
+
+def apply_validators(resp: Response, etag: str, mtime: float = 0.0) -> Response:
+    if not cacheable():
+        # 带提示条的页面不给验证器：否则下次 304 会让浏览器再显示一遍旧提示
+        resp.headers["Cache-Control"] = "no-store"
+        return resp
+    resp.set_etag(etag)
+    lm = _http_time(mtime)
+    if lm is not None:
+        resp.last_modified = lm
+    # 允许浏览器缓存，但每次都要带上验证器回源确认
+    resp.headers["Cache-Control"] = "private, no-cache"
+    resp.vary.add("Cookie")
+    return resp
+
+
+# =========================
+# 静态资源指纹
+# =========================
+
+# 带指纹的 URL 内容永不变化，可以长期缓存
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+_fingerprints: Dict[str, Tuple[int, str]] = {}
+
+
+def static_fingerprint(static_folder: str, filename: str) -> Optional[str]:
+    full = os.path.join(static_folder, filename)
+    try:
+        mtime_ns = os.stat(full).st_mtime_ns
+    except OSError:
+        return None
+    cached = _fingerprints.get(full)
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
+    h = hashlib.sha1()
+    with open(full, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    digest = h.hexdigest()[:12]
+    _fingerprints[full] = (mtime_ns, digest)
+    return digest
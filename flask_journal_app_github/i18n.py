@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import re
+from typing import Dict, Optional
+
+from flask import Flask, current_app, g
+from flask import render_template as _flask_render_template
+from jinja2 import Environment, FileSystemBytecodeCache, Template
+from jinja2.ext import Extension
+
+
+# =========================
+# 翻译目录（i18n/<lang>.json）
+# =========================
+#
+# 每种语言一个 JSON 文件：{"lang": "en", "label": "EN", "messages": {中文原文: 译文}}
+# 启动时只读一次；新增语言只需要再放一个文件，不会让 create_app 变大。
+
+CATALOG_DIR = os.environ.get(
+    "JOURNAL_I18N_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "i18n"),
+)
+DEFAULT_LANG = "zh"
+
+_catalogs: Optional[Dict[str, Dict[str, str]]] = None
+_labels: Dict[str, str] = {}
+
+
+def load_catalogs() -> Dict[str, Dict[str, str]]:
+    global _catalogs
+    if _catalogs is not None:
+        return _catalogs
+    catalogs: Dict[str, Dict[str, str]] = {DEFAULT_LANG: {}}
+    labels: Dict[str, str] = {DEFAULT_LANG: "中文"}
+    if os.path.isdir(CATALOG_DIR):
+        for fn in sorted(os.listdir(CATALOG_DIR)):
+            if not fn.endswith(".json"):
+                continue
+            with open(os.path.join(CATALOG_DIR, fn), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            lang = (data.get("lang") or fn[: -len(".json")]).strip().lower()
+            catalogs[lang] = dict(data.get("messages") or {})
+            labels[lang] = data.get("label") or lang
+    _labels.clear()
+    _labels.update(labels)
+    _catalogs = catalogs
+    return catalogs
+
+
+def supported_langs() -> Dict[str, str]:
+    """{lang_code: label}, default language first."""
+    load_catalogs()
+    out = {DEFAULT_LANG: _labels[DEFAULT_LANG]}
+    for lang in sorted(_labels):
+        out.setdefault(lang, _labels[lang])
+    return out
+
+
+def translate(lang: str, key: str) -> str:
+    if key is None:
+        return ""
+    # If key is already in the target language, return as-is
+    return load_catalogs().get(lang, {}).get(key, key)
+
+
+# =========================
+# 模板编译期翻译
+# =========================
+
+_JINJA_TAG_RE = re.compile(r"\{\{.*?\}\}|\{%.*?%\}", re.S)
+_T_LITERAL_RE = re.compile(r"""(?<![\w.])t\(\s*(?:"([^"\\]*)"|'([^'\\]*)')\s*\)""")
+
+
+def _jinja_literal(s: str) -> str:
+    return '"' + s.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class CompileTimeTranslator(Extension):
+    """
+    Replace `t("literal")` in template tags with the translated string literal.
+
+    每种语言用一个 overlay 环境（各自独立的模板缓存），所以翻译只在模板
+    编译时做一次；`t(变量)` 这类动态调用保持原样，运行时再查表。
+    """
+
+    def preprocess(self, source: str, name: Optional[str], filename: Optional[str] = None) -> str:
+        lang = getattr(self.environment, "i18n_lang", None)
+        if not lang:
+            return source
+        catalog = load_catalogs().get(lang, {})
+
+        def _tr(m: "re.Match") -> str:
+            key = m.group(1) if m.group(1) is not None else m.group(2)
+            return _jinja_literal(catalog.get(key, key))
+
+        return _JINJA_TAG_RE.sub(lambda m: _T_LITERAL_RE.sub(_tr, m.group(0)), source)
+
+
+# =========================
+# 模板字节码缓存
+# =========================
+#
+# 编译模板（含上面的翻译预处理）是首次访问每个页面时最慢的一步。编译结果按语言写进
+# FileSystemBytecodeCache，下次启动直接加载。
+# - 缓存键只用模板名：PyInstaller 单文件版每次解压到不同的临时目录，带路径的默认键永远命中不了
+# - 模板源码变了 Jinja 会按校验和自动重编译；翻译变了则换文件名前缀（目录内容的哈希）
+# JOURNAL_TEMPLATE_CACHE_DIR=off 关闭；不设置时用 Jinja 默认的每用户临时目录。
+
+TEMPLATE_CACHE_DIR = os.environ.get("JOURNAL_TEMPLATE_CACHE_DIR") or None
+
+
+class _TemplateBytecodeCache(FileSystemBytecodeCache):
+    def get_cache_key(self, name: str, filename: Optional[str] = None) -> str:
+        return super().get_cache_key(name)
+
+
+def _catalog_digest(lang: str) -> str:
+    catalog = load_catalogs().get(lang, {})
+    return hashlib.sha1(json.dumps(catalog, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def _bytecode_cache(lang: str) -> Optional[FileSystemBytecodeCache]:
+    if (TEMPLATE_CACHE_DIR or "").lower() in ("off", "0", "none"):
+        return None
+    try:
+        if TEMPLATE_CACHE_DIR:
+            os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+        return _TemplateBytecodeCache(TEMPLATE_CACHE_DIR, f"__journal_{lang}_{_catalog_digest(lang)}_%s.cache")
+    except (OSError, RuntimeError):  # 临时目录不可用 / 权限不安全时 Jinja 会抛 RuntimeError
+        return None
+
+
+def init_app(app: Flask) -> None:
+    envs: Dict[str, Environment] = {}
+    for lang in supported_langs():
+        env = app.jinja_env.overlay(extensions=[CompileTimeTranslator], bytecode_cache=_bytecode_cache(lang))
+        env.i18n_lang = lang  # type: ignore[attr-defined]
+        envs[lang] = env
+    app.extensions["i18n_envs"] = envs
+
+
+def precompile_templates(app: Flask) -> int:
+    """Compile every template for every language (fills the bytecode cache). Returns the count."""
+    n = 0
+    for env in (app.extensions.get("i18n_envs") or {}).values():
+        for name in env.list_templates(extensions=["html"]):
+            env.get_template(name)
+            n += 1
+    return n
+
+
+def localized_env(lang: Optional[str] = None) -> Environment:
+    envs = current_app.extensions.get("i18n_envs") or {}
+    lang = lang or getattr(g, "lang", DEFAULT_LANG)
+    return envs.get(lang) or current_app.jinja_env
+
+
+def get_template(template_name: str, lang: Optional[str] = None) -> Template:
+    return localized_env(lang).get_template(template_name)
+
+
+def render_template(template_name: str, **context) -> str:
+    """Drop-in for flask.render_template using the current language's environment."""
+    return _flask_render_template(get_template(template_name), **context)
@@ -0,0 +1,409 @@
+import argparse
+import io
+import json
+import os
+import re
+import secrets
+import sys
+import time
+import zipfile
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from records import json_default
+from storage import (
+    LOCK_CATEGORIES,
+    LOCK_POSTS,
+    LOCK_COMMENTS,
+    LOCK_POST_META,
+    content_hash,
+    drop_blob_if_unused,
+    load_categories,
+    save_categories,
+    load_posts,
+    save_posts,
+    load_post_body,
+    load_post_meta,
+    save_post_meta,
+    load_comments,
+    save_comments,
+    transaction,
+)
+from revisions import record_revision
+
+
+# =========================
+# 批量导出 / 导入
+# =========================
+#
+# JSON Lines（一行一个对象，按 type 区分）：
+#   {"type": "journal", "version": 1, "exported_at": ...}
+#   {"type": "category", "id": ..., "name": ..., "color": ...}
+#   {"type": "post", "id", "title", "category", "published_at", "content", "meta": {...}, "comments": [...]}
+# Markdown zip：
+#   categories.json
+#   posts/2026/2026-10-19-<id>.md             front matter（值为 JSON）+ 正文
+#   posts/2026/2026-10-19-<id>.comments.jsonl  该文章的评论（有评论时才有）
+#
+# 导出是生成器：文章头 / 评论在内存里（本来就有记录缓存），正文逐篇从 blob 读，写一篇吐一篇。
+# 导入先逐条校验，再每 IMPORT_BATCH 篇做一次事务：posts / comments / post_meta 各读写一次，
+# 而不是每篇文章都整文件重写一遍。
+# --replace 覆盖已有文章时按一次编辑处理：正文变了就 edit_seq + 1、记一条历史版本、删掉没人用的旧 blob
+# （文件里的 edit_seq 只用于新文章）。
+
+FORMAT_VERSION = 1
+IMPORT_BATCH = int(os.environ.get("JOURNAL_IMPORT_BATCH") or 5000)
+MAX_ERRORS = 50
+
+POST_KEYS = ("id", "title", "category", "published_at")
+_SAFE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+# ---------- 导出 ----------
+def _comments_by_post() -> Dict[str, List[Any]]:
+    out: Dict[str, List[Any]] = {}
+    for c in load_comments():
+        out.setdefault(c.get("post_id", ""), []).append(c)
+    for items in out.values():
+        items.sort(key=lambda c: c.get("created_at", ""))
+    return out
+
+
+def iter_posts() -> Iterator[Dict[str, Any]]:
+    """Export records, oldest post first; bodies are read one at a time."""
+    comments = _comments_by_post()
+    meta = load_post_meta().get("meta") or {}
+    for p in sorted(load_posts(), key=lambda p: p.get("published_at", "")):
+        pid = p.get("id")
+        rec = {"type": "post"}
+        rec.update({k: p.get(k, "") for k in POST_KEYS})
+        rec["content"] = load_post_body(p)
+        rec["meta"] = {k: v for k, v in (meta.get(pid) or {}).items() if k != "content_hash"}
+        rec["comments"] = comments.get(pid, [])
+        yield rec
+
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, default=json_default)
+
+
+def export_jsonl() -> Iterator[str]:
+    yield _dumps({"type": "journal", "version": FORMAT_VERSION, "exported_at": _now_iso()}) + "\n"
+    for c in load_categories():
+        yield _dumps({"type": "category", **c}) + "\n"
+    for rec in iter_posts():
+        yield _dumps(rec) + "\n"
+
+
+class _ChunkSink:
+    """Write-only file object for zipfile: collects bytes until the generator drains them."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts = []
+        return out
+
+
+def _md_name(rec: Dict[str, Any]) -> str:
+    day = (rec.get("published_at") or "")[:10] or "undated"
+    return f"posts/{day[:4]}/{day}-{rec['id']}"
+
+
+def export_markdown_zip() -> Iterator[bytes]:
+    # zipfile 对不可 seek 的输出会改用 data descriptor，所以可以边写边发
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("categories.json", json.dumps(load_categories(), ensure_ascii=False, indent=2))
+        yield sink.drain()
+        for rec in iter_posts():
+            name = _md_name(rec)
+            front = [f"{k}: {json.dumps(rec.get(k, ''), ensure_ascii=False)}" for k in POST_KEYS]
+            if rec["meta"]:
+                front.append(f"meta: {_dumps(rec['meta'])}")
+            zf.writestr(name + ".md", "---\n" + "\n".join(front) + "\n---\n\n" + rec["content"] + "\n")
+            if rec["comments"]:
+                zf.writestr(name + ".comments.jsonl", "".join(_dumps(c) + "\n" for c in rec["comments"]))
+            yield sink.drain()
+    yield sink.drain()
+
+
+# ---------- 读取导入文件 ----------
+def read_jsonl(stream: Iterable[str]) -> Iterator[Tuple[int, Any]]:
+    """(line number, parsed object or the error message) for every non-empty line."""
+    for lineno, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield lineno, json.loads(line)
+        except ValueError as e:
+            yield lineno, f"JSON 解析失败：{e}"
+
+
+def _parse_markdown(text: str) -> Dict[str, Any]:
+    if not text.startswith("---\n"):
+        raise ValueError("缺少 front matter")
+    end = text.find("\n---\n", 4)
+    if end < 0:
+        raise ValueError("front matter 没有结束")
+    rec: Dict[str, Any] = {"type": "post"}
+    for line in text[4:end].splitlines():
+        key, sep, value = line.partition(":")
+        if sep:
+            rec[key.strip()] = json.loads(value)
+    body = text[end + 5:]
+    if body.startswith("\n"):
+        body = body[1:]
+    rec["content"] = body[:-1] if body.endswith("\n") else body
+    return rec
+
+
+def read_markdown_zip(fileobj: BinaryIO) -> Iterator[Tuple[int, Any]]:
+    with zipfile.ZipFile(fileobj) as zf:
+        names = set(zf.namelist())
+        if "categories.json" in names:
+            try:
+                for c in json.loads(zf.read("categories.json").decode("utf-8")):
+                    yield 0, {"type": "category", **c}
+            except (ValueError, TypeError) as e:
+                yield 0, f"categories.json：{e}"
+        for n, name in enumerate(sorted(x for x in names if x.endswith(".md")), 1):
+            try:
+                rec = _parse_markdown(zf.read(name).decode("utf-8"))
+                side = name[:-3] + ".comments.jsonl"
+                if side in names:
+                    rec["comments"] = [json.loads(l) for l in zf.read(side).decode("utf-8").splitlines() if l.strip()]
+                yield n, rec
+            except (ValueError, UnicodeDecodeError) as e:
+                yield n, f"{name}：{e}"
+
+
+def read_import_file(fileobj: BinaryIO, filename: str) -> Iterator[Tuple[int, Any]]:
+    if filename.lower().endswith(".zip"):
+        return read_markdown_zip(fileobj)
+    return read_jsonl(io.TextIOWrapper(fileobj, encoding="utf-8", errors="replace"))
+
+
+# ---------- 导入 ----------
+def _now_iso() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S%z")
+
+
+def _check_post(rec: Dict[str, Any], categories: set) -> Dict[str, Any]:
+    """Normalized post record or ValueError."""
+    pid = rec.get("id") or secrets.token_urlsafe(8)
+    if not isinstance(pid, str) or not _SAFE_ID.match(pid):
+        raise ValueError(f"id 不合法：{pid!r}")
+    title = rec.get("title")
+    content = rec.get("content")
+    if not isinstance(title, str) or not title.strip():
+        raise ValueError("标题为空")
+    if not isinstance(content, str) or not content.strip():
+        raise ValueError("正文为空")
+    category = rec.get("category") or ""
+    if category not in categories:
+        raise ValueError(f"分类不存在：{category!r}")
+    comments = rec.get("comments") or []
+    if not isinstance(comments, list) or not all(isinstance(c, dict) and c.get("id") for c in comments):
+        raise ValueError("评论格式不正确")
+    meta = rec.get("meta") if isinstance(rec.get("meta"), dict) else {}
+    return {
+        "post": {
+            "id": pid,
+            "title": title.strip(),
+            "category": category,
+            "published_at": rec.get("published_at") or _now_iso(),
+            "content": content.rstrip(),
+        },
+        "meta": meta,
+        "comments": [dict(c, post_id=pid) for c in comments],
+    }
+
+
+def _write_batch(batch: List[Dict[str, Any]], new_categories: List[Dict[str, Any]], replace: bool) -> Tuple[int, int, int]:
+    """One transaction for the whole batch. Returns (posts written, posts skipped, comments written)."""
+    with transaction(LOCK_CATEGORIES, LOCK_POSTS, LOCK_COMMENTS, LOCK_POST_META):
+        if new_categories:
+            cats = load_categories()
+            have = {c.get("id") for c in cats}
+            cats.extend(c for c in new_categories if c["id"] not in have)
+            save_categories(cats)
+            new_categories.clear()
+        if not batch:
+            return 0, 0, 0
+
+        posts = load_posts()
+        index = {p.get("id"): i for i, p in enumerate(posts)}
+        meta = load_post_meta()
+        mm = meta.setdefault("meta", {})
+        comments = load_comments()
+        comment_ids = {c.get("id") for c in comments}
+
+        written = skipped = n_comments = 0
+        old_hashes: List[str] = []
+        for item in batch:
+            post = item["post"]
+            pid = post["id"]
+            digest = content_hash(post["content"])
+            m = item["meta"]
+            if pid in index:
+                if not replace:
+                    skipped += 1
+                    continue
+                prev = posts[index[pid]]
+                posts[index[pid]] = post
+                old = dict(mm.get(pid) or {})
+                seq = int(old.get("edit_seq", 0) or 0)
+                prev_hash = prev.get("content_hash") or content_hash(load_post_body(prev))
+                if prev_hash != digest:
+                    now = _now_iso()
+                    record_revision(pid, seq + 1, post["content"], now,
+                                    previous=load_post_body(prev), previous_at=old.get("updated_at", ""))
+                    old.update(edit_seq=seq + 1, updated_at=now)
+                    old_hashes.append(prev_hash)
+                mm[pid] = {
+                    "edit_seq": int(old.get("edit_seq", 0) or 0),
+                    "updated_at": old.get("updated_at") or _now_iso(),
+                    "content_hash": digest,
+                }
+            else:
+                index[pid] = len(posts)
+                posts.append(post)
+                mm[pid] = {
+                    "edit_seq": int(m.get("edit_seq", 0) or 0),
+                    "updated_at": m.get("updated_at") or _now_iso(),
+                    "content_hash": digest,
+                }
+                # 和 create_post 一样：导入的正文记为当前 edit_seq 的版本，评论的“写于第 N 版”才有得看
+                record_revision(pid, mm[pid]["edit_seq"], post["content"], mm[pid]["updated_at"])
+            for c in item["comments"]:
+                if c["id"] not in comment_ids:
+                    comment_ids.add(c["id"])
+                    comments.append(c)
+                    n_comments += 1
+            written += 1
+
+        if written:
+            save_posts(posts)
+            if old_hashes:
+                current = load_posts()
+                for h in old_hashes:
+                    drop_blob_if_unused(h, current)
+            save_post_meta(meta)
+            if n_comments:
+                save_comments(comments)
+    return written, skipped, n_comments
+
+
+def import_records(items: Iterable[Tuple[int, Any]], replace: bool = False,
+                   batch_size: int = IMPORT_BATCH) -> Dict[str, Any]:
+    """Validate and import (line, record) pairs from read_jsonl / read_markdown_zip.
+
+    Invalid records are skipped and reported; existing post ids are kept unless replace=True.
+    """
+    t0 = time.perf_counter()
+    stats: Dict[str, Any] = {"posts": 0, "comments": 0, "skipped": 0, "invalid": 0, "batches": 0, "errors": []}
+    categories = {c.get("id") for c in load_categories()}
+    new_categories: List[Dict[str, Any]] = []
+    batch: List[Dict[str, Any]] = []
+    seen: set = set()
+
+    def flush() -> None:
+        written, skipped, n_comments = _write_batch(batch, new_categories, replace)
+        stats["posts"] += written
+        stats["skipped"] += skipped
+        stats["comments"] += n_comments
+        stats["batches"] += 1
+        batch.clear()
+
+    def bad(where: int, msg: str) -> None:
+        stats["invalid"] += 1
+        if len(stats["errors"]) < MAX_ERRORS:
+            stats["errors"].append(f"#{where}: {msg}")
+
+    for where, rec in items:
+        if isinstance(rec, str):
+            bad(where, rec)
+            continue
+        kind = rec.get("type", "post") if isinstance(rec, dict) else None
+        if kind == "journal":
+            if int(rec.get("version", 1)) > FORMAT_VERSION:
+                raise ValueError(f"不支持的导出版本：{rec.get('version')}")
+            continue
+        if kind == "category":
+            cid, name = rec.get("id"), rec.get("name")
+            if not isinstance(cid, str) or not cid or not isinstance(name, str) or not name:
+                bad(where, "分类缺少 id / name")
+            elif cid not in categories:
+                categories.add(cid)
+                new_categories.append({"id": cid, "name": name, "color": rec.get("color") or "#0d6efd"})
+            continue
+        if kind != "post":
+            bad(where, f"未知类型：{kind!r}")
+            continue
+        try:
+            item = _check_post(rec, categories)
+        except (ValueError, TypeError) as e:
+            bad(where, str(e))
+            continue
+        if item["post"]["id"] in seen:
+            bad(where, f"文件里重复的 id：{item['post']['id']}")
+            continue
+        seen.add(item["post"]["id"])
+        batch.append(item)
+        if len(batch) >= batch_size:
+            flush()
+    if batch or new_categories:
+        flush()
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    return stats
+
+
+# ---------- CLI ----------
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python journal_io.py", description="Bulk export / import of the journal")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="write all posts with comments and meta")
+    ex.add_argument("--format", choices=("jsonl", "markdown"), default="jsonl")
+    ex.add_argument("-o", "--output", default="-", help="file path, or - for stdout (jsonl only)")
+    im = sub.add_parser("import", help="import a .jsonl export or a Markdown .zip")
+    im.add_argument("path")
+    im.add_argument("--replace", action="store_true", help="overwrite posts whose id already exists")
+    im.add_argument("--batch", type=int, default=IMPORT_BATCH)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "export":
+        if args.format == "markdown":
+            if args.output == "-":
+                ap.error("markdown export needs -o FILE.zip")
+            with open(args.output, "wb") as f:
+                for chunk in export_markdown_zip():
+                    f.write(chunk)
+        elif args.output == "-":
+            out: TextIO = sys.stdout
+            for line in export_jsonl():
+                out.write(line)
+        else:
+            with open(args.output, "w", encoding="utf-8") as f:
+                for line in export_jsonl():
+                    f.write(line)
+        return 0
+
+    with open(args.path, "rb") as f:
+        stats = import_records(read_import_file(f, args.path), replace=args.replace, batch_size=max(1, args.batch))
+    for err in stats.pop("errors"):
+        print(err, file=sys.stderr)
+    print(json.dumps(stats, ensure_ascii=False))
+    return 1 if stats["invalid"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
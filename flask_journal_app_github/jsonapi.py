@@ -0,0 +1,129 @@
+import base64
+import gzip
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from flask import Response, request
+
+try:  # Brotli 是可选依赖：pip install Brotli
+    import brotli  # type: ignore
+except Exception:  # pragma: no cover - depends on environment
+    brotli = None
+
+
+# =========================
+# 字段投影
+# =========================
+
+POST_FIELDS = ("id", "title", "category", "content", "published_at", "edit_seq", "updated_at", "content_hash")
+# 列表默认不带正文
+POST_LIST_DEFAULT_FIELDS = tuple(f for f in POST_FIELDS if f != "content")
+COMMENT_FIELDS = ("id", "post_id", "post_edit_seq", "model", "content", "created_at", "read")
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+
+
+def parse_fields(raw: Optional[str], allowed: Sequence[str], default: Sequence[str]) -> List[str]:
+    """Parse `fields=a,b,c`; raises ValueError on unknown names."""
+    raw = (raw or "").strip()
+    if not raw:
+        return list(default)
+    fields = [f.strip() for f in raw.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"未知字段：{', '.join(unknown)}")
+    return fields
+
+
+def project(record: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+    return {f: record.get(f) for f in fields}
+
+
+def parse_limit(raw: Optional[str]) -> int:
+    try:
+        n = int(raw or DEFAULT_LIMIT)
+    except Exception:
+        raise ValueError("limit 必须是整数")
+    return max(1, min(MAX_LIMIT, n))
+
+
+# =========================
+# 游标分页
+# =========================
+
+def encode_cursor(sort_value: str, record_id: str) -> str:
+    raw = json.dumps([sort_value or "", record_id or ""], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, str]]:
+    cursor = (cursor or "").strip()
+    if not cursor:
+        return None
+    try:
+        pad = "=" * (-len(cursor) % 4)
+        value = json.loads(base64.urlsafe_b64decode(cursor + pad).decode("utf-8"))
+        return (str(value[0]), str(value[1]))
+    except Exception:
+        raise ValueError("cursor 无效")
+
+
+def paginate(
+    records: List[Dict[str, Any]],
+    sort_field: str,
+    cursor: Optional[Tuple[str, str]],
+    limit: int,
+    descending: bool,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Keyset pagination over (sort_field, id).
+
+    游标记录的是上一页最后一条的 (排序值, id)，翻页期间插入新数据也不会重复或漏掉。
+    """
+
+    def key(r: Dict[str, Any]) -> Tuple[str, str]:
+        return (r.get(sort_field) or "", r.get("id") or "")
+
+    ordered = sorted(records, key=key, reverse=descending)
+    if cursor is not None:
+        if descending:
+            ordered = [r for r in ordered if key(r) < cursor]
+        else:
+            ordered = [r for r in ordered if key(r) > cursor]
+    page = ordered[:limit]
+    next_cursor = None
+    if len(ordered) > limit and page:
+        next_cursor = encode_cursor(*key(page[-1]))
+    return page, next_cursor
+
+
+# =========================
+# 响应压缩
+# =========================
+
+MIN_COMPRESS_BYTES = 1024
+
+
+def compress_response(resp: Response) -> Response:
+    """gzip / Brotli-encode a buffered JSON response if the client accepts it."""
+    if resp.direct_passthrough or resp.is_streamed:
+        return resp
+    if resp.status_code < 200 or resp.status_code >= 300 or "Content-Encoding" in resp.headers:
+        return resp
+    if resp.mimetype != "application/json":
+        return resp
+
+    resp.vary.add("Accept-Encoding")
+    body = resp.get_data()
+    if len(body) < MIN_COMPRESS_BYTES:
+        return resp
+
+    accept = request.accept_encodings
+    if brotli is not None and accept["br"]:
+        resp.set_data(brotli.compress(body, quality=5))
+        resp.headers["Content-Encoding"] = "br"
+    elif accept["gzip"]:
+        resp.set_data(gzip.compress(body, compresslevel=6))
+        resp.headers["Content-Encoding"] = "gzip"
+    return resp
@@ -0,0 +1,189 @@
+import atexit
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from storage import DATA_DIR
+
+
+# =========================
+# LLM 调用日志（JSON Lines，后台写入 + 按大小轮转）
+# =========================
+#
+# 每次生成一条记录：
+#   {"ts", "model", "post_id", "prompt_tokens", "prompt_chars", "response_chars",
+#    "eval_count", "done_reason", "load_ms", "ttfb_ms", "total_ms",
+#    "outcome": ok|empty|timeout|error, "error"}
+# load_ms 是 Ollama 报告的模型加载时间（冷启动），已包含在 ttfb_ms / total_ms 里。
+# 写满 max_bytes 后轮转为 llm_calls.log.1.gz … llm_calls.log.N.gz。
+
+LLM_LOG_PATH = os.environ.get("JOURNAL_LLM_LOG_PATH", os.path.join(DATA_DIR, "llm_calls.log"))
+LLM_LOG_MAX_BYTES = int(os.environ.get("JOURNAL_LLM_LOG_MAX_BYTES") or 5 * 1024 * 1024)
+LLM_LOG_BACKUPS = int(os.environ.get("JOURNAL_LLM_LOG_BACKUPS") or 5)
+
+
+class CallLog:
+    def __init__(self, path: str, max_bytes: int, backups: int, flush_interval: float = 1.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self._q: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=10000)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._summary_cache: Optional[Tuple[List, Dict[str, Dict[str, Any]]]] = None
+
+    # ---------- 写入 ----------
+    def record(self, entry: Dict[str, Any]) -> None:
+        entry.setdefault("ts", datetime.now().astimezone().isoformat(timespec="seconds"))
+        self._ensure_started()
+        try:
+            self._q.put_nowait(entry)
+        except queue.Full:
+            pass
+
+    def _ensure_started(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="llm-call-log", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._q.get()
+            batch = [item]
+            # 攒一小段时间内的记录，一次 open/write
+            try:
+                while True:
+                    batch.append(self._q.get(timeout=self.flush_interval if item is not None else 0))
+            except queue.Empty:
+                pass
+            stop = any(e is None for e in batch)
+            self._write([e for e in batch if e is not None])
+            for _ in batch:
+                self._q.task_done()
+            if stop:
+                return
+
+    def _write(self, entries: List[Dict[str, Any]]) -> None:
+        if not entries:
+            return
+        data = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries)
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(data)
+                size = f.tell()
+            if size >= self.max_bytes:
+                self._rotate()
+        except OSError:
+            pass
+
+    def _rotate(self) -> None:
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}.gz"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}.gz")
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        rotated = self.path + ".rotating"
+        os.replace(self.path, rotated)
+        with open(rotated, "rb") as fin, gzip.open(f"{self.path}.1.gz", "wb") as fout:
+            shutil.copyfileobj(fin, fout)
+        os.remove(rotated)
+
+    def flush(self, timeout: float = 5.0) -> None:
+        if not (self._thread and self._thread.is_alive()):
+            return
+        done = threading.Event()
+
+        def _wait():
+            self._q.join()
+            done.set()
+
+        threading.Thread(target=_wait, daemon=True).start()
+        done.wait(timeout)
+
+    def close(self) -> None:
+        if self._thread and self._thread.is_alive():
+            self._q.put(None)
+            self._thread.join(5.0)
+
+    # ---------- 汇总 ----------
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per-model counts and latency percentiles from the live log plus the newest rotated file."""
+        sources = [self.path, f"{self.path}.1.gz"]
+        key = []
+        for p in sources:
+            try:
+                st = os.stat(p)
+                key.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                key.append(None)
+        if not any(key):
+            return {}
+        if self._summary_cache and self._summary_cache[0] == key:
+            return self._summary_cache[1]
+
+        per_model: Dict[str, Dict[str, Any]] = {}
+        for p, k in zip(sources, key):
+            if k is None:
+                continue
+            opener = gzip.open if p.endswith(".gz") else open
+            try:
+                with opener(p, "rt", encoding="utf-8", errors="replace") as f:
+                    for line in f:
+                        try:
+                            e = json.loads(line)
+                        except ValueError:
+                            continue
+                        m = per_model.setdefault(e.get("model") or "-", {"calls": 0, "outcomes": {}, "total": [], "ttfb": [], "load": []})
+                        m["calls"] += 1
+                        outcome = e.get("outcome") or "-"
+                        m["outcomes"][outcome] = m["outcomes"].get(outcome, 0) + 1
+                        if outcome == "ok":
+                            if e.get("total_ms") is not None:
+                                m["total"].append(float(e["total_ms"]))
+                            if e.get("ttfb_ms") is not None:
+                                m["ttfb"].append(float(e["ttfb_ms"]))
+                            if e.get("load_ms") is not None:
+                                m["load"].append(float(e["load_ms"]))
+            except (OSError, EOFError):
+                continue
+
+        out: Dict[str, Dict[str, Any]] = {}
+        for model, m in sorted(per_model.items()):
+            total = sorted(m["total"])
+            ttfb = sorted(m["ttfb"])
+            out[model] = {
+                "calls": m["calls"],
+                "ok": m["outcomes"].get("ok", 0),
+                "timeout": m["outcomes"].get("timeout", 0),
+                "error": m["outcomes"].get("error", 0) + m["outcomes"].get("empty", 0),
+                "p50_ms": _pct(total, 0.50),
+                "p95_ms": _pct(total, 0.95),
+                "ttfb_p50_ms": _pct(ttfb, 0.50),
+                "load_p50_ms": _pct(sorted(m["load"]), 0.50),
+            }
+        self._summary_cache = (key, out)
+        return out
+
+
+def _pct(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return round(sorted_values[idx], 1)
+
+
+call_log = CallLog(LLM_LOG_PATH, LLM_LOG_MAX_BYTES, LLM_LOG_BACKUPS)
+atexit.register(call_log.close)
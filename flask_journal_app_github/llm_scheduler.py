@@ -1,22 +1,28 @@
 import json
+import os
 import random
 import threading
 import time
 import secrets
+from collections import deque
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 
-from dateutil import tz
-
 from storage import (
-    load_posts, load_comments, save_comments,
+    DATA_DIR,
+    load_posts, load_comments, load_post_body,
     load_llm_config, load_post_meta, load_categories,
-    file_lock, LOCK_COMMENTS
 )
-from ollama_client import list_models, generate_comment
+import metrics
+from comment_writer import comment_writer, COMMENT_WRITE_TIMEOUT
+from backends import list_models, pool as backend_pool
+from dispatcher import dispatcher, GenerationDeferred, SCHEDULED
+from events import publish_new_comment
 
 
 def now_local_iso() -> str:
+    from dateutil import tz  # 按需导入，不拖慢启动
+
     return datetime.now(tz=tz.tzlocal()).isoformat(timespec="seconds")
 
 
@@ -37,11 +43,9 @@ def get_category_name(cat_id: str) -> str:
 
 
 def _allowed_models(cfg: Dict) -> List[str]:
-    server = cfg.get("server", "127.0.0.1")
-    port = int(cfg.get("port", 11434))
     allowed = cfg.get("allowed_models") or []
     try:
-        all_models = list_models(server, port, timeout_sec=5.0)
+        all_models = list_models(cfg, timeout_sec=5.0)
     except Exception:
         return list(allowed)
     if allowed:
@@ -50,7 +54,7 @@ def _allowed_models(cfg: Dict) -> List[str]:
     return all_models
 
 
-def _get_prompt(cfg: Dict) -> Tuple[str, str]:
+def _pick_preset(cfg: Dict) -> Optional[Dict]:
     presets = cfg.get("prompt_presets") or []
     ids = cfg.get("active_prompt_preset_ids") or []
     if not ids:
@@ -67,11 +71,72 @@ def _get_prompt(cfg: Dict) -> Tuple[str, str]:
 
     if not chosen and presets:
         chosen = presets[0]
+    return chosen
+
 
+def _prompt_from_preset(chosen: Optional[Dict]) -> Tuple[str, str]:
     if not chosen:
         return ("", "请阅读我的笔记并给出你的看法。")
     return (chosen.get("system") or "", chosen.get("user_prefix") or "请阅读我的笔记并给出你的看法。")
 
+
+# =========================
+# 生成长度 / 上下文限制
+# =========================
+#
+# num_predict（最多生成多少 token）、num_ctx（上下文窗口）按以下顺序取第一个 >0 的值：
+#   llm_config.json 的 num_predict_by_model[model] > 提示词预设里的 num_predict > num_predict_default
+# num_ctx 同理。都没有时不传，由 Ollama / 模型决定。
+
+LIMIT_OPTIONS = ("num_predict", "num_ctx")
+
+
+def generation_options(cfg: Dict, model: str, preset: Optional[Dict] = None) -> Dict:
+    out: Dict = {}
+    for key in LIMIT_OPTIONS:
+        for v in ((cfg.get(f"{key}_by_model") or {}).get(model), (preset or {}).get(key), cfg.get(f"{key}_default")):
+            try:
+                n = int(v or 0)
+            except (TypeError, ValueError):
+                continue
+            if n > 0:
+                out[key] = n
+                break
+    return out
+
+
+def generation_fields(stats: Optional[Dict]) -> Dict:
+    """Fields copied from Ollama's final stats onto a comment record."""
+    if not stats:
+        return {}
+    return {k: stats[k] for k in ("eval_count", "eval_duration", "prompt_eval_count", "done_reason") if k in stats}
+
+
+def throughput_by_model(comments: List[Dict]) -> List[Dict]:
+    """Tokens/sec per model from comments that carry eval_count / eval_duration."""
+    acc: Dict[str, Dict] = {}
+    for c in comments:
+        n, ns = c.get("eval_count"), c.get("eval_duration")
+        if not n or not ns:
+            continue
+        a = acc.setdefault(c.get("model") or "-", {"comments": 0, "tokens": 0, "ns": 0, "truncated": 0})
+        a["comments"] += 1
+        a["tokens"] += int(n)
+        a["ns"] += int(ns)
+        if c.get("done_reason") == "length":
+            a["truncated"] += 1
+    return [
+        {
+            "model": m,
+            "comments": a["comments"],
+            "avg_tokens": round(a["tokens"] / a["comments"]),
+            "tokens_per_sec": round(a["tokens"] / (a["ns"] / 1e9), 1) if a["ns"] else None,
+            "truncated": a["truncated"],
+        }
+        for m, a in sorted(acc.items())
+    ]
+
+
 def _count_comments_for_post_model(comments: List[Dict], post_id: str, model: str, edit_seq: int) -> int:
     return sum(
         1 for c in comments
@@ -113,36 +178,34 @@ def pick_post_for_model(cfg: Dict, model: str) -> Optional[Dict]:
     return random.choice(eligible_posts)
 
 
-def add_comment(post_id: str, model: str, content: str) -> str:
+def add_comment(post_id: str, model: str, content: str, stats: Optional[Dict] = None) -> str:
     comment_id = secrets.token_urlsafe(8)
-    with file_lock(LOCK_COMMENTS):
-        comments = load_comments()
-        comments.append({
-            "id": comment_id,
-            "post_id": post_id,
-            "post_edit_seq": get_post_edit_seq(post_id),
-            "model": model,
-            "content": content,
-            "created_at": now_local_iso(),
-            "read": False,
-        })
-        save_comments(comments)
+    record = {
+        "id": comment_id,
+        "post_id": post_id,
+        "post_edit_seq": get_post_edit_seq(post_id),
+        "model": model,
+        "content": content,
+        "created_at": now_local_iso(),
+        "read": False,
+        **generation_fields(stats),
+    }
+    unread = comment_writer.append(record).result(COMMENT_WRITE_TIMEOUT)
+    publish_new_comment(record, unread)
     return comment_id
 
 
 def run_once_for_model(model: str) -> Dict:
     cfg = load_llm_config()
     if not cfg.get("auto_enabled", True):
-        return {"ok": False, "error": "自动评论已关闭（仍可手动立即评论）"}
-
-    server = cfg.get("server", "127.0.0.1")
-    port = int(cfg.get("port", 11434))
+        return {"ok": False, "kind": "disabled", "error": "自动评论已关闭（仍可手动立即评论）"}
 
     post = pick_post_for_model(cfg, model)
     if not post:
-        return {"ok": False, "error": "没有可评论的文章（可能已达到每篇上限）"}
+        return {"ok": False, "kind": "no_post", "error": "没有可评论的文章（可能已达到每篇上限）"}
 
-    system, prefix = _get_prompt(cfg)
+    preset = _pick_preset(cfg)
+    system, prefix = _prompt_from_preset(preset)
     cat_id = post.get("category", "")
     payload = {
         "title": post.get("title", ""),
@@ -150,7 +213,7 @@ def run_once_for_model(model: str) -> Dict:
         "category_name": get_category_name(cat_id),
         "published_at": post.get("published_at", ""),
         "edit_seq": get_post_edit_seq(post.get("id")),
-        "content": post.get("content", ""),
+        "content": load_post_body(post),
     }
 
     user_prompt = (
@@ -159,35 +222,269 @@ def run_once_for_model(model: str) -> Dict:
         f"{json.dumps(payload, ensure_ascii=False, indent=2)}\n"
     )
 
+    stats: Dict = {}
+    t0 = time.perf_counter()
     try:
-        resp = generate_comment(server, port, model, system=system, user_prompt=user_prompt, timeout_sec=float(cfg.get("timeout_sec", 300)))
+        resp = dispatcher.generate(
+            cfg, model, system=system, user_prompt=user_prompt, priority=SCHEDULED,
+            timeout_sec=float(cfg.get("timeout_sec", 300)), post_id=post.get("id", ""),
+            options=generation_options(cfg, model, preset), stats_out=stats,
+        )
+    except GenerationDeferred as e:
+        return {"ok": False, "kind": "deferred", "error": str(e)}
     except Exception as e:
-        return {"ok": False, "error": f"Ollama 调用失败：{e.__class__.__name__}: {e}"}
+        return {"ok": False, "kind": "llm_error", "elapsed": time.perf_counter() - t0,
+                "error": f"Ollama 调用失败：{e.__class__.__name__}: {e}"}
+    elapsed = time.perf_counter() - t0
 
     if not resp:
-        return {"ok": False, "error": "模型没有返回内容"}
-
-    cid = add_comment(post.get("id"), model, resp.strip())
-    return {"ok": True, "post_id": post.get("id"), "comment_id": cid, "model": model}
+        return {"ok": False, "kind": "llm_error", "elapsed": elapsed, "error": "模型没有返回内容"}
+
+    cid = add_comment(post.get("id"), model, resp.strip(), stats)
+    return {"ok": True, "post_id": post.get("id"), "comment_id": cid, "model": model, "elapsed": elapsed}
+
+
+# =========================
+# 自适应调度：按模型记录耗时 / 失败，指数退避 + 熔断
+# =========================
+#
+# llm_config.json 中的可选项（缺省值见 ADAPTIVE_DEFAULTS）：
+#   adaptive_backoff               连续失败后间隔按 2^n 拉长（上限 backoff_max_minutes）
+#   circuit_breaker_failures       连续失败达到该次数后暂停该模型 circuit_breaker_pause_minutes，
+#                                  到期后试跑一次：成功则恢复，失败则继续暂停
+#   throughput_aware               最近一小时生成总耗时 / 3600 超过 target_host_utilization 时，
+#                                  按比例拉长所有模型的间隔
+#   warmup_lead_seconds            >0 时在 next_run 前这么多秒先发一个空 prompt 让 Ollama 加载模型
+#   runs_per_wake                  模型到点后连续生成几条（模型已在显存里，后几条不再付加载时间）
+# 同时到点的多个模型，已在显存里的先跑，减少来回换模型。keep_alive 见 dispatcher.keep_alive_for。
+# “没有可评论的文章”、让位给手动评论（deferred）都不算失败。
+
+ADAPTIVE_DEFAULTS: Dict = {
+    "adaptive_backoff": True,
+    "backoff_max_minutes": 720,
+    "circuit_breaker_failures": 5,
+    "circuit_breaker_pause_minutes": 240,
+    "throughput_aware": False,
+    "target_host_utilization": 0.5,
+    "warmup_lead_seconds": 0,
+    "runs_per_wake": 1,
+}
+
+UTILIZATION_WINDOW_SEC = 3600.0
+DEFERRED_RETRY_SEC = 60.0
+
+
+def adaptive_setting(cfg: Dict, key: str):
+    v = cfg.get(key)
+    return ADAPTIVE_DEFAULTS[key] if v is None else v
+
+
+class ModelHealth:
+    def __init__(self):
+        self.latencies: deque = deque(maxlen=20)
+        self.runs = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_error = ""
+        self.last_run_at: Optional[float] = None
+        self.paused_until = 0.0
+
+    def record(self, res: Dict, now: float) -> None:
+        self.last_run_at = now
+        if res.get("ok"):
+            self.runs += 1
+            self.consecutive_failures = 0
+            self.last_error = ""
+            self.paused_until = 0.0
+            self.latencies.append(float(res.get("elapsed") or 0.0))
+        elif res.get("kind") == "llm_error":
+            self.runs += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = res.get("error") or ""
+            if res.get("elapsed") is not None:
+                self.latencies.append(float(res["elapsed"]))
+
+    def avg_latency(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        return sum(self.latencies) / len(self.latencies)
+
+
+# =========================
+# 调度进程租约
+# =========================
+#
+# 多个 worker 进程（gunicorn --workers N）都会 import app，但自动评论只能有一份在跑。
+# 用操作系统级别的文件锁（flock / msvcrt）选出一个进程：进程退出（包括崩溃）时锁自动释放，
+# 不会像 *.lock 标记文件那样残留。
+
+SCHEDULER_LOCK_PATH = os.path.join(DATA_DIR, "scheduler.lock")
+
+
+class SchedulerLease:
+    def __init__(self, path: str = SCHEDULER_LOCK_PATH):
+        self.path = path
+        self._fh = None
+
+    def acquire(self) -> bool:
+        """Non-blocking; True if this process holds (or now holds) the lease."""
+        if self._fh is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fh = open(self.path, "a+")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return False
+        self._fh = fh
+        return True
+
+    def release(self) -> None:
+        fh, self._fh = self._fh, None
+        if fh is not None:
+            fh.close()  # 关闭文件即释放锁
+
+    def held(self) -> bool:
+        return self._fh is not None
+
+
+scheduler_lease = SchedulerLease()
 
 
 class LLMScheduler:
     def __init__(self):
         self._stop = threading.Event()
         self._thread = None
-
-    def start(self):
+        self._lock = threading.Lock()
+        self._next_run: Dict[str, float] = {}
+        self._health: Dict[str, ModelHealth] = {}
+        # (结束时间, 生成耗时秒)，用于估算 Ollama 主机占用率
+        self._busy: deque = deque()
+        # model -> 已为哪一次 next_run 预热过 / 最近一次预热的加载耗时
+        self._warmed_for: Dict[str, float] = {}
+        self._warm_load_sec: Dict[str, float] = {}
+
+    def start(self) -> bool:
+        """Start the loop unless another process holds the scheduler lease. Returns True if running here."""
         if self._thread and self._thread.is_alive():
-            return
+            return True
+        if not scheduler_lease.acquire():
+            return False
         self._stop.clear()
         self._thread = threading.Thread(target=self._loop, daemon=True)
         self._thread.start()
+        return True
 
     def stop(self):
         self._stop.set()
 
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the loop to exit after stop() (finishes the generation in progress). True if it has."""
+        t = self._thread
+        if t is not None:
+            t.join(timeout)
+        return not (t and t.is_alive())
+
+    # ---------- 自适应间隔 ----------
+    def _record(self, model: str, res: Dict) -> None:
+        now = time.time()
+        with self._lock:
+            h = self._health.setdefault(model, ModelHealth())
+            h.record(res, now)
+            if res.get("elapsed") is not None:
+                self._busy.append((now, float(res["elapsed"])))
+
+    def utilization(self, now: Optional[float] = None) -> float:
+        now = now or time.time()
+        with self._lock:
+            while self._busy and self._busy[0][0] < now - UTILIZATION_WINDOW_SEC:
+                self._busy.popleft()
+            busy = sum(sec for _t, sec in self._busy)
+        return busy / UTILIZATION_WINDOW_SEC
+
+    def effective_interval(self, cfg: Dict, model: str) -> Tuple[float, str]:
+        """Return (seconds until the next run, state) where state is ok / backoff / paused / stretched."""
+        default_interval = int(cfg.get("default_interval_minutes", 120))
+        per_model = cfg.get("interval_minutes_by_model") or {}
+        base = max(60, int(per_model.get(model, default_interval)) * 60)
+
+        with self._lock:
+            h = self._health.get(model)
+            fails = h.consecutive_failures if h else 0
+
+        threshold = int(adaptive_setting(cfg, "circuit_breaker_failures") or 0)
+        if threshold > 0 and fails >= threshold:
+            pause = float(adaptive_setting(cfg, "circuit_breaker_pause_minutes")) * 60
+            return max(base, pause), "paused"
+
+        interval, state = float(base), "ok"
+        if fails and adaptive_setting(cfg, "adaptive_backoff"):
+            cap = max(base, float(adaptive_setting(cfg, "backoff_max_minutes")) * 60)
+            interval, state = min(cap, base * (2 ** min(fails, 16))), "backoff"
+
+        if adaptive_setting(cfg, "throughput_aware"):
+            target = float(adaptive_setting(cfg, "target_host_utilization") or 0)
+            util = self.utilization()
+            if target > 0 and util > target:
+                interval *= util / target
+                if state == "ok":
+                    state = "stretched"
+        return interval, state
+
+    def snapshot(self, cfg: Optional[Dict] = None) -> Dict:
+        """State for the /llm page: per-model base/effective interval, next run and recent health."""
+        cfg = cfg or load_llm_config()
+        default_interval = int(cfg.get("default_interval_minutes", 120))
+        per_model = cfg.get("interval_minutes_by_model") or {}
+        now = time.time()
+        with self._lock:
+            models = sorted(set(self._next_run) | set(self._health))
+            next_run = dict(self._next_run)
+        rows = []
+        for m in models:
+            interval, state = self.effective_interval(cfg, m)
+            with self._lock:
+                h = self._health.get(m) or ModelHealth()
+                avg = h.avg_latency()
+                rows.append({
+                    "model": m,
+                    "base_minutes": int(per_model.get(m, default_interval)),
+                    "effective_minutes": round(interval / 60.0, 1),
+                    "state": state,
+                    "next_run_in_sec": max(0, int(next_run[m] - now)) if m in next_run else None,
+                    "runs": h.runs,
+                    "failures": h.failures,
+                    "consecutive_failures": h.consecutive_failures,
+                    "avg_latency_sec": round(avg, 1) if avg is not None else None,
+                    "last_error": h.last_error,
+                    "warm": backend_pool.is_warm(cfg, m),
+                    "last_warm_load_sec": round(self._warm_load_sec[m], 1) if m in self._warm_load_sec else None,
+                })
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "utilization": round(self.utilization(now), 3),
+            "hosts": dispatcher.stats(),
+            "models": rows,
+        }
+
+    def _warm(self, cfg: Dict, model: str, lead: float) -> None:
+        # 预热后的模型至少要留到 next_run（之后的正式生成会按配置重设 keep_alive）
+        try:
+            sec = dispatcher.warm_up(cfg, model, keep_alive=f"{int(lead) + 300}s")
+        except Exception:
+            return
+        with self._lock:
+            self._warm_load_sec[model] = sec
+
     def _loop(self):
-        next_run: Dict[str, float] = {}
         # Track last state so that when the user toggles auto mode ON,
         # we can re-schedule quickly (instead of waiting for the previous
         # long interval that might have been computed hours ago).
@@ -197,39 +494,68 @@ class LLMScheduler:
             auto_enabled = bool(cfg.get("auto_enabled", True))
             if not auto_enabled:
                 last_auto_enabled = False
-                time.sleep(2.0)
+                self._stop.wait(2.0)
                 continue
 
             models = _allowed_models(cfg)
             if not models:
-                time.sleep(5.0)
+                self._stop.wait(5.0)
                 continue
 
             # If auto mode was just turned ON, reset schedule so it can take effect
             # within a few seconds (instead of potentially waiting a long time).
-            if last_auto_enabled is False:
-                next_run = {}
-            last_auto_enabled = True
-
-            default_interval = int(cfg.get("default_interval_minutes", 120))
-            per_model = cfg.get("interval_minutes_by_model") or {}
-
+            # Paused (circuit-open) models keep their pause.
             now = time.time()
+            resume_at: Dict[str, float] = {}
             for m in models:
-                # First run after (re)enable: 2~20 seconds by default.
-                next_run.setdefault(m, now + random.uniform(2, 20))
-
-            for m in list(next_run.keys()):
-                if m not in models:
-                    del next_run[m]
-
-            for m in models:
+                interval_sec, state = self.effective_interval(cfg, m)
+                h = self._health.get(m)
+                if state == "paused" and h and h.last_run_at:
+                    resume_at[m] = h.last_run_at + interval_sec
+
+            with self._lock:
+                if last_auto_enabled is False:
+                    self._next_run = {}
+                last_auto_enabled = True
+
+                for m in models:
+                    # First run after (re)enable: 2~20 seconds by default.
+                    self._next_run.setdefault(m, max(resume_at.get(m, 0.0), now + random.uniform(2, 20)))
+
+                for m in list(self._next_run.keys()):
+                    if m not in models:
+                        del self._next_run[m]
+                due = dict(self._next_run)
+
+            lead = float(adaptive_setting(cfg, "warmup_lead_seconds") or 0)
+            if lead > 0:
+                for m in models:
+                    t_run = due.get(m)
+                    if t_run and t_run - lead <= now < t_run and self._warmed_for.get(m) != t_run:
+                        self._warmed_for[m] = t_run
+                        threading.Thread(target=self._warm, args=(cfg, m, lead), daemon=True).start()
+
+            # 已在显存里的模型先跑
+            due_models = [m for m in models if now >= due.get(m, now + 999999)]
+            due_models.sort(key=lambda m: not backend_pool.is_warm(cfg, m))
+            runs_per_wake = max(1, int(adaptive_setting(cfg, "runs_per_wake") or 1))
+
+            for m in due_models:
                 if self._stop.is_set():
                     break
-                if now >= next_run.get(m, now + 999999):
-                    _ = run_once_for_model(m)
-                    interval_min = int(per_model.get(m, default_interval))
-                    interval_sec = max(60, interval_min * 60)
-                    next_run[m] = time.time() + interval_sec + random.uniform(0, 15)
-
-            time.sleep(2.0)
+                if metrics.ENABLED:
+                    metrics.SCHEDULER_LAG_SECONDS.observe(max(0.0, time.time() - due[m]), m)
+                for _ in range(runs_per_wake):
+                    res = run_once_for_model(m)
+                    self._record(m, res)
+                    if not res.get("ok") or self._stop.is_set():
+                        break
+                if res.get("kind") == "deferred":
+                    # 让位给手动评论：稍后重试，不算失败
+                    interval_sec = DEFERRED_RETRY_SEC
+                else:
+                    interval_sec, _state = self.effective_interval(cfg, m)
+                with self._lock:
+                    self._next_run[m] = time.time() + interval_sec + random.uniform(0, 15)
+
+            self._stop.wait(2.0)
@@ -0,0 +1,177 @@
+import bisect
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# =========================
+# 轻量 Prometheus 指标（无第三方依赖）
+# =========================
+#
+# 默认关闭：JOURNAL_METRICS=1 开启。关闭时各埋点只做一次 `if metrics.ENABLED`
+# 判断，不计时、不加锁。
+
+ENABLED = (os.environ.get("JOURNAL_METRICS") or "").strip().lower() in ("1", "true", "yes", "on")
+
+LabelValues = Tuple[str, ...]
+
+# 秒级延迟桶：从 1ms 到 30 分钟（LLM 生成可能很慢）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_num(x: float) -> str:
+    if x == float("inf"):
+        return "+Inf"
+    if float(x).is_integer():
+        return str(int(x))
+    return repr(float(x))
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        key = tuple(str(v) for v in label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, v in items:
+            lines.append(f"{self.name}{_fmt_labels(self.labels, key)} {_fmt_num(v)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # key -> [bucket counts..., +Inf count], sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        key = tuple(str(v) for v in label_values)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = ([0] * (len(self.buckets) + 1), [0.0])
+                self._values[key] = entry
+            entry[0][idx] += 1
+            entry[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, (list(c), s[0])) for k, (c, s) in self._values.items())
+        for key, (counts, total) in items:
+            cum = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cum += c
+                le = 'le="' + _fmt_num(bound) + '"'
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {cum}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {_fmt_num(total)}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {cum}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+        # 采集时回调：返回 (name, doc, type, [(labels_dict, value), ...])
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, fn) -> None:
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        for fn in self._collectors:
+            try:
+                families = list(fn())
+            except Exception:
+                continue
+            for name, doc, typ, samples in families:
+                lines.append(f"# HELP {name} {doc}")
+                lines.append(f"# TYPE {name} {typ}")
+                for labels, value in samples:
+                    names = sorted(labels)
+                    lines.append(f"{name}{_fmt_labels(names, [labels[n] for n in names])} {_fmt_num(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ----- HTTP -----
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "journal_http_request_seconds", "Request latency by route.", ["route", "method", "status"]))
+
+# ----- storage -----
+STORAGE_SECONDS = REGISTRY.register(Histogram(
+    "journal_storage_seconds", "JSON load/save duration by file.", ["file", "op"]))
+STORAGE_BYTES = REGISTRY.register(Counter(
+    "journal_storage_bytes_total", "Bytes read/written by file.", ["file", "op"]))
+LOCK_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "journal_file_lock_wait_seconds", "Time spent waiting to acquire a lockfile.", ["lock"]))
+LOCK_TIMEOUTS = REGISTRY.register(Counter(
+    "journal_file_lock_timeouts_total", "Lock waits that gave up after timeout_sec.", ["lock"]))
+COMMENT_WRITE_BATCH = REGISTRY.register(Histogram(
+    "journal_comment_write_batch_size", "Comment mutations saved per comments.json write.", [],
+    (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)))
+
+# ----- Ollama -----
+OLLAMA_SECONDS = REGISTRY.register(Histogram(
+    "journal_ollama_request_seconds", "Ollama call latency.", ["op", "model", "outcome"]))
+OLLAMA_FAILURES = REGISTRY.register(Counter(
+    "journal_ollama_failures_total", "Ollama timeouts and errors.", ["op", "model", "kind"]))
+OLLAMA_LOAD_SECONDS = REGISTRY.register(Histogram(
+    "journal_ollama_load_seconds", "Model load (cold start) time reported by Ollama, separate from generation.", ["model"]))
+OLLAMA_PROMPT_BYTES = REGISTRY.register(Histogram(
+    "journal_ollama_prompt_bytes", "Prompt size (system + user, UTF-8 bytes).", ["model"], SIZE_BUCKETS))
+OLLAMA_RESPONSE_BYTES = REGISTRY.register(Histogram(
+    "journal_ollama_response_bytes", "Response size (UTF-8 bytes).", ["model"], SIZE_BUCKETS))
+
+# ----- scheduler / dispatcher -----
+SCHEDULER_LAG_SECONDS = REGISTRY.register(Histogram(
+    "journal_scheduler_lag_seconds", "Actual minus planned start of a scheduled run.", ["model"]))
+DISPATCH_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "journal_dispatch_wait_seconds", "Time a generation waited for a free Ollama slot.", ["host", "priority"]))
+
+
+def file_label(path: str) -> str:
+    return os.path.basename(path or "") or "-"
+
+
+def observe_storage(path: str, op: str, seconds: float, nbytes: Optional[int] = None) -> None:
+    name = file_label(path)
+    STORAGE_SECONDS.observe(seconds, name, op)
+    if nbytes is not None:
+        STORAGE_BYTES.inc(name, op, amount=nbytes)
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -1,36 +1,37 @@
-import requests
+import json
 import threading
-import os
-from datetime import datetime
-from typing import Dict, List
+import time
+from typing import Dict, List, Optional, Union
+
+import metrics
+from llm_log import call_log
 
 
 # =========================
 # 基础工具
 # =========================
 
+def _http():
+    # requests（连同 urllib3 / certifi）导入要几十毫秒：第一次真正访问 Ollama 时再导入，缩短冷启动
+    import requests
+    return requests
+
+
+def connection_error() -> type:
+    """requests.ConnectionError, for `except` clauses outside this module."""
+    return _http().ConnectionError
+
+
 def base_url(server: str, port: int) -> str:
     server = (server or "").strip() or "127.0.0.1"
     return f"http://{server}:{int(port)}"
 
 
-def _ensure_data_dir() -> str:
-    """
-    确保 data 目录存在，返回日志文件路径
-    """
-    data_dir = os.path.abspath("data")
-    os.makedirs(data_dir, exist_ok=True)
-    return os.path.join(data_dir, "ollama_timeout.log")
-
-
-def _log_timeout(message: str):
-    """
-    将超时信息追加写入 data/ollama_timeout.log
-    """
-    log_path = _ensure_data_dir()
-    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(log_path, "a", encoding="utf-8") as f:
-        f.write(f"[{ts}] {message}\n")
+# Ollama 最后一帧里值得保留的统计字段（时长单位：纳秒）
+OLLAMA_STATS_FIELDS = (
+    "prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration",
+    "load_duration", "total_duration", "done_reason",
+)
 
 
 # =========================
@@ -42,21 +43,84 @@ def list_models(server: str, port: int, timeout_sec: float = 5.0) -> List[str]:
     Return model names from Ollama /api/tags
     """
     url = base_url(server, port) + "/api/tags"
-    r = requests.get(url, timeout=timeout_sec)
-    r.raise_for_status()
-    data = r.json()
+    t0 = time.perf_counter() if metrics.ENABLED else 0.0
+    try:
+        r = _http().get(url, timeout=timeout_sec)
+        r.raise_for_status()
+        data = r.json()
+    except Exception as e:
+        if t0:
+            metrics.OLLAMA_SECONDS.observe(time.perf_counter() - t0, "list_models", "", "error")
+            metrics.OLLAMA_FAILURES.inc("list_models", "", e.__class__.__name__)
+        raise
+    if t0:
+        metrics.OLLAMA_SECONDS.observe(time.perf_counter() - t0, "list_models", "", "ok")
     return [m.get("name") for m in data.get("models", []) if m.get("name")]
 
 
 def _do_generate(url: str, payload: Dict, timeout, result: Dict):
+    """
+    流式读取 /api/generate：记录首字节时间，拼接 response，保留最后一帧（done=true）的统计字段
+    """
+    t0 = time.perf_counter()
     try:
-        r = requests.post(url, json=payload, timeout=timeout)
-        r.raise_for_status()
-        result["data"] = r.json()
+        with _http().post(url, json=payload, timeout=timeout, stream=True) as r:
+            r.raise_for_status()
+            parts: List[str] = []
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                if "ttfb" not in result:
+                    result["ttfb"] = time.perf_counter() - t0
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(f"Ollama error: {chunk['error']}")
+                parts.append(chunk.get("response") or "")
+                if chunk.get("done"):
+                    result["data"] = chunk
+                    break
+            result["text"] = "".join(parts)
     except Exception as e:
         result["error"] = e
 
 
+def _observe_load(model: str, data: Dict) -> Optional[float]:
+    """
+    Ollama 最后一帧里的 load_duration（纳秒）= 冷启动加载模型的时间，单独计入指标
+    """
+    ns = data.get("load_duration")
+    if ns is None:
+        return None
+    sec = float(ns) / 1e9
+    if metrics.ENABLED:
+        metrics.OLLAMA_LOAD_SECONDS.observe(sec, model)
+    return sec
+
+
+def warm_up(server: str, port: int, model: str, keep_alive: Union[int, str, None] = None, timeout_sec: float = 600.0) -> float:
+    """
+    Load a model without generating (empty prompt). Returns Ollama's load_duration in seconds.
+    """
+    url = base_url(server, port) + "/api/generate"
+    payload: Dict = {"model": model, "prompt": "", "stream": False}
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    t0 = time.perf_counter()
+    try:
+        r = _http().post(url, json=payload, timeout=(5.0, timeout_sec))
+        r.raise_for_status()
+        data = r.json()
+    except Exception as e:
+        if metrics.ENABLED:
+            metrics.OLLAMA_SECONDS.observe(time.perf_counter() - t0, "warm_up", model, "error")
+            metrics.OLLAMA_FAILURES.inc("warm_up", model, e.__class__.__name__)
+        raise
+    if metrics.ENABLED:
+        metrics.OLLAMA_SECONDS.observe(time.perf_counter() - t0, "warm_up", model, "ok")
+    load_sec = _observe_load(model, data)
+    return load_sec if load_sec is not None else time.perf_counter() - t0
+
+
 def generate_comment(
     server: str,
     port: int,
@@ -65,13 +129,21 @@ def generate_comment(
     user_prompt: str,
     timeout_sec: float = 1800.0,  # ✅ 30 分钟硬超时
     temperature: float = 0.7,
+    post_id: str = "",
+    keep_alive: Union[int, str, None] = None,
+    options: Optional[Dict] = None,
+    stats_out: Optional[Dict] = None,
 ) -> str:
     """
-    Generate a single comment using Ollama /api/generate (non-stream)
+    Generate a single comment using Ollama /api/generate (stream)
 
     - 连接超时：5 秒
     - 总耗时硬超时：timeout_sec（默认 30 分钟）
-    - 超时：控制台输出 + 写入 data/ollama_timeout.log
+    - 每次调用写一条记录到 DATA_DIR/llm_calls.log（见 llm_log.py）
+    - 超时：控制台输出
+    - keep_alive：生成后模型在显存中保留多久（如 "10m"，整数为秒，-1 = 一直常驻；None = Ollama 默认 5 分钟）
+    - options：额外的 Ollama options（如 num_predict / num_ctx），与 temperature 合并
+    - stats_out：若传入 dict，成功后写入 Ollama 的统计字段（eval_count / eval_duration 等）
     """
 
     url = base_url(server, port) + "/api/generate"
@@ -80,16 +152,49 @@ def generate_comment(
         "model": model,
         "prompt": user_prompt,
         "system": system or "",
-        "stream": False,
+        "stream": True,
         "options": {
             "temperature": temperature,
         },
     }
+    if options:
+        payload["options"].update({k: v for k, v in options.items() if v is not None})
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
 
     result: Dict = {}
     connect_timeout = 5.0
     read_timeout = timeout_sec
 
+    t0 = time.perf_counter()
+    if metrics.ENABLED:
+        metrics.OLLAMA_PROMPT_BYTES.observe(len((system or "").encode("utf-8")) + len(user_prompt.encode("utf-8")), model)
+
+    entry: Dict = {
+        "model": model,
+        "post_id": post_id or "",
+        "prompt_chars": len(system or "") + len(user_prompt),
+    }
+
+    def finish(outcome: str, error: str = "") -> None:
+        total = time.perf_counter() - t0
+        data = result.get("data") or {}
+        load_sec = _observe_load(model, data)
+        entry.update({
+            "prompt_tokens": data.get("prompt_eval_count"),
+            "eval_count": data.get("eval_count"),
+            "done_reason": data.get("done_reason"),
+            "load_ms": round(load_sec * 1000.0, 1) if load_sec is not None else None,
+            "response_chars": len(result.get("text") or ""),
+            "ttfb_ms": round(result["ttfb"] * 1000.0, 1) if "ttfb" in result else None,
+            "total_ms": round(total * 1000.0, 1),
+            "outcome": outcome,
+            "error": error,
+        })
+        call_log.record(entry)
+        if metrics.ENABLED:
+            metrics.OLLAMA_SECONDS.observe(total, "generate", model, "ok" if outcome in ("ok", "empty") else outcome)
+
     t = threading.Thread(
         target=_do_generate,
         args=(url, payload, (connect_timeout, read_timeout), result),
@@ -110,15 +215,26 @@ def generate_comment(
         # 控制台
         print(msg)
 
-        # 写日志
-        _log_timeout(msg)
+        finish("timeout", msg)
+        if metrics.ENABLED:
+            metrics.OLLAMA_FAILURES.inc("generate", model, "timeout")
 
         raise RuntimeError(
             f"Ollama 模型超时：{model}（超过 {int(timeout_sec)} 秒仍未返回）"
         )
 
     if "error" in result:
-        raise result["error"]
-
-    data = result.get("data") or {}
-    return (data.get("response") or "").strip()
+        err = result["error"]
+        finish("error", f"{err.__class__.__name__}: {err}")
+        if metrics.ENABLED:
+            metrics.OLLAMA_FAILURES.inc("generate", model, err.__class__.__name__)
+        raise err
+
+    text = (result.get("text") or "").strip()
+    finish("ok" if text else "empty")
+    if stats_out is not None:
+        data = result.get("data") or {}
+        stats_out.update({k: data[k] for k in OLLAMA_STATS_FIELDS if data.get(k) is not None})
+    if metrics.ENABLED:
+        metrics.OLLAMA_RESPONSE_BYTES.observe(len(text.encode("utf-8")), model)
+    return text
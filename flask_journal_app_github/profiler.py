@@ -0,0 +1,183 @@
+import cProfile
+import heapq
+import io
+import itertools
+import json
+import os
+import pstats
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+# =========================
+# 可选的请求剖析 + 慢请求日志
+# =========================
+#
+# 开启方式：
+#   - JOURNAL_PROFILE=1：剖析所有请求
+#   - 单次请求：?profile=1（若设置了 JOURNAL_ADMIN_TOKEN，需同时带 token）
+# 结果：保留最慢的 N 个请求（调用栈 + JSON 读取 / 锁等待 / 模板渲染耗时），
+# 超过阈值的请求写入 DATA_DIR/slow_requests.log（JSON Lines）。
+
+ENABLED = (os.environ.get("JOURNAL_PROFILE") or "").strip().lower() in ("1", "true", "yes", "on")
+SLOW_MS = float(os.environ.get("JOURNAL_SLOW_MS") or 500)
+TOP_N = int(os.environ.get("JOURNAL_PROFILE_TOP_N") or 20)
+
+
+def slow_log_path() -> str:
+    # storage 会 import 本模块，这里延迟引用避免循环导入
+    from storage import DATA_DIR
+    return os.environ.get("JOURNAL_SLOW_LOG_PATH", os.path.join(DATA_DIR, "slow_requests.log"))
+
+
+_local = threading.local()
+# cProfile 同一时刻只能有一个在运行（3.12+ 基于 sys.monitoring），其余请求只记分项耗时
+_cprofile_lock = threading.Lock()
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, deterministic: bool):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.totals: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.profile: Optional[cProfile.Profile] = None
+        self._render_t0: Optional[float] = None
+        if deterministic and _cprofile_lock.acquire(blocking=False):
+            self.profile = cProfile.Profile()
+            try:
+                self.profile.enable()
+            except ValueError:
+                # 其它剖析工具（调试器 / coverage）已占用
+                self.profile = None
+                _cprofile_lock.release()
+
+    def note(self, kind: str, seconds: float) -> None:
+        self.totals[kind] = self.totals.get(kind, 0.0) + seconds
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def finish(self, status: int, top_functions: int = 25) -> Dict[str, Any]:
+        stats_text = ""
+        if self.profile is not None:
+            self.profile.disable()
+            _cprofile_lock.release()
+            buf = io.StringIO()
+            ps = pstats.Stats(self.profile, stream=buf)
+            ps.sort_stats("cumulative").print_stats(top_functions)
+            stats_text = buf.getvalue()
+            self.profile = None
+        ms = lambda s: round(s * 1000.0, 2)  # noqa: E731
+        return {
+            "at": self.started_at,
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "duration_ms": ms(time.perf_counter() - self.started),
+            "json_load_ms": ms(self.totals.get("json_load", 0.0)),
+            "json_load_count": self.counts.get("json_load", 0),
+            "json_save_ms": ms(self.totals.get("json_save", 0.0)),
+            "lock_wait_ms": ms(self.totals.get("lock_wait", 0.0)),
+            "render_ms": ms(self.totals.get("render", 0.0)),
+            "stats": stats_text,
+        }
+
+
+# =========================
+# 线程内当前请求
+# =========================
+
+def active() -> bool:
+    return getattr(_local, "current", None) is not None
+
+
+def note(kind: str, seconds: float) -> None:
+    cur = getattr(_local, "current", None)
+    if cur is not None:
+        cur.note(kind, seconds)
+
+
+def start(method: str, path: str, deterministic: bool = True) -> RequestProfile:
+    prof = RequestProfile(method, path, deterministic)
+    _local.current = prof
+    return prof
+
+
+def render_started() -> None:
+    cur = getattr(_local, "current", None)
+    if cur is not None:
+        cur._render_t0 = time.perf_counter()
+
+
+def render_finished() -> None:
+    cur = getattr(_local, "current", None)
+    if cur is not None and cur._render_t0 is not None:
+        cur.note("render", time.perf_counter() - cur._render_t0)
+        cur._render_t0 = None
+
+
+def stop(status: int) -> Optional[Dict[str, Any]]:
+    cur = getattr(_local, "current", None)
+    _local.current = None
+    if cur is None:
+        return None
+    entry = cur.finish(status)
+    _recorder.record(entry)
+    return entry
+
+
+# =========================
+# Top-N + 慢请求日志
+# =========================
+
+class _Recorder:
+    def __init__(self, top_n: int):
+        self.top_n = top_n
+        self._lock = threading.Lock()
+        self._heap: List = []  # (duration_ms, seq, entry)，最小堆
+        self._seq = itertools.count()
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            item = (entry["duration_ms"], next(self._seq), entry)
+            if len(self._heap) < self.top_n:
+                heapq.heappush(self._heap, item)
+            elif item[0] > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+        if entry["duration_ms"] >= SLOW_MS:
+            _write_slow_log(entry)
+
+    def slowest(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [e for _d, _s, e in sorted(self._heap, reverse=True)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._heap = []
+
+
+_recorder = _Recorder(TOP_N)
+
+
+def _write_slow_log(entry: Dict[str, Any]) -> None:
+    rec = dict(entry)
+    # 日志里只保留调用栈摘要的前几行，避免单条过大
+    rec["stats"] = "\n".join((entry.get("stats") or "").splitlines()[:40])
+    path = slow_log_path()
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+
+def slowest() -> List[Dict[str, Any]]:
+    return _recorder.slowest()
+
+
+def clear() -> None:
+    _recorder.clear()
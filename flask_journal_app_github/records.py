@@ -0,0 +1,206 @@
+import sys
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+
+# =========================
+# 紧凑记录：文章头 / 评论
+# =========================
+#
+# json.load 出来的每条记录都是一个 dict（每条自带一张哈希表），10 万条评论时
+# 光这些 dict 就要几十 MB。Record 把固定字段放进 __slots__，不认识的字段放 _extra，
+# 同时保留 dict 的用法（get / [] / in / keys / items / dict(r) / 赋值），
+# 模板和路由里的 p.get(...)、c["read"] = True 都不用改。
+# 重复很多的字符串（模型名、文章 id、分类）用 sys.intern 共享同一个对象。
+#
+# 读取时 storage 用 json.load 的 object_pairs_hook 直接构造记录，不会先建一整份 dict；
+# 写回 JSON 时用 to_dict()（storage._save_json 已处理）。
+#
+# storage 缓存里的记录被所有线程共享，加载后即 freeze()：只读，赋值会抛 TypeError。
+# 要修改时先 r.copy()（可写的新对象），把 list 里那一项换掉再保存；
+# 没提交的修改（事务回滚、保存失败）因此不会被别的请求看到。
+
+_MISSING = object()
+
+
+def _interning(setter: Callable[[Any, Any], None]) -> Callable[[Any, Any], None]:
+    def set_interned(obj: Any, value: Any) -> None:
+        setter(obj, sys.intern(value) if type(value) is str else value)
+    return set_interned
+
+
+class Record(MutableMapping):
+    __slots__ = ("_extra", "_frozen")
+
+    FIELDS: Tuple[str, ...] = ()
+    INTERN: FrozenSet[str] = frozenset()
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        self._extra: Optional[Dict[str, Any]] = None
+        self._frozen = False
+        if data:
+            for k, v in data.items():
+                self[k] = v
+        for k, v in kwargs.items():
+            self[k] = v
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[str, Any]]) -> "Record":
+        """Fast path for freshly parsed JSON (skips __init__ / __setitem__ dispatch)."""
+        obj = cls.__new__(cls)
+        extra = None
+        setters = cls._setters()
+        for k, v in pairs:
+            setter = setters.get(k)
+            if setter is not None:
+                setter(obj, v)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[k] = v
+        obj._extra = extra
+        obj._frozen = False
+        return obj
+
+    @classmethod
+    def _setters(cls) -> Dict[str, Callable[[Any, Any], None]]:
+        # 每个字段一个 slot 描述符的 __set__；需要 intern 的字段先包一层
+        cached = cls.__dict__.get("_SETTERS")
+        if cached is None:
+            cached = {}
+            for name in cls.FIELDS:
+                raw = getattr(cls, name).__set__
+                cached[name] = _interning(raw) if name in cls.INTERN else raw
+            cls._SETTERS = cached
+        return cached
+
+    def _check_writable(self) -> None:
+        if self._frozen:
+            raise TypeError(f"{self.__class__.__name__} {self.get('id')!r} is shared and read-only; edit a copy()")
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._check_writable()
+        if key in self.FIELDS:
+            if key in self.INTERN and type(value) is str:
+                value = sys.intern(value)
+            object.__setattr__(self, key, value)
+            return
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.FIELDS:
+            try:
+                return object.__getattribute__(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __delitem__(self, key: str) -> None:
+        self._check_writable()
+        if key in self.FIELDS:
+            try:
+                object.__delattr__(self, key)
+                return
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            del self._extra[key]
+            return
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for k in self.FIELDS:
+            if hasattr(self, k):
+                yield k
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, key: object) -> bool:
+        if key in self.FIELDS:
+            return hasattr(self, key)  # type: ignore[arg-type]
+        return self._extra is not None and key in self._extra
+
+    def get(self, key: str, default: Any = None) -> Any:
+        # 热路径：比 MutableMapping.get（try/except KeyError）快
+        if key in self.FIELDS:
+            return getattr(self, key, default)
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = {}
+        for k in self.FIELDS:
+            v = getattr(self, k, _MISSING)
+            if v is not _MISSING:
+                out[k] = v
+        if self._extra:
+            out.update(self._extra)
+        return out
+
+    def copy(self) -> "Record":
+        """Writable copy (same type)."""
+        return type(self)(self.to_dict())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (Record, dict)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.to_dict()!r})"
+
+
+class Post(Record):
+    """Post header as stored in posts.json (`content` only on legacy / not-yet-saved records)."""
+
+    __slots__ = ("id", "title", "category", "published_at", "content_hash", "excerpt", "content")
+    FIELDS = __slots__
+    INTERN = frozenset({"id", "category"})
+
+
+class Comment(Record):
+    __slots__ = (
+        "id", "post_id", "post_edit_seq", "model", "content", "created_at", "read",
+        "eval_count", "eval_duration", "prompt_eval_count", "done_reason",
+    )
+    FIELDS = __slots__
+    INTERN = frozenset({"post_id", "model", "done_reason"})
+
+
+def freeze(records: Iterable[Any]) -> None:
+    """Make records read-only before they are shared (plain dicts are left alone)."""
+    for r in records:
+        if isinstance(r, Record):
+            r._frozen = True
+
+
+def pairs_hook(record_type: type) -> Callable[[List[Tuple[str, Any]]], Any]:
+    """json.load object_pairs_hook: objects whose first key is `id` become `record_type`.
+
+    Our own files always write `id` first; anything else (the top-level wrapper, hand-edited
+    records with another key order) stays a plain dict.
+    """
+    from_pairs = record_type.from_pairs
+
+    def hook(pairs: List[Tuple[str, Any]]) -> Any:
+        if pairs and pairs[0][0] == "id":
+            return from_pairs(pairs)
+        return dict(pairs)
+    return hook
+
+
+def json_default(obj: Any) -> Any:
+    """`default=` hook for json.dump: Record -> dict."""
+    if isinstance(obj, Record):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
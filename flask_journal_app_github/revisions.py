@@ -0,0 +1,134 @@
+import difflib
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from storage import DATA_DIR, _load_json, _remove_file, _save_json, content_hash
+
+
+# =========================
+# 文章历史版本（按 edit_seq）
+# =========================
+#
+# 每篇文章一个 REVISIONS_DIR/<post_id>.json：
+#   {"post_id": ..., "revs": [
+#       {"seq": 0, "at": ..., "hash": ..., "full": "第一版全文"},              # 关键帧
+#       {"seq": 1, "at": ..., "hash": ..., "delta": [["=", 0, 12], ["+", "新的几行\n"], ...]},
+#   ]}
+# delta 是相对上一条记录的按行差异："=" 从上一版复制第 i 行起的 n 行，"+" 插入文本，没复制的行即被删除。
+# 每 KEYFRAME_EVERY 版（或 delta 不比全文小多少时）存一次全文，还原任一版最多回放 KEYFRAME_EVERY-1 个 delta。
+#
+# 写入走 storage._save_json，在编辑文章的事务里和 posts / post_meta 一起提交；调用方持有 LOCK_POSTS。
+
+REVISIONS_DIR = os.environ.get("JOURNAL_REVISIONS_DIR", os.path.join(DATA_DIR, "revisions"))
+KEYFRAME_EVERY = max(1, int(os.environ.get("JOURNAL_REVISION_KEYFRAME") or 10))
+
+_SAFE_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def history_path(post_id: str) -> str:
+    if not _SAFE_ID.match(post_id or ""):
+        raise ValueError(f"bad post id: {post_id!r}")
+    return os.path.join(REVISIONS_DIR, post_id + ".json")
+
+
+def load_history(post_id: str) -> Dict[str, Any]:
+    try:
+        path = history_path(post_id)
+    except ValueError:
+        return {"post_id": post_id, "revs": []}
+    data = _load_json(path, {"post_id": post_id, "revs": []})
+    data.setdefault("revs", [])
+    return data
+
+
+def make_delta(old: str, new: str) -> List[List[Any]]:
+    a = old.splitlines(keepends=True)
+    b = new.splitlines(keepends=True)
+    ops: List[List[Any]] = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append(["=", i1, i2 - i1])
+        elif j2 > j1:  # replace / insert；delete 不需要记录
+            ops.append(["+", "".join(b[j1:j2])])
+    return ops
+
+
+def apply_delta(old: str, ops: List[List[Any]]) -> str:
+    a = old.splitlines(keepends=True)
+    out: List[str] = []
+    for op in ops:
+        if op[0] == "=":
+            out.extend(a[op[1]:op[1] + op[2]])
+        else:
+            out.append(op[1])
+    return "".join(out)
+
+
+def _content_at(revs: List[Dict[str, Any]], index: int) -> str:
+    start = index
+    while "full" not in revs[start]:
+        start -= 1
+    text = revs[start]["full"]
+    for rev in revs[start + 1:index + 1]:
+        text = apply_delta(text, rev["delta"])
+    return text
+
+
+def _entry(revs: List[Dict[str, Any]], seq: int, content: str, at: str) -> Dict[str, Any]:
+    entry: Dict[str, Any] = {"seq": seq, "at": at, "hash": content_hash(content)}
+    if not revs:
+        entry["full"] = content
+        return entry
+    since_key = next(i for i in range(len(revs) - 1, -1, -1) if "full" in revs[i])
+    if len(revs) - since_key >= KEYFRAME_EVERY:
+        entry["full"] = content
+        return entry
+    delta = make_delta(_content_at(revs, len(revs) - 1), content)
+    # 改动很大时 delta 不比全文省多少，直接存关键帧
+    if len(json.dumps(delta, ensure_ascii=False)) * 2 > len(content):
+        entry["full"] = content
+    else:
+        entry["delta"] = delta
+    return entry
+
+
+def record_revision(post_id: str, seq: int, content: str, at: str, previous: Optional[str] = None,
+                    previous_at: str = "") -> None:
+    """Append revision `seq`. `previous` seeds seq-1 for posts that predate revision history."""
+    hist = load_history(post_id)
+    revs = hist["revs"]
+    # 同一个 seq 重复写（例如事务重试）时以最后一次为准
+    while revs and int(revs[-1]["seq"]) >= seq:
+        revs.pop()
+    if not revs and previous is not None and seq > 0:
+        revs.append(_entry(revs, seq - 1, previous, previous_at))
+    revs.append(_entry(revs, seq, content, at))
+    _save_json(history_path(post_id), hist)
+
+
+def list_revisions(post_id: str) -> List[Dict[str, Any]]:
+    return [
+        {"seq": int(r["seq"]), "at": r.get("at", ""), "keyframe": "full" in r}
+        for r in load_history(post_id)["revs"]
+    ]
+
+
+def get_revision(post_id: str, seq: int) -> Optional[Dict[str, Any]]:
+    """{"seq", "at", "content"} of revision `seq`, or None if it was never recorded."""
+    revs = load_history(post_id)["revs"]
+    index = next((i for i, r in enumerate(revs) if int(r["seq"]) == seq), None)
+    if index is None:
+        return None
+    content = _content_at(revs, index)
+    if content_hash(content) != revs[index].get("hash"):
+        raise ValueError(f"revision {post_id}#{seq} does not match its hash")
+    return {"seq": seq, "at": revs[index].get("at", ""), "content": content}
+
+
+def delete_history(post_id: str) -> None:
+    try:
+        _remove_file(history_path(post_id))
+    except ValueError:
+        pass
@@ -0,0 +1,155 @@
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+import _thread
+from typing import List, Optional
+
+# =========================
+# 生产模式启动（python serve.py）
+# =========================
+#
+# app.py 末尾的 app.run(debug=True) 只适合开发：单线程 reloader、没有连接上限、Ctrl+C 直接退出。
+# 这里用真正的 WSGI 服务器：
+#   waitress（默认，纯 Python，Windows / macOS / Linux 和 PyInstaller 打包都能用）：单进程多线程
+#   gunicorn（仅 POSIX）：多进程 gthread worker，配置见 gunicorn.conf.py
+# 自动评论调度只在拿到 scheduler.lock 的那个进程里跑（见 llm_scheduler.SchedulerLease）。
+#
+# 退出（Ctrl+C / SIGTERM）时先停止接新连接和新的定时生成，等正在进行的生成写完评论
+# （最多 JOURNAL_DRAIN_SEC 秒），再关闭服务器。
+
+HOST = os.environ.get("JOURNAL_HOST", "0.0.0.0")
+PORT = int(os.environ.get("PORT", 5006))
+THREADS = int(os.environ.get("JOURNAL_THREADS") or 16)
+WORKERS = int(os.environ.get("JOURNAL_WORKERS") or 1)
+DRAIN_SEC = float(os.environ.get("JOURNAL_DRAIN_SEC") or 60)
+# keep-alive 连接空闲多久后断开；SSE 每 5 秒有心跳，不受影响
+KEEPALIVE_SEC = int(os.environ.get("JOURNAL_KEEPALIVE_SEC") or 75)
+CONNECTION_LIMIT = int(os.environ.get("JOURNAL_CONNECTION_LIMIT") or 200)
+
+
+def sse_stream_limit(threads: int) -> int:
+    """How many /events streams one process may hold: each one keeps a request thread busy."""
+    if os.environ.get("JOURNAL_SSE_MAX_STREAMS"):
+        return int(os.environ["JOURNAL_SSE_MAX_STREAMS"])
+    # 至少留 3/4 的线程给普通请求；其余标签页改为轮询
+    return max(1, threads // 4) if threads > 1 else 0
+
+
+def drain(timeout: float = DRAIN_SEC) -> bool:
+    """Stop background work and wait for in-flight generations to finish. True if everything drained."""
+    from app import scheduler
+    from comment_writer import comment_writer
+    from dispatcher import dispatcher
+    from llm_log import call_log
+    from llm_scheduler import scheduler_lease
+    from snapshots import snapshot_scheduler
+
+    deadline = time.monotonic() + timeout
+    scheduler.stop()
+    snapshot_scheduler.stop()
+    # 调度线程会在当前这条生成（含写评论）结束后退出
+    done = scheduler.join(max(0.0, deadline - time.monotonic()))
+    # 手动“立即评论”的请求线程
+    done = dispatcher.wait_idle(max(0.0, deadline - time.monotonic())) and done
+    comment_writer.close()
+    call_log.close()
+    scheduler_lease.release()
+    return done
+
+
+def serve_waitress(host: str, port: int, threads: int) -> None:
+    from waitress import create_server
+    from waitress.server import BaseWSGIServer
+
+    from app import SCHEDULER_RETRY_SEC, app, start_background_tasks
+    from i18n import precompile_templates
+
+    server = create_server(
+        app,
+        host=host,
+        port=port,
+        threads=threads,
+        connection_limit=CONNECTION_LIMIT,
+        channel_timeout=KEEPALIVE_SEC,
+        ident="JournalApp",
+    )
+    app.config["SSE_MAX_STREAMS"] = sse_stream_limit(threads)
+    if start_background_tasks():
+        app._scheduler_started = True
+    else:
+        # 别的实例持有 scheduler.lock：和 before_request 一样，之后每 SCHEDULER_RETRY_SEC 秒再试，它退出后接替
+        app._scheduler_retry_at = time.monotonic() + SCHEDULER_RETRY_SEC
+    # 模板在后台预编译（并写入字节码缓存），第一次打开各页面时不用再等编译
+    threading.Thread(target=precompile_templates, args=(app,), name="precompile", daemon=True).start()
+
+    stopping = threading.Event()
+
+    def shutdown() -> None:
+        # 不再接受新连接（已有连接继续处理），等生成结束后让 server.run() 退出
+        socket_map = getattr(server, "map", None) or server._map
+        for d in list(socket_map.values()):
+            if isinstance(d, BaseWSGIServer):
+                d.accepting = False
+        ok = drain(DRAIN_SEC)
+        print("drained" if ok else f"drain timed out after {DRAIN_SEC:.0f}s", file=sys.stderr)
+        _thread.interrupt_main()
+
+    def on_signal(signum, _frame) -> None:
+        if stopping.is_set():
+            raise KeyboardInterrupt  # 第二次 Ctrl+C：立即退出
+        stopping.set()
+        print(f"shutting down (waiting up to {DRAIN_SEC:.0f}s for running generations)...", file=sys.stderr)
+        threading.Thread(target=shutdown, name="drain", daemon=True).start()
+
+    signal.signal(signal.SIGINT, on_signal)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, on_signal)
+
+    print(f"Serving on http://{host}:{port} (waitress, {threads} threads)", file=sys.stderr)
+    server.run()
+
+
+def serve_gunicorn(host: str, port: int, workers: int, threads: int) -> None:
+    from gunicorn.app.wsgiapp import run
+
+    os.environ.update({
+        "JOURNAL_HOST": host,
+        "PORT": str(port),
+        "JOURNAL_WORKERS": str(workers),
+        "JOURNAL_THREADS": str(threads),
+    })
+    conf = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py")
+    sys.argv = ["gunicorn", "-c", conf, "app:app"]
+    run()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(prog="python serve.py", description="Run the journal with a production WSGI server")
+    ap.add_argument("--server", choices=("auto", "waitress", "gunicorn"), default=os.environ.get("JOURNAL_SERVER", "auto"))
+    ap.add_argument("--host", default=HOST)
+    ap.add_argument("--port", type=int, default=PORT)
+    ap.add_argument("--workers", type=int, default=WORKERS, help="processes (gunicorn only)")
+    ap.add_argument("--threads", type=int, default=THREADS, help="request threads per process")
+    args = ap.parse_args(argv)
+
+    server = args.server
+    if server == "auto":
+        # 多进程只有 gunicorn 支持；单进程用 waitress
+        server = "gunicorn" if args.workers > 1 and os.name != "nt" else "waitress"
+    try:
+        __import__(server)
+    except ImportError:
+        sys.exit(f"{server} is not installed: pip install {server}")
+    if server == "gunicorn":
+        serve_gunicorn(args.host, args.port, max(1, args.workers), max(1, args.threads))
+    else:
+        if args.workers > 1:
+            print("waitress runs a single process; use --threads to scale (--workers ignored)", file=sys.stderr)
+        serve_waitress(args.host, args.port, max(1, args.threads))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,477 @@
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import zlib
+from contextlib import ExitStack
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from storage import (
+    DATA_DIR,
+    CATEGORIES_PATH,
+    POSTS_PATH,
+    LLM_CONFIG_PATH,
+    COMMENTS_PATH,
+    POST_META_PATH,
+    BLOBS_DIR,
+    POST_SHARDS_DIR,
+    COMMENT_SHARDS_DIR,
+    TXN_DIR,
+    LOCK_CATEGORIES,
+    LOCK_POSTS,
+    LOCK_LLM_CONFIG,
+    LOCK_COMMENTS,
+    LOCK_POST_META,
+    file_lock,
+)
+from revisions import REVISIONS_DIR
+
+try:  # zstd 是可选依赖：pip install zstandard
+    import zstandard  # type: ignore
+except Exception:  # pragma: no cover - depends on environment
+    zstandard = None
+
+
+# =========================
+# 增量快照（按内容分块 + 去重）
+# =========================
+#
+# SNAPSHOTS_DIR/
+#   chunks/ab/<sha256>.gz|.zst   压缩后的数据块，同样内容只存一份
+#   manifests/<id>.json          每个快照一份：文件 -> 大小 / mtime / sha256 / 块列表
+#
+# 分块按行做内容定义切分（JSON 都是 indent=2 的多行文本）：某行的 crc32 低位为 0 且块已够
+# CHUNK_MIN 就在这里切。插入一条评论只影响它附近的一两个块，其余块的哈希不变。
+# 和上一个快照相比大小 / mtime 都没变的文件直接沿用上次的块列表，不读文件。
+#
+# 受存储锁保护的文件（JSON 数据、分片、历史版本、blob）在同一次持有全部存储锁期间列出、stat，
+# 和事务提交互斥，拿到的是某一次提交之后的完整状态（不会有文章指向还没快照的 blob，也不会有孤儿评论）。
+# 锁内不读内容：变化过的文章头 / 评论 / meta 硬链接（不支持时复制）到 staging/，它们都是整文件替换写入，
+# 链接住的就是当时的版本；blob 按内容寻址、写入后不再改，锁内只硬链接上次快照之后新增的，防止随后被清理。
+# 读文件、分块、压缩都在锁外逐个文件流式进行，内存占用和数据量无关。
+# 写入顺序：先块、后 manifest，中途崩溃只会留下没被引用的块（prune 时清理）。
+
+SNAPSHOTS_DIR = os.environ.get("JOURNAL_SNAPSHOTS_DIR", os.path.join(DATA_DIR, "snapshots"))
+SNAPSHOT_INTERVAL_MIN = float(os.environ.get("JOURNAL_SNAPSHOT_MINUTES") or 60)  # 0 = 不自动做快照
+SNAPSHOT_KEEP = int(os.environ.get("JOURNAL_SNAPSHOT_KEEP") or 48)
+SNAPSHOT_CODEC = (os.environ.get("JOURNAL_SNAPSHOT_CODEC") or ("zstd" if zstandard else "gzip")).lower()
+
+CHUNK_MIN = 16 * 1024
+CHUNK_MAX = 256 * 1024
+BOUNDARY_MASK = 0x3F  # 平均每 64 行一个候选切点
+
+CHUNKS_DIR = os.path.join(SNAPSHOTS_DIR, "chunks")
+MANIFESTS_DIR = os.path.join(SNAPSHOTS_DIR, "manifests")
+STAGING_DIR = os.path.join(SNAPSHOTS_DIR, "staging")
+READ_SIZE = 1024 * 1024
+LOCK_SNAPSHOTS = os.path.join(SNAPSHOTS_DIR, "snapshots.lock")
+
+_CODEC_EXT = {"gzip": ".gz", "zstd": ".zst"}
+_SKIP_SUFFIXES = (".lock", ".tmp", ".txn", ".migrated")
+
+
+# ---------- 分块 / 压缩 ----------
+def iter_chunks(f: BinaryIO, read_size: int = READ_SIZE) -> Iterator[bytes]:
+    """Content-defined chunks cut at line ends (hard cut at CHUNK_MAX for very long lines).
+
+    Reads `f` incrementally; at most about CHUNK_MAX + read_size bytes are buffered.
+    """
+    buf = b""
+    start = pos = 0
+    eof = False
+    while True:
+        # 缓冲区比当前块的上限多一个字节（或已到文件尾），切点就和整文件读入时完全一样
+        while not eof and len(buf) <= start + CHUNK_MAX:
+            more = f.read(read_size)
+            if more:
+                buf += more
+            else:
+                eof = True
+        n = len(buf)
+        if pos >= n:
+            return
+        limit = min(n, start + CHUNK_MAX)
+        nl = buf.find(b"\n", pos, limit)
+        end = limit if nl < 0 else nl + 1
+        if end == limit or (end - start >= CHUNK_MIN and not zlib.crc32(buf[pos:end]) & BOUNDARY_MASK):
+            yield buf[start:end]
+            start = end
+        pos = end
+        if start >= read_size:
+            buf = buf[start:]
+            pos -= start
+            start = 0
+
+
+def split_chunks(data: bytes) -> List[bytes]:
+    return list(iter_chunks(io.BytesIO(data)))
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=6).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(data: bytes, ext: str) -> bytes:
+    if ext == ".zst":
+        if zstandard is None:
+            raise RuntimeError("快照块是 zstd 压缩的，请先 pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _chunk_base(digest: str) -> str:
+    return os.path.join(CHUNKS_DIR, digest[:2], digest)
+
+
+def _find_chunk(digest: str) -> Optional[str]:
+    base = _chunk_base(digest)
+    for ext in _CODEC_EXT.values():
+        if os.path.exists(base + ext):
+            return base + ext
+    return None
+
+
+def _store_chunk(data: bytes, codec: str) -> Tuple[str, int]:
+    """Returns (digest, bytes written: 0 when the chunk already existed)."""
+    digest = hashlib.sha256(data).hexdigest()
+    if _find_chunk(digest):
+        return digest, 0
+    path = _chunk_base(digest) + _CODEC_EXT.get(codec, ".gz")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    blob = _compress(data, codec)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(blob)
+    os.replace(tmp, path)
+    return digest, len(blob)
+
+
+def read_chunk(digest: str) -> bytes:
+    path = _find_chunk(digest)
+    if not path:
+        raise FileNotFoundError(f"快照块丢失：{digest}")
+    with open(path, "rb") as f:
+        return _decompress(f.read(), os.path.splitext(path)[1])
+
+
+# ---------- 快照 ----------
+def _lock_for(full: str) -> Optional[str]:
+    """The storage lock guarding a data file, if any."""
+    locks = {
+        os.path.abspath(CATEGORIES_PATH): LOCK_CATEGORIES,
+        os.path.abspath(POSTS_PATH): LOCK_POSTS,
+        os.path.abspath(LLM_CONFIG_PATH): LOCK_LLM_CONFIG,
+        os.path.abspath(COMMENTS_PATH): LOCK_COMMENTS,
+        os.path.abspath(POST_META_PATH): LOCK_POST_META,
+    }
+    if full in locks:
+        return locks[full]
+    parent = os.path.dirname(full)
+    if parent == os.path.abspath(POST_SHARDS_DIR):
+        return LOCK_POSTS
+    if parent == os.path.abspath(COMMENT_SHARDS_DIR):
+        return LOCK_COMMENTS
+    # 历史版本在编辑文章的事务里写；blob 在保存文章前写、提交后删，都在 LOCK_POSTS 之内
+    if parent == os.path.abspath(REVISIONS_DIR) or _under(full, BLOBS_DIR):
+        return LOCK_POSTS
+    return None
+
+
+def _under(full: str, directory: str) -> bool:
+    return full.startswith(os.path.abspath(directory) + os.sep)
+
+
+def _data_files(base: str) -> List[str]:
+    skip_dirs = {os.path.abspath(SNAPSHOTS_DIR), os.path.abspath(TXN_DIR)}
+    out = []
+    for root, dirs, files in os.walk(base):
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) not in skip_dirs]
+        for fn in files:
+            if not fn.endswith(_SKIP_SUFFIXES):
+                out.append(os.path.join(root, fn))
+    return sorted(out)
+
+
+def _unchanged(st: os.stat_result, old: Optional[Dict[str, Any]]) -> bool:
+    """True when `old` (the previous snapshot's entry) still matches and all its chunks exist."""
+    return bool(old) and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns and \
+        all(_find_chunk(d) for d in old["chunks"])
+
+
+def _stage(full: str, n: int, copy: bool) -> Optional[str]:
+    """Hardlink `full` into STAGING_DIR (copy when links are unsupported and `copy` is set)."""
+    staged = os.path.join(STAGING_DIR, str(n))
+    try:
+        os.link(full, staged)
+    except OSError:
+        if not copy:
+            return None
+        shutil.copy2(full, staged)
+    return staged
+
+
+def _store_file(path: str, codec: str) -> Tuple[Dict[str, Any], int]:
+    """Chunk and store one file as it is read. Returns (manifest entry without mtime, new bytes)."""
+    sha = hashlib.sha256()
+    size = written = 0
+    chunks = []
+    with open(path, "rb") as f:
+        for piece in iter_chunks(f):
+            digest, new = _store_chunk(piece, codec)
+            chunks.append(digest)
+            sha.update(piece)
+            size += len(piece)
+            written += new
+    return {"size": size, "sha256": sha.hexdigest(), "chunks": chunks}, written
+
+
+def list_snapshots() -> List[Dict[str, Any]]:
+    """Snapshot summaries, newest first."""
+    if not os.path.isdir(MANIFESTS_DIR):
+        return []
+    out = []
+    for fn in sorted(os.listdir(MANIFESTS_DIR), reverse=True):
+        if not fn.endswith(".json"):
+            continue
+        try:
+            m = load_manifest(fn[:-5])
+        except (OSError, ValueError):
+            continue
+        out.append({k: m.get(k) for k in ("id", "created_at", "files_total", "bytes_total", "bytes_new", "seconds")})
+    return out
+
+
+def load_manifest(snapshot_id: str) -> Dict[str, Any]:
+    with open(os.path.join(MANIFESTS_DIR, snapshot_id + ".json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def create_snapshot(base: str = DATA_DIR, codec: str = SNAPSHOT_CODEC) -> Dict[str, Any]:
+    """Capture `base` into the chunk store. Only files changed since the last snapshot are read."""
+    t0 = time.time()
+    with file_lock(LOCK_SNAPSHOTS, timeout_sec=600):
+        previous = list_snapshots()
+        prev_files: Dict[str, Any] = load_manifest(previous[0]["id"])["files"] if previous else {}
+        # rel -> (stat, 锁外要读的路径；None = 沿用上次的块列表)
+        plan: Dict[str, Tuple[os.stat_result, Optional[str]]] = {}
+        shutil.rmtree(STAGING_DIR, ignore_errors=True)
+        os.makedirs(STAGING_DIR, exist_ok=True)
+        try:
+            with ExitStack() as stack:
+                for lock_path in sorted({LOCK_CATEGORIES, LOCK_POSTS, LOCK_LLM_CONFIG, LOCK_COMMENTS, LOCK_POST_META}):
+                    stack.enter_context(file_lock(lock_path))
+                # 列目录也要在锁内：否则锁外列出之后新写的 blob 会漏掉
+                rel_of = {full: os.path.relpath(full, base).replace("\\", "/") for full in _data_files(base)}
+                for full, rel in rel_of.items():
+                    if not _lock_for(os.path.abspath(full)):
+                        continue
+                    try:
+                        st = os.stat(full)
+                        if _unchanged(st, prev_files.get(rel)):
+                            plan[rel] = (st, None)
+                            continue
+                        is_blob = _under(os.path.abspath(full), BLOBS_DIR)
+                        # blob 不能硬链接时锁外直接读原文件（内容不会变）
+                        plan[rel] = (st, _stage(full, len(plan), copy=not is_blob) or full)
+                    except OSError:
+                        continue
+            # 日志等其它文件不参与事务，锁外逐个处理即可
+            for full, rel in rel_of.items():
+                if rel not in plan:
+                    try:
+                        st = os.stat(full)
+                    except OSError:
+                        continue
+                    plan[rel] = (st, None if _unchanged(st, prev_files.get(rel)) else full)
+
+            files: Dict[str, Any] = {}
+            bytes_total = bytes_new = 0
+            for rel in sorted(plan):
+                st, path = plan[rel]
+                if path is None:
+                    files[rel] = prev_files[rel]
+                    bytes_total += st.st_size
+                    continue
+                try:
+                    entry, written = _store_file(path, codec)
+                except FileNotFoundError:
+                    continue
+                entry["mtime_ns"] = st.st_mtime_ns
+                files[rel] = entry
+                bytes_total += entry["size"]
+                bytes_new += written
+        finally:
+            shutil.rmtree(STAGING_DIR, ignore_errors=True)
+
+        snapshot_id = time.strftime("%Y%m%d-%H%M%S", time.localtime(t0))
+        if previous and previous[0]["id"] >= snapshot_id:
+            snapshot_id = f"{snapshot_id}-{len(previous)}"
+        manifest = {
+            "version": 1,
+            "id": snapshot_id,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(t0)),
+            "codec": codec,
+            "files_total": len(files),
+            "bytes_total": bytes_total,
+            "bytes_new": bytes_new,
+            "seconds": round(time.time() - t0, 3),
+            "files": files,
+        }
+        os.makedirs(MANIFESTS_DIR, exist_ok=True)
+        path = os.path.join(MANIFESTS_DIR, snapshot_id + ".json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+    return manifest
+
+
+def prune_snapshots(keep: int = SNAPSHOT_KEEP) -> Dict[str, int]:
+    """Keep the newest `keep` snapshots and delete chunks no remaining snapshot refers to."""
+    with file_lock(LOCK_SNAPSHOTS, timeout_sec=600):
+        snaps = list_snapshots()
+        removed = 0
+        for s in snaps[max(0, keep):]:
+            try:
+                os.remove(os.path.join(MANIFESTS_DIR, s["id"] + ".json"))
+                removed += 1
+            except OSError:
+                pass
+        referenced = set()
+        for s in snaps[:max(0, keep)]:
+            for entry in load_manifest(s["id"])["files"].values():
+                referenced.update(entry["chunks"])
+        chunks_removed = 0
+        if os.path.isdir(CHUNKS_DIR):
+            for root, _dirs, files in os.walk(CHUNKS_DIR):
+                for fn in files:
+                    digest = fn.split(".", 1)[0]
+                    if digest not in referenced:
+                        try:
+                            os.remove(os.path.join(root, fn))
+                            chunks_removed += 1
+                        except OSError:
+                            pass
+    return {"snapshots_removed": removed, "chunks_removed": chunks_removed}
+
+
+def restore_snapshot(snapshot_id: str, target: str, force: bool = False) -> int:
+    """Write every file of a snapshot under `target`. Returns the number of files restored.
+
+    Refuses a non-empty target unless force=True (stop the app before restoring into DATA_DIR).
+    """
+    manifest = load_manifest(snapshot_id)
+    if os.path.isdir(target) and os.listdir(target) and not force:
+        raise RuntimeError(f"目标目录不为空：{target}（确认覆盖请加 --force）")
+    restored = 0
+    for rel, entry in sorted(manifest["files"].items()):
+        data = b"".join(read_chunk(d) for d in entry["chunks"])
+        if hashlib.sha256(data).hexdigest() != entry["sha256"]:
+            raise RuntimeError(f"校验失败：{rel}")
+        full = os.path.join(target, *rel.split("/"))
+        os.makedirs(os.path.dirname(full) or ".", exist_ok=True)
+        with open(full + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(full + ".tmp", full)
+        restored += 1
+    return restored
+
+
+# ---------- 后台定时 ----------
+class SnapshotScheduler:
+    def __init__(self, interval_min: float = SNAPSHOT_INTERVAL_MIN, keep: int = SNAPSHOT_KEEP):
+        self.interval_min = interval_min
+        self.keep = keep
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last: Optional[Dict[str, Any]] = None
+        self.last_error = ""
+
+    def start(self) -> None:
+        if self.interval_min <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._loop, name="snapshots", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        # 启动后先等一会儿，不和首个请求抢 IO
+        if self._stop.wait(60):
+            return
+        while not self._stop.is_set():
+            snaps = list_snapshots()
+            due = True
+            if snaps:
+                try:
+                    last = time.mktime(time.strptime(snaps[0]["id"][:15], "%Y%m%d-%H%M%S"))
+                    due = time.time() - last >= self.interval_min * 60
+                except ValueError:
+                    pass
+            if due:
+                try:
+                    m = create_snapshot()
+                    self.last = {k: m[k] for k in ("id", "created_at", "bytes_total", "bytes_new", "seconds")}
+                    prune_snapshots(self.keep)
+                    self.last_error = ""
+                except Exception as e:
+                    self.last_error = f"{e.__class__.__name__}: {e}"
+            self._stop.wait(min(300.0, self.interval_min * 60))
+
+
+snapshot_scheduler = SnapshotScheduler()
+
+
+# ---------- CLI ----------
+def _human(n: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024.0
+    return str(n)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python snapshots.py", description="Incremental snapshots of DATA_DIR")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("create", help="take a snapshot now")
+    sub.add_parser("list", help="list snapshots")
+    pr = sub.add_parser("prune", help="drop old snapshots and unreferenced chunks")
+    pr.add_argument("--keep", type=int, default=SNAPSHOT_KEEP)
+    rs = sub.add_parser("restore", help="restore a snapshot into a directory")
+    rs.add_argument("snapshot_id")
+    rs.add_argument("--to", default="", help="target directory (default: restore-<id> next to DATA_DIR)")
+    rs.add_argument("--force", action="store_true", help="allow a non-empty target, e.g. DATA_DIR (stop the app first)")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "create":
+        m = create_snapshot()
+        print(f"{m['id']}: {m['files_total']} files, {_human(m['bytes_total'])}, "
+              f"new chunks {_human(m['bytes_new'])}, {m['seconds']}s")
+    elif args.cmd == "list":
+        for s in list_snapshots():
+            print(f"{s['id']}  {s['created_at']}  files={s['files_total']}  "
+                  f"size={_human(s['bytes_total'] or 0)}  new={_human(s['bytes_new'] or 0)}")
+    elif args.cmd == "prune":
+        print(prune_snapshots(args.keep))
+    elif args.cmd == "restore":
+        target = args.to or os.path.join(os.path.dirname(os.path.abspath(DATA_DIR)), f"restore-{args.snapshot_id}")
+        try:
+            n = restore_snapshot(args.snapshot_id, target, force=args.force)
+        except (OSError, RuntimeError) as e:
+            print(f"restore failed: {e}", file=sys.stderr)
+            return 1
+        print(f"restored {n} files to {target}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
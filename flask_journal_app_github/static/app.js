@@ -174,3 +174,72 @@ document.addEventListener('click', (ev) => {
   ev.preventDefault();
   runLlmComment(form);
 });
+
+// ===== Live new-comment push (SSE) =====
+(function() {
+  const url = document.body && document.body.dataset.eventsUrl;
+  if (!url || !window.EventSource) return;
+  const i18n = (window.__JOURNAL_I18N || {});
+
+  function setUnread(n) {
+    const badge = document.getElementById('unreadBadge');
+    if (!badge) return;
+    const cnt = badge.querySelector('.js-unread-count');
+    if (cnt) cnt.textContent = String(n);
+    badge.classList.toggle('d-none', !(n > 0));
+  }
+
+  const seen = new Set();
+
+  function onComment(data) {
+    setUnread(data.unread || 0);
+    if (data.comment_id) {
+      if (seen.has(data.comment_id)) return;
+      seen.add(data.comment_id);
+    }
+    const toast = showStatus(`${data.model || 'LLM'} · ${i18n.newComment || '新评论'}（${i18n.openComment || '打开'}）`, 'info', {duration: 6000});
+    const el = document.querySelector('#llmToastWrap .llm-toast:last-child .llm-toast-msg');
+    if (el && data.comment_id) {
+      el.style.cursor = 'pointer';
+      el.addEventListener('click', () => {
+        toast.remove();
+        window.location.href = `/comment/${encodeURIComponent(data.comment_id)}/open`;
+      });
+    }
+  }
+
+  // 服务器的 SSE 连接数满了（204）时改为每 15 秒轮询一次
+  function poll(since) {
+    fetch(`${url}/poll?since=${encodeURIComponent(since || '')}`, {headers: {'Accept': 'application/json'}})
+      .then((r) => r.ok ? r.json() : null)
+      .then((data) => {
+        if (!data) return;
+        setUnread(data.unread || 0);
+        (data.comments || []).forEach(onComment);
+        since = data.since;
+      })
+      .catch(() => {})
+      .finally(() => setTimeout(() => poll(since), 15000));
+  }
+
+  const es = new EventSource(url);
+
+  es.addEventListener('unread', (ev) => {
+    let data = {};
+    try { data = JSON.parse(ev.data); } catch (e) { return; }
+    setUnread(data.unread || 0);
+  });
+
+  es.addEventListener('comment', (ev) => {
+    let data = {};
+    try { data = JSON.parse(ev.data); } catch (e) { return; }
+    onComment(data);
+  });
+
+  es.addEventListener('error', () => {
+    // CONNECTING = 浏览器会自己重连；CLOSED = 被拒绝（204 等），不会再连
+    if (es.readyState === EventSource.CLOSED) poll('');
+  });
+
+  window.addEventListener('beforeunload', () => es.close());
+})();
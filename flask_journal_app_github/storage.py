@@ -1,8 +1,18 @@
+import functools
+import hashlib
 import json
 import os
+import secrets
+import shutil
+import sys
+import threading
 import time
-from contextlib import contextmanager
-from typing import Any, Dict, List
+from contextlib import ExitStack, contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import metrics
+import profiler
+from records import Comment, Post, Record, freeze, json_default, pairs_hook
 
 DATA_DIR = os.environ.get("JOURNAL_DATA_DIR", "data")
 
@@ -12,6 +22,22 @@ POSTS_PATH = os.environ.get("JOURNAL_POSTS_PATH", os.path.join(DATA_DIR, "posts.
 LLM_CONFIG_PATH = os.environ.get("JOURNAL_LLM_CONFIG_PATH", os.path.join(DATA_DIR, "llm_config.json"))
 COMMENTS_PATH = os.environ.get("JOURNAL_COMMENTS_PATH", os.path.join(DATA_DIR, "comments.json"))
 POST_META_PATH = os.environ.get("JOURNAL_POST_META_PATH", os.path.join(DATA_DIR, "post_meta.json"))
+BLOBS_DIR = os.environ.get("JOURNAL_BLOBS_DIR", os.path.join(DATA_DIR, "blobs"))
+TXN_DIR = os.environ.get("JOURNAL_TXN_DIR", os.path.join(DATA_DIR, "txn"))
+
+# single（默认）：posts.json / comments.json；monthly：按月分片，见下方“按月分片”
+STORAGE_LAYOUT = (os.environ.get("JOURNAL_STORAGE_LAYOUT") or "single").strip().lower()
+SHARDED = STORAGE_LAYOUT == "monthly"
+SHARDS_DIR = os.environ.get("JOURNAL_SHARDS_DIR", os.path.join(DATA_DIR, "shards"))
+POST_SHARDS_DIR = os.path.join(SHARDS_DIR, "posts")
+COMMENT_SHARDS_DIR = os.path.join(SHARDS_DIR, "comments")
+
+# 页面 ETag 依赖的文件：分片模式下任何分片变化都会重写对应的 manifest
+POSTS_VERSION_PATH = os.path.join(POST_SHARDS_DIR, "manifest.json") if SHARDED else POSTS_PATH
+COMMENTS_VERSION_PATH = os.path.join(COMMENT_SHARDS_DIR, "manifest.json") if SHARDED else COMMENTS_PATH
+
+# posts.json 只存摘要（卡片列表用），正文在 BLOBS_DIR
+EXCERPT_CHARS = 240
 
 LOCK_CATEGORIES = CATEGORIES_PATH + ".lock"
 LOCK_POSTS = POSTS_PATH + ".lock"
@@ -29,6 +55,7 @@ def file_lock(lock_path: str, timeout_sec: float = 5.0, poll_interval: float = 0
     """Best-effort lock using a lockfile."""
     _ensure_dir(lock_path)
     start = time.time()
+    t0 = time.perf_counter() if (metrics.ENABLED or profiler.active()) else 0.0
     while True:
         try:
             fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
@@ -36,8 +63,15 @@ def file_lock(lock_path: str, timeout_sec: float = 5.0, poll_interval: float = 0
             break
         except FileExistsError:
             if time.time() - start > timeout_sec:
+                if metrics.ENABLED:
+                    metrics.LOCK_TIMEOUTS.inc(metrics.file_label(lock_path))
                 break
             time.sleep(poll_interval)
+    if t0:
+        waited = time.perf_counter() - t0
+        if metrics.ENABLED:
+            metrics.LOCK_WAIT_SECONDS.observe(waited, metrics.file_label(lock_path))
+        profiler.note("lock_wait", waited)
     try:
         yield
     finally:
@@ -47,20 +81,323 @@ def file_lock(lock_path: str, timeout_sec: float = 5.0, poll_interval: float = 0
             pass
 
 
-def _load_json(path: str, default: Dict[str, Any]) -> Dict[str, Any]:
+def data_version(*paths: str) -> str:
+    """Cheap version tag for data files (mtime + size), without parsing JSON.
+
+    _save_json 通过 os.replace 原子替换，每次写入都会改变 mtime；
+    在文件管理器或外部编辑器里改文件同样会被识别。
+    """
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            parts.append(f"{st.st_mtime_ns:x}-{st.st_size:x}")
+        except OSError:
+            parts.append("0")
+    return ".".join(parts)
+
+
+def data_mtime(*paths: str) -> float:
+    """Latest mtime among the given data files (0 when none exist)."""
+    latest = 0.0
+    for path in paths:
+        try:
+            latest = max(latest, os.stat(path).st_mtime)
+        except OSError:
+            pass
+    return latest
+
+
+def _load_json(path: str, default: Dict[str, Any], record_type: Optional[type] = None) -> Dict[str, Any]:
+    """record_type: build records.Post / Comment objects while parsing (see records.py)."""
     _ensure_dir(path)
-    if not os.path.exists(path):
+    path = _read_path(path)
+    if path is None or not os.path.exists(path):
         return default
+    t0 = time.perf_counter() if (metrics.ENABLED or profiler.active()) else 0.0
     with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+        data = json.load(f, object_pairs_hook=pairs_hook(record_type) if record_type else None)
+    if t0:
+        elapsed = time.perf_counter() - t0
+        if metrics.ENABLED:
+            metrics.observe_storage(path, "load", elapsed, os.path.getsize(path))
+        profiler.note("json_load", elapsed)
+    return data
 
 
-def _save_json(path: str, data: Dict[str, Any]) -> None:
+def _write_json_file(path: str, data: Dict[str, Any], durable: bool = False) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=json_default)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _save_json(path: str, data: Dict[str, Any]) -> Optional[os.stat_result]:
+    """Atomic write. Returns the new file's stat (None inside a transaction: not in place yet)."""
     _ensure_dir(path)
-    tmp_path = path + ".tmp"
-    with open(tmp_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    os.replace(tmp_path, path)
+    tx = current_transaction()
+    tmp_path = tx.staging_path(path) if tx is not None else path + ".tmp"
+    t0 = time.perf_counter() if (metrics.ENABLED or profiler.active()) else 0.0
+    _write_json_file(tmp_path, data, durable=tx is not None)
+    nbytes = os.path.getsize(tmp_path) if metrics.ENABLED else None
+    st = None
+    if tx is not None:
+        # 事务里只暂存，提交时统一替换
+        tx.staged[path] = tmp_path
+        tx.removed.discard(path)
+    else:
+        # rename 不改 inode / mtime，所以替换前的 stat 就是新文件的
+        st = os.stat(tmp_path)
+        os.replace(tmp_path, path)
+    if t0:
+        elapsed = time.perf_counter() - t0
+        if metrics.ENABLED:
+            metrics.observe_storage(path, "save", elapsed, nbytes)
+        profiler.note("json_save", elapsed)
+    return st
+
+
+def _remove_file(path: str) -> None:
+    tx = current_transaction()
+    if tx is not None:
+        tx.remove(path)
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# =========================
+# 多文件事务（intent log）
+# =========================
+#
+#   with transaction(LOCK_POSTS, LOCK_COMMENTS, LOCK_POST_META):
+#       save_posts(...); save_comments(...); save_post_meta(...)
+#
+# 事务内的 _save_json 不直接替换文件，而是写到 <path>.<txid>.txn 并 fsync；读取会读到暂存的新内容。
+# 提交：
+#   1) 把要替换 / 删除的文件列表写进 TXN_DIR/<txid>.intent 并 fsync —— 这一步完成即为提交点
+#   2) 逐个 os.replace 到位、删除文件，fsync 所在目录
+#   3) 删除 intent 文件，执行 after_commit 回调（例如删掉不再引用的 blob）
+# 启动时 recover_transactions()：还在的 intent 说明替换没做完，按 intent 补做（前滚）；
+# 没有 intent 的 .txn 文件属于没提交的事务，直接删掉。
+
+_tx_local = threading.local()
+
+
+def current_transaction() -> Optional["Transaction"]:
+    return getattr(_tx_local, "tx", None)
+
+
+def _read_path(path: str) -> Optional[str]:
+    """Where to read `path` from: the staged copy inside a transaction, None if staged for removal."""
+    tx = current_transaction()
+    if tx is None:
+        return path
+    if path in tx.removed:
+        return None
+    return tx.staged.get(path, path)
+
+
+def _fsync_dir(path: str) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:  # Windows 不能打开目录
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class Transaction:
+    def __init__(self):
+        self.id = f"{int(time.time())}-{secrets.token_hex(4)}"
+        self.staged: Dict[str, str] = {}  # 目标路径 -> 暂存文件
+        self.removed: Set[str] = set()
+        self._after: List[Callable[[], None]] = []
+
+    def staging_path(self, path: str) -> str:
+        return f"{path}.{self.id}.txn"
+
+    def remove(self, path: str) -> None:
+        tmp = self.staged.pop(path, None)
+        if tmp:
+            _unlink_quiet(tmp)
+        self.removed.add(path)
+
+    def after_commit(self, fn: Callable[[], None]) -> None:
+        self._after.append(fn)
+
+    @property
+    def intent_path(self) -> str:
+        return os.path.join(TXN_DIR, self.id + ".intent")
+
+    def commit(self) -> None:
+        if not self.staged and not self.removed:
+            self._run_after()
+            return
+        intent = {
+            "id": self.id,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "replace": [[tmp, path] for path, tmp in self.staged.items()],
+            "remove": sorted(self.removed),
+        }
+        try:
+            os.makedirs(TXN_DIR, exist_ok=True)
+            _write_json_file(self.intent_path, intent, durable=True)
+            _fsync_dir(TXN_DIR)
+        except BaseException:
+            _unlink_quiet(self.intent_path)
+            self.rollback()
+            raise
+        _apply_intent(intent)
+        _unlink_quiet(self.intent_path)
+        self._run_after()
+
+    def rollback(self) -> None:
+        for path, tmp in self.staged.items():
+            _unlink_quiet(tmp)
+            _records_cache.pop(path, None)
+        self.staged.clear()
+        self.removed.clear()
+
+    def _run_after(self) -> None:
+        for fn in self._after:
+            try:
+                fn()
+            except Exception:
+                pass
+
+
+def _unlink_quiet(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _apply_intent(intent: Dict[str, Any]) -> None:
+    dirs = set()
+    for tmp, path in intent.get("replace") or []:
+        if os.path.exists(tmp):
+            os.replace(tmp, path)
+        dirs.add(os.path.dirname(path) or ".")
+    for path in intent.get("remove") or []:
+        _unlink_quiet(path)
+        dirs.add(os.path.dirname(path) or ".")
+    for d in dirs:
+        _fsync_dir(d)
+
+
+@contextmanager
+def transaction(*locks: str):
+    """Take `locks` (in a fixed order) and make every data-file write inside one atomic, durable commit.
+
+    Nested calls join the outer transaction (its locks must already cover the files written).
+    """
+    outer = current_transaction()
+    if outer is not None:
+        yield outer
+        return
+    with ExitStack() as stack:
+        for lock_path in sorted(set(locks)):
+            stack.enter_context(file_lock(lock_path))
+        tx = Transaction()
+        _tx_local.tx = tx
+        try:
+            yield tx
+        except BaseException:
+            _tx_local.tx = None
+            tx.rollback()
+            raise
+        _tx_local.tx = None
+        tx.commit()
+
+
+def recover_transactions() -> int:
+    """Finish committed transactions interrupted by a crash and drop uncommitted staging files.
+
+    Returns how many transactions were rolled forward.
+    """
+    with ExitStack() as stack:
+        for lock_path in sorted({LOCK_CATEGORIES, LOCK_POSTS, LOCK_LLM_CONFIG, LOCK_COMMENTS, LOCK_POST_META}):
+            stack.enter_context(file_lock(lock_path))
+        recovered = 0
+        if os.path.isdir(TXN_DIR):
+            for fn in sorted(os.listdir(TXN_DIR)):
+                if not fn.endswith(".intent"):
+                    continue
+                path = os.path.join(TXN_DIR, fn)
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        intent = json.load(f)
+                except (OSError, ValueError):
+                    # intent 没写完 = 没提交；它的 .txn 文件下面会被清理
+                    _unlink_quiet(path)
+                    continue
+                _apply_intent(intent)
+                _unlink_quiet(path)
+                recovered += 1
+        dirs = {os.path.dirname(p) or "." for p in (CATEGORIES_PATH, POSTS_PATH, COMMENTS_PATH, POST_META_PATH)}
+        dirs.update((POST_SHARDS_DIR, COMMENT_SHARDS_DIR))
+        for d in dirs:
+            if not os.path.isdir(d):
+                continue
+            for fn in os.listdir(d):
+                if fn.endswith(".txn"):
+                    _unlink_quiet(os.path.join(d, fn))
+        if recovered:
+            # 被打断的事务没来得及执行 after_commit（删 blob）
+            gc_blobs()
+    return recovered
+
+
+def _as_records(record_type: type, items: Optional[List[Any]]) -> List[Any]:
+    """Records from a parsed list (already converted by the pairs hook unless hand-edited)."""
+    return [d if isinstance(d, Record) else record_type(d) for d in items or ()]
+
+
+# 解析好的文章 / 评论按文件戳（inode + mtime + 大小）缓存；记录很紧凑，常驻也不大。
+# 每次返回新的 list，记录对象则是共享且只读的（records.freeze）：要改先 copy() 再换进 list。
+# 只缓存正式文件；事务里读到的暂存文件（<path>.<txid>.txn）用一次就丢，不进缓存。
+_records_cache: Dict[str, Tuple[Tuple[int, int, int], List[Any]]] = {}
+
+
+def _load_records(path: str, key: str, record_type: type) -> List[Any]:
+    src = _read_path(path)
+    if src is None:
+        return []
+    try:
+        st = os.stat(src)
+    except OSError:
+        return []
+    stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    hit = _records_cache.get(src) if src == path else None
+    if hit is not None and hit[0] == stamp:
+        return list(hit[1])
+    records = _as_records(record_type, _load_json(path, {key: []}, record_type).get(key))
+    freeze(records)
+    if src == path:
+        _records_cache[path] = (stamp, records)
+    return list(records)
+
+
+def _save_records(path: str, data: Dict[str, Any], key: str, record_type: type) -> None:
+    """_save_json + keep the record cache warm (the next load does not re-parse what was just written)."""
+    st = _save_json(path, data)
+    if st is not None:
+        records = _as_records(record_type, data[key])
+        freeze(records)
+        _records_cache[path] = ((st.st_ino, st.st_mtime_ns, st.st_size), records)
+
+
+def clear_record_cache() -> None:
+    _records_cache.clear()
 
 
 def load_categories() -> List[Dict[str, Any]]:
@@ -72,22 +409,193 @@ def save_categories(categories: List[Dict[str, Any]]) -> None:
     _save_json(CATEGORIES_PATH, {"version": 1, "categories": categories})
 
 
+# =========================
+# 正文 blob（按内容寻址）
+# =========================
+#
+# 正文存成 BLOBS_DIR/<hash[:2]>/<hash>.blob（UTF-8 原文），hash 即 post_meta 里的 content_hash（sha256）。
+# 同一内容只存一份；文件写入后不再修改，所以读缓存不需要失效。
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
+def blob_path(digest: str) -> str:
+    return os.path.join(BLOBS_DIR, digest[:2], digest + ".blob")
+
+
+def write_blob(content: str) -> str:
+    digest = content_hash(content)
+    path = blob_path(digest)
+    if not os.path.exists(path):
+        _ensure_dir(path)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            f.write(content or "")
+        os.replace(tmp_path, path)
+    return digest
+
+
+@functools.lru_cache(maxsize=256)
+def _read_blob_cached(digest: str) -> str:
+    # 文件不存在时抛 FileNotFoundError：lru_cache 不缓存异常，之后补上的 blob 能被读到
+    t0 = time.perf_counter() if (metrics.ENABLED or profiler.active()) else 0.0
+    with open(blob_path(digest), "r", encoding="utf-8", newline="") as f:
+        text = f.read()
+    if t0:
+        elapsed = time.perf_counter() - t0
+        if metrics.ENABLED:
+            metrics.observe_storage("blob", "load", elapsed, len(text.encode("utf-8")))
+        profiler.note("json_load", elapsed)
+    return text
+
+
+def read_blob(digest: str) -> str:
+    """Body text for `digest` ("" if the blob file is missing)."""
+    try:
+        return _read_blob_cached(digest)
+    except FileNotFoundError:
+        print(f"blob missing: {digest} ({blob_path(digest)})", file=sys.stderr)
+        return ""
+
+
+def load_post_body(post: Dict[str, Any]) -> str:
+    """Full text of a post header (reads its blob; legacy records still carry `content`)."""
+    if "content" in post:
+        return post.get("content") or ""
+    digest = post.get("content_hash") or ""
+    return read_blob(digest) if digest else ""
+
+
+def with_body(post: Dict[str, Any]) -> Dict[str, Any]:
+    out = dict(post)
+    out["content"] = load_post_body(post)
+    return out
+
+
+def make_excerpt(content: str) -> str:
+    return (content or "")[:EXCERPT_CHARS]
+
+
+def gc_blobs(referenced: Optional[Iterable[str]] = None) -> int:
+    """Delete blobs no post refers to. Returns how many were removed."""
+    keep: Set[str] = set(referenced) if referenced is not None else {
+        p.get("content_hash") for p in load_posts() if p.get("content_hash")
+    }
+    removed = 0
+    if not os.path.isdir(BLOBS_DIR):
+        return 0
+    for root, _dirs, files in os.walk(BLOBS_DIR):
+        for fn in files:
+            if fn.endswith(".blob") and fn[:-5] not in keep:
+                try:
+                    os.remove(os.path.join(root, fn))
+                    removed += 1
+                except OSError:
+                    pass
+    return removed
+
+
+def drop_blob_if_unused(digest: str, posts: List[Dict[str, Any]]) -> None:
+    if digest and not any(p.get("content_hash") == digest for p in posts):
+        tx = current_transaction()
+        if tx is not None:
+            # 提交前文章仍指向它，提交后再删
+            tx.after_commit(lambda: _unlink_quiet(blob_path(digest)))
+        else:
+            _unlink_quiet(blob_path(digest))
+
+
 def load_posts() -> List[Dict[str, Any]]:
-    data = _load_json(POSTS_PATH, {"version": 1, "posts": []})
-    return list(data.get("posts", []))
+    """Post headers: id / title / category / published_at / content_hash / excerpt (no body)."""
+    if SHARDED:
+        return post_shards.load_all()
+    return _load_records(POSTS_PATH, "posts", Post)
 
 
 def save_posts(posts: List[Dict[str, Any]]) -> None:
+    """Write headers; records that carry `content` get their body stored as a blob first."""
     cleaned = []
     for p in posts:
+        if "content" in p:
+            content = p.get("content") or ""
+            digest, excerpt = write_blob(content), make_excerpt(content)
+        else:
+            digest, excerpt = p.get("content_hash", ""), p.get("excerpt", "")
         cleaned.append({
             "id": p.get("id"),
             "title": p.get("title", ""),
             "category": p.get("category", ""),
-            "content": p.get("content", ""),
             "published_at": p.get("published_at", ""),
+            "content_hash": digest,
+            "excerpt": excerpt,
         })
-    _save_json(POSTS_PATH, {"version": 1, "posts": cleaned})
+    if SHARDED:
+        post_shards.save_all(cleaned)
+        return
+    _save_records(POSTS_PATH, {"version": 2, "posts": cleaned}, "posts", Post)
+
+
+def find_post(post_id: str) -> Optional[Dict[str, Any]]:
+    """One post header by id (monthly layout: opens only the shard that holds it)."""
+    if SHARDED:
+        for month, entry in post_shards.manifest().items():
+            if post_id in (entry.get("ids") or ()):
+                return next((p for p in post_shards.load_month(month) if p.get("id") == post_id), None)
+        return None
+    return next((p for p in load_posts() if p.get("id") == post_id), None)
+
+
+def load_posts_page(offset: int, limit: int, category: str = "") -> Tuple[List[Dict[str, Any]], int]:
+    """Newest-first slice of post headers (optionally one category) and the total count.
+
+    Monthly layout: counts come from the manifest and only the shards overlapping the slice are read.
+    """
+    def newest_first(posts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if category:
+            posts = [p for p in posts if p.get("category") == category]
+        return sorted(posts, key=lambda p: p.get("published_at", ""), reverse=True)
+
+    if not SHARDED:
+        posts = newest_first(load_posts())
+        return posts[offset:offset + limit], len(posts)
+
+    shards = post_shards.manifest()
+    counts = {
+        m: int((e.get("categories") or {}).get(category, 0)) if category else int(e.get("count", 0))
+        for m, e in shards.items()
+    }
+    out: List[Dict[str, Any]] = []
+    skip = offset
+    for month in sorted(shards, reverse=True):
+        n = counts[month]
+        if not n:
+            continue
+        if skip >= n:
+            skip -= n
+            continue
+        if len(out) >= limit:
+            break
+        out.extend(newest_first(post_shards.load_month(month))[skip:skip + limit - len(out)])
+        skip = 0
+    return out, sum(counts.values())
+
+
+def migrate_post_bodies() -> bool:
+    """Move inline `content` out of posts.json into blobs (old layout). Returns True if anything changed.
+
+    The old file is kept as posts.json.v1.migrated.
+    """
+    with file_lock(LOCK_POSTS):
+        posts = load_posts()
+        if not any("content" in p for p in posts):
+            return False
+        backup = POSTS_PATH + ".v1.migrated"
+        if os.path.exists(POSTS_PATH) and not os.path.exists(backup):
+            shutil.copy2(POSTS_PATH, backup)
+        save_posts(posts)
+        gc_blobs(p.get("content_hash") for p in load_posts())
+    return True
 
 
 def load_post_meta() -> Dict[str, Any]:
@@ -126,9 +634,191 @@ def save_llm_config(cfg: Dict[str, Any]) -> None:
 
 
 def load_comments() -> List[Dict[str, Any]]:
-    data = _load_json(COMMENTS_PATH, {"version": 1, "comments": []})
-    return list(data.get("comments", []))
+    if SHARDED:
+        return comment_shards.load_all()
+    return _load_records(COMMENTS_PATH, "comments", Comment)
 
 
 def save_comments(comments: List[Dict[str, Any]]) -> None:
-    _save_json(COMMENTS_PATH, {"version": 1, "comments": comments})
+    if SHARDED:
+        comment_shards.save_all(comments)
+        return
+    _save_records(COMMENTS_PATH, {"version": 1, "comments": comments}, "comments", Comment)
+
+
+def count_unread_comments() -> int:
+    if SHARDED:
+        return sum(int(e.get("unread", 0)) for e in comment_shards.manifest().values())
+    return sum(1 for c in load_comments() if not c.get("read", False))
+
+
+def load_unread_comments() -> List[Dict[str, Any]]:
+    if SHARDED:
+        months = [m for m, e in comment_shards.manifest().items() if e.get("unread")]
+        return [c for m in months for c in comment_shards.load_month(m) if not c.get("read", False)]
+    return [c for c in load_comments() if not c.get("read", False)]
+
+
+def load_comments_for_post(post_id: str) -> List[Dict[str, Any]]:
+    if SHARDED:
+        months = [m for m, e in sorted(comment_shards.manifest().items()) if post_id in (e.get("posts") or ())]
+        return [c for m in months for c in comment_shards.load_month(m) if c.get("post_id") == post_id]
+    return [c for c in load_comments() if c.get("post_id") == post_id]
+
+
+# =========================
+# 按月分片（JOURNAL_STORAGE_LAYOUT=monthly）
+# =========================
+#
+# 文章按 published_at、评论按 created_at 的月份存成 shards/posts/2026-10.json、
+# shards/comments/2026-10.json；每类一个 manifest.json 记录各分片的条数 / 内容哈希，
+# 以及按需加载用的索引（文章：id、各分类条数；评论：未读数、涉及的文章 id）。
+# 加载器先看 manifest，只打开需要的分片；保存时只重写内容变化了的分片，
+# 过去月份的文件基本不会再被改写（备份时可以只拷新的）。
+
+NO_MONTH = "0000-00"
+
+
+def _digest_records(records: List[Dict[str, Any]]) -> str:
+    raw = json.dumps(records, ensure_ascii=False, sort_keys=True, default=json_default).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()
+
+
+class MonthlyShards:
+    def __init__(self, directory: str, key: str, date_field: str, record_type: type,
+                 summarize: Callable[[List[Dict[str, Any]]], Dict[str, Any]]):
+        self.dir = directory
+        self.key = key
+        self.record_type = record_type
+        self.date_field = date_field
+        self.summarize = summarize
+        self.manifest_path = os.path.join(directory, "manifest.json")
+
+    def month_of(self, record: Dict[str, Any]) -> str:
+        v = str(record.get(self.date_field) or "")
+        return v[:7] if len(v) >= 7 and v[4] == "-" else NO_MONTH
+
+    def shard_path(self, month: str) -> str:
+        return os.path.join(self.dir, month + ".json")
+
+    def manifest(self) -> Dict[str, Dict[str, Any]]:
+        return dict(_load_json(self.manifest_path, {"version": 1, "shards": {}}).get("shards") or {})
+
+    def months(self, newest_first: bool = True) -> List[str]:
+        return sorted(self.manifest(), reverse=newest_first)
+
+    def load_month(self, month: str) -> List[Dict[str, Any]]:
+        return _load_records(self.shard_path(month), self.key, self.record_type)
+
+    def load_all(self) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        for month in self.months(newest_first=False):
+            out.extend(self.load_month(month))
+        return out
+
+    def _entry(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        entry = {"count": len(records), "digest": _digest_records(records)}
+        entry.update(self.summarize(records))
+        return entry
+
+    def _write_manifest(self, shards: Dict[str, Dict[str, Any]]) -> None:
+        _save_json(self.manifest_path, {"version": 1, "shards": dict(sorted(shards.items()))})
+
+    def _write_month(self, month: str, records: List[Dict[str, Any]]) -> None:
+        _save_records(self.shard_path(month), {"version": 1, "month": month, self.key: records},
+                      self.key, self.record_type)
+
+    def save_all(self, records: List[Dict[str, Any]]) -> int:
+        """Rewrite only the shards whose content changed. Returns how many shard files were written."""
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for r in records:
+            groups.setdefault(self.month_of(r), []).append(r)
+        old = self.manifest()
+        new: Dict[str, Dict[str, Any]] = {}
+        written = 0
+        for month, recs in groups.items():
+            entry = self._entry(recs)
+            new[month] = entry
+            current = _read_path(self.shard_path(month))
+            if (old.get(month) or {}).get("digest") != entry["digest"] or not (current and os.path.exists(current)):
+                self._write_month(month, recs)
+                written += 1
+        for month in set(old) - set(new):
+            _remove_file(self.shard_path(month))
+        if new != old or not os.path.exists(self.manifest_path):
+            self._write_manifest(new)
+        return written
+
+    def save_month(self, month: str, records: List[Dict[str, Any]]) -> None:
+        shards = self.manifest()
+        if records:
+            self._write_month(month, records)
+            shards[month] = self._entry(records)
+        else:
+            _remove_file(self.shard_path(month))
+            shards.pop(month, None)
+        self._write_manifest(shards)
+
+    def owns(self, path: str) -> Optional[str]:
+        """Month of a shard file under this directory (None for anything else)."""
+        full = os.path.abspath(path)
+        if os.path.dirname(full) != os.path.abspath(self.dir) or full == os.path.abspath(self.manifest_path):
+            return None
+        name = os.path.basename(full)
+        return name[:-5] if name.endswith(".json") else None
+
+    def reindex(self, month: str) -> None:
+        """Refresh one manifest entry after the shard file was edited by hand."""
+        self.save_month(month, self.load_month(month))
+
+
+def _summarize_posts(posts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    cats: Dict[str, int] = {}
+    for p in posts:
+        cats[p.get("category", "")] = cats.get(p.get("category", ""), 0) + 1
+    return {"ids": [p.get("id") for p in posts], "categories": cats}
+
+
+def _summarize_comments(comments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "unread": sum(1 for c in comments if not c.get("read", False)),
+        "posts": sorted({c.get("post_id") or "" for c in comments}),
+    }
+
+
+post_shards = MonthlyShards(POST_SHARDS_DIR, "posts", "published_at", Post, _summarize_posts)
+comment_shards = MonthlyShards(COMMENT_SHARDS_DIR, "comments", "created_at", Comment, _summarize_comments)
+
+
+def reindex_shard(path: str) -> bool:
+    """Called after a data file was edited in the file manager; keeps the manifest in sync."""
+    for shards in (post_shards, comment_shards):
+        month = shards.owns(path)
+        if month:
+            shards.reindex(month)
+            return True
+    return False
+
+
+def migrate_storage_layout() -> bool:
+    """Move posts / comments between the single files and monthly shards to match JOURNAL_STORAGE_LAYOUT.
+
+    The source is kept with a `.migrated` suffix. Nothing happens when both layouts hold data.
+    """
+    changed = False
+    for lock, legacy, shards, save in (
+        (LOCK_POSTS, POSTS_PATH, post_shards, save_posts),
+        (LOCK_COMMENTS, COMMENTS_PATH, comment_shards, save_comments),
+    ):
+        with file_lock(lock):
+            has_legacy = os.path.exists(legacy)
+            has_shards = os.path.exists(shards.manifest_path)
+            if SHARDED and has_legacy and not has_shards:
+                save(list(_load_json(legacy, {shards.key: []}).get(shards.key, [])))
+                os.replace(legacy, legacy + ".migrated")
+                changed = True
+            elif not SHARDED and has_shards and not has_legacy:
+                save(shards.load_all())
+                os.replace(shards.manifest_path, shards.manifest_path + ".migrated")
+                changed = True
+    return changed
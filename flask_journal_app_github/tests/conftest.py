@@ -0,0 +1,36 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# 各模块在 import 时就按 JOURNAL_DATA_DIR 算好路径，所以要在导入任何业务模块之前指向临时目录
+DATA_DIR = tempfile.mkdtemp(prefix="journal-test-")
+for _name in list(os.environ):
+    # 单独指定位置的数据文件（JOURNAL_POSTS_PATH、JOURNAL_BLOBS_DIR 等）也要落在临时目录里
+    if _name.startswith("JOURNAL_") and _name.endswith(("_PATH", "_DIR")):
+        del os.environ[_name]
+os.environ.pop("JOURNAL_STORAGE_LAYOUT", None)
+os.environ["JOURNAL_DATA_DIR"] = DATA_DIR
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def data_dir():
+    """An empty DATA_DIR with the record / blob caches cleared."""
+    import storage
+
+    assert os.path.abspath(storage.DATA_DIR) == DATA_DIR
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+    os.makedirs(DATA_DIR)
+    storage.clear_record_cache()
+    storage._read_blob_cached.cache_clear()
+    yield DATA_DIR
+    storage.clear_record_cache()
+    storage._read_blob_cached.cache_clear()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+from comment_writer import CommentWriter
+from storage import load_comments, save_comments
+
+
+def _comment(cid):
+    return {"id": cid, "post_id": "p1", "model": "m", "content": "x", "created_at": "2026-01-01T00:00:00", "read": False}
+
+
+def test_concurrent_appends_are_grouped_and_saved(data_dir):
+    writer = CommentWriter(window_sec=0.05)
+    futures = []
+    lock = threading.Lock()
+
+    def add(i):
+        f = writer.append(_comment(f"c{i}"))
+        with lock:
+            futures.append(f)
+
+    threads = [threading.Thread(target=add, args=(i,)) for i in range(50)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results = [f.result(timeout=10) for f in futures]
+    writer.close()
+
+    assert sorted(c["id"] for c in load_comments()) == sorted(f"c{i}" for i in range(50))
+    # 同一批拿到的是那一批保存之后的未读数
+    assert max(results) == 50
+    assert writer.writes == 50
+    assert writer.batches < 50
+
+
+def test_failing_write_only_fails_its_own_future(data_dir):
+    save_comments([_comment("c1")])
+    writer = CommentWriter(window_sec=0.05)
+
+    def boom(comments):
+        raise ValueError("bad write")
+
+    bad = writer.submit(boom)
+    read = writer.mark_read("c1")
+    with pytest.raises(ValueError):
+        bad.result(timeout=10)
+    assert read.result(timeout=10)["read"] is True
+    writer.close()
+    assert load_comments()[0]["read"] is True
@@ -0,0 +1,133 @@
+import io
+import json
+import os
+import shutil
+
+import pytest
+
+import storage
+from journal_io import export_jsonl, export_markdown_zip, import_records, read_jsonl, read_markdown_zip
+from revisions import get_revision, list_revisions, record_revision
+from storage import (
+    BLOBS_DIR,
+    blob_path,
+    content_hash,
+    load_categories,
+    load_comments,
+    load_post_body,
+    load_post_meta,
+    load_posts,
+    save_categories,
+    save_comments,
+    save_post_meta,
+    save_posts,
+)
+
+BODIES = {"p1": "第一篇\n\n正文", "p2": "second post\nwith two lines", "p3": "三"}
+
+
+def _seed():
+    save_categories([{"id": "c1", "name": "日记", "color": "#123456"}])
+    save_posts([
+        {"id": pid, "title": f"title {pid}", "category": "c1", "published_at": f"2026-0{i + 1}-01T08:00:00",
+         "content": body}
+        for i, (pid, body) in enumerate(BODIES.items())
+    ])
+    meta = {"p1": 0, "p2": 3, "p3": 1}
+    save_post_meta({"version": 1, "meta": {
+        pid: {"edit_seq": seq, "updated_at": f"2026-02-0{seq + 1}T00:00:00", "content_hash": content_hash(BODIES[pid])}
+        for pid, seq in meta.items()
+    }})
+    for pid, seq in meta.items():
+        record_revision(pid, seq, BODIES[pid], f"2026-02-0{seq + 1}T00:00:00")
+    save_comments([
+        {"id": "k1", "post_id": "p2", "post_edit_seq": 3, "model": "m", "content": "好文", "created_at": "2026-03-01T00:00:00", "read": True},
+        {"id": "k2", "post_id": "p1", "post_edit_seq": 0, "model": "m", "content": "nice", "created_at": "2026-03-02T00:00:00", "read": False},
+    ])
+
+
+def _wipe(data_dir):
+    shutil.rmtree(data_dir)
+    os.makedirs(data_dir)
+    storage.clear_record_cache()
+    storage._read_blob_cached.cache_clear()
+
+
+def _state():
+    meta = load_post_meta()["meta"]
+    return {
+        "categories": load_categories(),
+        "posts": {p["id"]: (p["title"], p["category"], p["published_at"], load_post_body(p)) for p in load_posts()},
+        "edit_seq": {pid: m["edit_seq"] for pid, m in meta.items()},
+        "comments": sorted((dict(c) for c in load_comments()), key=lambda c: c["id"]),
+    }
+
+
+def _jsonl():
+    return list(read_jsonl(io.StringIO("".join(export_jsonl()))))
+
+
+def _zip():
+    return list(read_markdown_zip(io.BytesIO(b"".join(export_markdown_zip()))))
+
+
+@pytest.mark.parametrize("export", [_jsonl, _zip])
+def test_round_trip_into_empty_journal(data_dir, export):
+    _seed()
+    before = _state()
+    items = export()
+
+    _wipe(data_dir)
+    stats = import_records(items)
+    assert (stats["posts"], stats["comments"], stats["invalid"]) == (3, 2, 0)
+    assert _state() == before
+    # 导入的正文记为当前 edit_seq 的版本（p1 是第 0 版）
+    for pid, seq in before["edit_seq"].items():
+        assert get_revision(pid, seq)["content"] == BODIES[pid]
+    assert [r["seq"] for r in list_revisions("p1")] == [0]
+
+
+def test_merge_keeps_existing_posts(data_dir):
+    _seed()
+    items = _jsonl()
+    before = _state()
+
+    stats = import_records(items)
+    assert (stats["posts"], stats["skipped"], stats["comments"]) == (0, 3, 0)
+    assert _state() == before
+
+
+def test_replace_counts_as_an_edit(data_dir):
+    _seed()
+    items = _jsonl()
+    for _, rec in items:
+        if rec.get("id") == "p2":
+            rec["content"] = "second post\nedited"
+    old_blob = blob_path(content_hash(BODIES["p2"]))
+    assert os.path.exists(old_blob)
+
+    stats = import_records(items, replace=True)
+    assert stats["posts"] == 3
+    state = _state()
+    assert state["posts"]["p2"][3] == "second post\nedited"
+    # 正文变了：edit_seq + 1 并记一版历史；没变的不动
+    assert state["edit_seq"] == {"p1": 0, "p2": 4, "p3": 1}
+    assert get_revision("p2", 3)["content"] == BODIES["p2"]
+    assert get_revision("p2", 4)["content"] == "second post\nedited"
+    assert [r["seq"] for r in list_revisions("p1")] == [0]
+    assert not os.path.exists(old_blob)
+    assert os.path.isdir(BLOBS_DIR)
+
+
+def test_invalid_records_are_reported(data_dir):
+    _seed()
+    lines = [
+        json.dumps({"type": "post", "id": "bad id!", "title": "t", "category": "c1", "content": "x"}),
+        json.dumps({"type": "post", "id": "p9", "title": "t", "category": "missing", "content": "x"}),
+        "{not json",
+        json.dumps({"type": "post", "id": "p10", "title": "ok", "category": "c1", "content": "body"}),
+    ]
+    stats = import_records(read_jsonl(io.StringIO("\n".join(lines))))
+    assert (stats["posts"], stats["invalid"]) == (1, 3)
+    assert len(stats["errors"]) == 3
+    assert get_revision("p10", 0)["content"] == "body"
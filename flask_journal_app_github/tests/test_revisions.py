@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from revisions import KEYFRAME_EVERY, get_revision, history_path, list_revisions, record_revision
+
+
+def _version(n):
+    # 每版只改一两行，history 里存的是 delta
+    lines = [f"段落 {i}：不变的内容" for i in range(60)]
+    lines[n % 60] = f"段落 {n % 60}：第 {n} 次修改"
+    lines.append(f"追加 {n}")
+    return "\n".join(lines) + "\n"
+
+
+def test_reconstructs_every_revision_across_keyframes(data_dir):
+    total = KEYFRAME_EVERY * 2 + 5
+    for seq in range(total):
+        record_revision("p1", seq, _version(seq), f"2026-01-01T00:00:{seq:02d}")
+
+    revs = list_revisions("p1")
+    assert [r["seq"] for r in revs] == list(range(total))
+    assert [r["seq"] for r in revs if r["keyframe"]] == [0, KEYFRAME_EVERY, KEYFRAME_EVERY * 2]
+    for seq in range(total):
+        rev = get_revision("p1", seq)
+        assert rev["content"] == _version(seq)
+        assert rev["at"] == f"2026-01-01T00:00:{seq:02d}"
+    assert get_revision("p1", total) is None
+
+
+def test_rerecorded_seq_replaces_the_tail(data_dir):
+    for seq in range(4):
+        record_revision("p1", seq, _version(seq), "")
+    record_revision("p1", 2, "rewritten\n", "")
+    assert [r["seq"] for r in list_revisions("p1")] == [0, 1, 2]
+    assert get_revision("p1", 2)["content"] == "rewritten\n"
+    assert get_revision("p1", 1)["content"] == _version(1)
+
+
+def test_previous_seeds_history_for_old_posts(data_dir):
+    record_revision("p1", 3, _version(3), "b", previous=_version(2), previous_at="a")
+    assert [r["seq"] for r in list_revisions("p1")] == [2, 3]
+    assert get_revision("p1", 2) == {"seq": 2, "at": "a", "content": _version(2)}
+
+
+def test_corrupt_delta_is_detected(data_dir):
+    for seq in range(3):
+        record_revision("p1", seq, _version(seq), "")
+    with open(history_path("p1"), "r", encoding="utf-8") as f:
+        hist = json.load(f)
+    assert "delta" in hist["revs"][1]
+    hist["revs"][0]["full"] = "被手改过的关键帧\n"
+    with open(history_path("p1"), "w", encoding="utf-8") as f:
+        json.dump(hist, f, ensure_ascii=False)
+    with pytest.raises(ValueError):
+        get_revision("p1", 2)
@@ -0,0 +1,70 @@
+import io
+import os
+import random
+
+import snapshots
+from storage import save_comments, save_post_meta, save_posts
+
+
+def _files(base):
+    out = {}
+    for root, dirs, files in os.walk(base):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != os.path.abspath(snapshots.SNAPSHOTS_DIR)]
+        for fn in files:
+            if not fn.endswith((".lock", ".tmp")):
+                full = os.path.join(root, fn)
+                with open(full, "rb") as f:
+                    out[os.path.relpath(full, base)] = f.read()
+    return out
+
+
+def _populate(n_posts, n_comments, seed=0):
+    rnd = random.Random(seed)
+    save_posts([
+        {"id": f"p{i}", "title": f"t{i}", "category": "c", "published_at": "2026-01-01T00:00:00",
+         "content": "\n".join(f"line {i}-{j} {rnd.random()}" for j in range(rnd.randint(1, 400)))}
+        for i in range(n_posts)
+    ])
+    save_comments([
+        {"id": f"c{i}", "post_id": f"p{i % n_posts}", "model": "m", "content": "评论 " * rnd.randint(5, 80),
+         "created_at": "2026-01-01T00:00:00", "read": False}
+        for i in range(n_comments)
+    ])
+    save_post_meta({"version": 1, "meta": {f"p{i}": {"edit_seq": 0} for i in range(n_posts)}})
+
+
+def test_restore_is_byte_identical(data_dir, tmp_path):
+    _populate(30, 3000)
+    before = _files(data_dir)
+    m = snapshots.create_snapshot()
+    assert set(m["files"]) == {rel.replace(os.sep, "/") for rel in before}
+    assert not os.path.exists(snapshots.STAGING_DIR)
+
+    target = str(tmp_path / "restored")
+    assert snapshots.restore_snapshot(m["id"], target) == len(before)
+    assert _files(target) == before
+
+
+def test_incremental_snapshot_reuses_chunks(data_dir, tmp_path):
+    _populate(10, 5000)
+    first = snapshots.create_snapshot()
+    _populate(11, 5001)
+    second = snapshots.create_snapshot()
+
+    assert second["id"] != first["id"]
+    assert 0 < second["bytes_new"] < first["bytes_new"]
+    target = str(tmp_path / "restored")
+    snapshots.restore_snapshot(second["id"], target)
+    assert _files(target) == _files(data_dir)
+
+
+def test_streamed_chunks_match_whole_file_chunks():
+    rnd = random.Random(1)
+    lines = [(b"x" * rnd.choice([1, 30, 400, 5000, 300000])) + b"\n" for _ in range(600)]
+    data = b"".join(lines) + b"tail without newline"
+    # 一次读完整个文件时和以前的整块切分完全一样
+    expected = list(snapshots.iter_chunks(io.BytesIO(data), len(data) + 1))
+    assert b"".join(expected) == data
+    assert all(len(c) <= snapshots.CHUNK_MAX for c in expected)
+    for read_size in (4093, snapshots.CHUNK_MAX, snapshots.CHUNK_MAX + 1):
+        assert list(snapshots.iter_chunks(io.BytesIO(data), read_size)) == expected
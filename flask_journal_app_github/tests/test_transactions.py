@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+import storage
+from storage import (
+    COMMENTS_PATH,
+    LOCK_COMMENTS,
+    LOCK_POSTS,
+    POSTS_PATH,
+    TXN_DIR,
+    load_comments,
+    load_post_body,
+    load_posts,
+    recover_transactions,
+    save_comments,
+    save_posts,
+    transaction,
+)
+
+
+def _post(pid, content):
+    return {"id": pid, "title": pid, "category": "c", "published_at": "2026-01-01T00:00:00", "content": content}
+
+
+def _comment(cid, pid):
+    return {"id": cid, "post_id": pid, "model": "m", "content": "x", "created_at": "2026-01-01T00:00:00", "read": False}
+
+
+def _leftovers():
+    found = []
+    for d in (os.path.dirname(POSTS_PATH), TXN_DIR):
+        if os.path.isdir(d):
+            found += [fn for fn in os.listdir(d) if fn.endswith((".txn", ".intent"))]
+    return found
+
+
+def test_intent_is_replayed_after_crash(data_dir, monkeypatch):
+    save_posts([_post("p1", "old body")])
+    save_comments([_comment("c1", "p1")])
+
+    real_apply = storage._apply_intent
+
+    def crash_after_first_replace(intent):
+        # 提交点（intent）已落盘，只替换了第一个文件进程就“崩溃”
+        tmp, path = intent["replace"][0]
+        os.replace(tmp, path)
+        raise KeyboardInterrupt("simulated crash")
+
+    monkeypatch.setattr(storage, "_apply_intent", crash_after_first_replace)
+    with pytest.raises(KeyboardInterrupt):
+        with transaction(LOCK_POSTS, LOCK_COMMENTS):
+            save_posts([_post("p1", "new body"), _post("p2", "second")])
+            save_comments([_comment("c1", "p1"), _comment("c2", "p2")])
+    monkeypatch.setattr(storage, "_apply_intent", real_apply)
+
+    assert any(fn.endswith(".intent") for fn in os.listdir(TXN_DIR))
+    storage.clear_record_cache()
+
+    assert recover_transactions() == 1
+    posts = load_posts()
+    assert [p["id"] for p in posts] == ["p1", "p2"]
+    assert load_post_body(posts[0]) == "new body"
+    assert [c["id"] for c in load_comments()] == ["c1", "c2"]
+    assert _leftovers() == []
+
+
+def test_uncommitted_staging_files_are_dropped(data_dir):
+    save_comments([_comment("c1", "p1")])
+    with open(COMMENTS_PATH, "rb") as f:
+        before = f.read()
+    # 没有 intent 的 .txn = 提交点之前崩溃，不能生效
+    with open(f"{COMMENTS_PATH}.123-abcd.txn", "w", encoding="utf-8") as f:
+        f.write('{"version": 1, "comments": []}')
+
+    assert recover_transactions() == 0
+    with open(COMMENTS_PATH, "rb") as f:
+        assert f.read() == before
+    assert _leftovers() == []
+
+
+def test_rollback_leaves_files_untouched(data_dir):
+    save_posts([_post("p1", "kept")])
+    with pytest.raises(RuntimeError):
+        with transaction(LOCK_POSTS):
+            save_posts([_post("p1", "discarded")])
+            raise RuntimeError("abort")
+    assert load_post_body(load_posts()[0]) == "kept"
+    assert _leftovers() == []